@@ -133,3 +133,68 @@ else:
     EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Caches
+# `llm_verdicts` persists short answer verdicts across restarts so identical
+# answers to the same question are only sent to the LLM once. It is a table of
+# the database, created by `migrate`, so every grading worker shares it and
+# culling it is a query rather than a scan of a directory of files.
+# The default cache holds the exams with their questions and variant pools,
+# and the exam admission counters. It is local to each process unless
+# REDIS_URL names a Redis server for every process to share; with several
+# processes it must be shared, or an exam edited through one process stays
+# cached, unedited, in the others until the exam is over.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'llm_verdicts': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'llm_verdict_cache',
+        'TIMEOUT': int(os.environ.get('LLM_VERDICT_CACHE_TIMEOUT', 60 * 60 * 24 * 30)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('LLM_VERDICT_CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+}
+
+# LLM backend
+# 'openai' uses the OpenAI API (requires OPENAI_API_KEY). 'standin' uses the local
+# server started with `python utils/llm_standin_server.py`, for offline load testing.
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openai')
+LLM_STANDIN_URL = os.environ.get('LLM_STANDIN_URL', 'http://127.0.0.1:8765/v1')
+LLM_GRADING_MODEL = os.environ.get('LLM_GRADING_MODEL', 'gpt-3.5-turbo')
+
+# Short answer grading
+# When enabled, final submission scores MCQs immediately and leaves short answers
+# pending for the `grade_pending_answers` management command to grade. Off by
+# default, since nothing grades them unless that worker is running.
+ASYNC_SHORT_ANSWER_GRADING = os.environ.get('ASYNC_SHORT_ANSWER_GRADING', 'False') == 'True'
+# Threads the grading and expiry workers run. 0 picks by database: 1 on SQLite,
+# which locks the whole file for every write, 4 elsewhere.
+GRADING_WORKERS = int(os.environ.get('GRADING_WORKERS', '0'))
+# Short answers are sent to the LLM in chunks that fit these token budgets,
+# with up to LLM_GRADING_CONCURRENCY chunks in flight per grading call.
+LLM_GRADING_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_GRADING_PROMPT_TOKEN_BUDGET', '3000'))
+LLM_GRADING_MAX_TOKENS = int(os.environ.get('LLM_GRADING_MAX_TOKENS', '1024'))
+LLM_GRADING_CONCURRENCY = int(os.environ.get('LLM_GRADING_CONCURRENCY', '4'))
+LLM_GRADING_RETRIES = int(os.environ.get('LLM_GRADING_RETRIES', '2'))
+# Local tiers tried, in order, before a short answer is sent to the LLM, and the
+# similarity to the model answer above/below which an answer is accepted/rejected.
+# Rejecting is off by default: a right answer can share no letters with the model
+# answer ("H2O" for "water"). Tune a threshold with `pregrader_report` first.
+PREGRADER_TIERS = [tier for tier in os.environ.get('PREGRADER_TIERS', 'empty,exact,similarity').split(',') if tier]
+PREGRADER_ACCEPT_SIMILARITY = float(os.environ.get('PREGRADER_ACCEPT_SIMILARITY', '0.95'))
+PREGRADER_REJECT_SIMILARITY = float(os.environ.get('PREGRADER_REJECT_SIMILARITY', '0'))
+
+# Exam start
+# At most EXAM_ADMISSION_LIMIT attempts of one exam are created at a time (0 for
+# no limit); other students wait in a waiting room that polls every
+# EXAM_ADMISSION_RETRY_SECONDS, with jitter. The counters live in the default
+# cache, so a limit with several processes needs REDIS_URL set; `manage.py
+# check --deploy` reports a limit on a process-local cache as an error.
+EXAM_ADMISSION_LIMIT = int(os.environ.get('EXAM_ADMISSION_LIMIT', '20'))
+EXAM_ADMISSION_RETRY_SECONDS = float(os.environ.get('EXAM_ADMISSION_RETRY_SECONDS', '2'))
@@ -1,22 +1,27 @@
 // Timer and answer preview for giveExam.html
 
+// Render KaTeX math inside an element
+function renderMath(element) {
+    if (window.renderMathInElement) {
+        renderMathInElement(element, {
+            delimiters: [
+                {left: "$$", right: "$$", display: true},
+                {left: "$", right: "$", display: false},
+                {left: "\\(", right: "\\)", display: false},
+                {left: "\\[", right: "\\]", display: true}
+            ],
+            ignoredTags: ["script", "noscript", "style", "textarea", "pre", "code"]
+        });
+    }
+}
+
 // Update KaTeX preview for a textarea
 function updatePreview(textareaId, previewId) {
     const textarea = document.getElementById(textareaId);
     const preview = document.getElementById(previewId);
     if (textarea && preview) {
         preview.innerHTML = textarea.value || 'Your answer will be previewed here...';
-        if (window.renderMathInElement) {
-            renderMathInElement(preview, {
-                delimiters: [
-                    {left: "$$", right: "$$", display: true},
-                    {left: "$", right: "$", display: false},
-                    {left: "\\(", right: "\\)", display: false},
-                    {left: "\\[", right: "\\]", display: true}
-                ],
-                ignoredTags: ["script", "noscript", "style", "textarea", "pre", "code"]
-            });
-        }
+        renderMath(preview);
     }
 }
 
@@ -31,9 +36,184 @@ function initializePreviews() {
 document.addEventListener('DOMContentLoaded', function() {
     initializePreviews();
     initializeRadioButtons();
+    initializeAutosave();
+    initializeClientPagination();
     startTimer();
 });
 
+// Client-side pagination: the whole paper is loaded once and pages switch without a round-trip.
+// If the paper cannot be loaded the server-rendered page and its pagination stay in place.
+var questionsPerPage = 5;
+var currentPage = 1;
+
+function initializeClientPagination() {
+    const form = document.getElementById('examform');
+    if (!form || !form.dataset.paperUrl || !window.fetch) return;
+    // no-cache revalidates the paper with its ETag instead of downloading it again
+    fetch(form.dataset.paperUrl, {
+        credentials: "same-origin",
+        cache: "no-cache",
+        headers: {"Accept": "application/json"}
+    }).then(response => {
+        if (!response.ok) throw new Error(response.status);
+        return response.json();
+    }).then(paper => renderPaper(form, paper)).catch(() => {});
+}
+
+function renderPaper(form, paper) {
+    const list = document.getElementById('question-list');
+    const answers = JSON.parse(document.getElementById('saved-answers')?.textContent || '{}');
+    // Keep whatever was answered on the server-rendered page while the paper loaded
+    list.querySelectorAll('input[type="radio"]:checked, textarea').forEach(input => {
+        answers[input.name] = input.value;
+    });
+    Object.assign(answers, pendingAnswers);
+
+    questionsPerPage = parseInt(form.dataset.questionsPerPage) || questionsPerPage;
+    currentPage = parseInt(form.elements['page'].value) || 1;
+    list.innerHTML = '';
+    paper.questions.forEach(ques => list.appendChild(renderQuestion(ques, answers[ques.qno] || '')));
+
+    renderMath(list);
+    initializePreviews();
+    initializeRadioButtons();
+    showPage(currentPage);
+}
+
+function renderQuestion(ques, answer) {
+    const card = document.createElement('div');
+    card.className = 'border border-gray-200 rounded-lg p-5 bg-white transition-all duration-300 hover:shadow-lg question-visible';
+    card.dataset.question = ques.qno;
+    let html = `<h2 class="text-xl font-semibold mb-3 text-gray-900 leading-relaxed">
+        <span class="text-blue-600 mr-2">${ques.number}.</span> <span>${ques.question}</span></h2>`;
+    if (ques.image) {
+        html += `<div class="my-4"><img src="${ques.image}" alt="Question Image" class="max-w-full h-auto rounded-lg border"></div>`;
+    }
+    html += '<div class="space-y-2 text-gray-700">';
+    if (ques.question_type === 'MCQ') {
+        Object.entries(ques.options).forEach(([opt, text]) => {
+            html += `<label class="block cursor-pointer">
+                <input class="hidden" type="radio" id="option${opt}${ques.number}" name="${ques.qno}" value="${opt}"${answer === opt ? ' checked' : ''}>
+                <span class="p-2 border border-gray-300 rounded-md hover:bg-blue-50 hover:border-blue-400 inline-block w-full">
+                  <span class="font-medium">${opt}:</span> <span>${text}</span>
+                </span></label>`;
+        });
+    } else if (ques.question_type === 'SHORT') {
+        html += `<div class="mb-4">
+            <button type="button" class="math-help-toggle mb-2 px-3 py-1 bg-blue-600 text-white rounded hover:bg-blue-700 transition">Show Math Help</button>
+            <div id="math-help-${ques.qno}" class="hidden"></div>
+            <textarea id="answer-${ques.qno}" name="${ques.qno}" rows="3"
+              class="form-input mt-1 block w-full border border-gray-300 rounded-md focus:ring-blue-500 focus:border-blue-500"
+              placeholder="Type your answer here, e.g. $a^2 + b^2$"></textarea>
+            <div id="preview-${ques.qno}" class="mt-1 p-3 border border-gray-200 rounded-md bg-gray-50 min-h-[60px]"></div>
+          </div>`;
+    }
+    html += `</div><div class="mt-4 flex justify-between items-center text-sm text-gray-600">
+        <span class="font-bold text-purple-700">Max Marks: ${ques.max_marks}</span></div>`;
+    card.innerHTML = html;
+
+    const textarea = card.querySelector('textarea');
+    if (textarea) {
+        textarea.value = answer;
+        textarea.addEventListener('input', () => updatePreview(textarea.id, 'preview-' + ques.qno));
+        const helpBox = card.querySelector('#math-help-' + ques.qno);
+        const helpTemplate = document.getElementById('math-help-template');
+        if (helpTemplate) helpBox.appendChild(helpTemplate.content.cloneNode(true));
+        const toggle = card.querySelector('.math-help-toggle');
+        toggle.addEventListener('click', () => {
+            helpBox.classList.toggle('hidden');
+            toggle.textContent = helpBox.classList.contains('hidden') ? 'Show Math Help' : 'Hide Math Help';
+        });
+    }
+    return card;
+}
+
+function showPage(page) {
+    const cards = document.querySelectorAll('#question-list > .question-visible');
+    const numPages = Math.max(1, Math.ceil(cards.length / questionsPerPage));
+    currentPage = Math.min(Math.max(1, page), numPages);
+    cards.forEach((card, index) => {
+        card.classList.toggle('hidden', Math.floor(index / questionsPerPage) + 1 !== currentPage);
+    });
+    // Keeps the server-side page in step should the form be posted
+    document.getElementById('examform').elements['page'].value = currentPage;
+    renderPagination(numPages);
+    flushAnswers();
+}
+
+function renderPagination(numPages) {
+    const pagination = document.getElementById('pagination');
+    const button = (label, page, classes) => {
+        const el = document.createElement('button');
+        el.type = 'button';
+        el.textContent = label;
+        el.className = 'btn px-4 py-2 rounded ' + classes;
+        el.addEventListener('click', () => {
+            showPage(page);
+            window.scrollTo(0, 0);
+        });
+        return el;
+    };
+    pagination.innerHTML = '';
+    if (currentPage > 1) {
+        pagination.appendChild(button('Previous', currentPage - 1, 'btn-secondary bg-gray-200 hover:bg-gray-300 text-gray-700'));
+    }
+    for (let num = 1; num <= numPages; num++) {
+        if (num === currentPage) {
+            const current = document.createElement('span');
+            current.textContent = num;
+            current.className = 'btn btn-primary disabled px-4 py-2 rounded bg-blue-600 text-white';
+            pagination.appendChild(current);
+        } else {
+            pagination.appendChild(button(num, num, 'btn-outline-primary border border-blue-600 text-blue-600 hover:bg-blue-50'));
+        }
+    }
+    if (currentPage < numPages) {
+        pagination.appendChild(button('Next', currentPage + 1, 'btn-secondary bg-gray-200 hover:bg-gray-300 text-gray-700'));
+    }
+}
+
+// Autosave changed answers in the background so they survive a lost session or crash
+var pendingAnswers = {};
+var autosaveTimer = null;
+
+function initializeAutosave() {
+    const form = document.getElementById('examform');
+    if (!form || !form.dataset.autosaveUrl) return;
+    form.addEventListener('change', queueAnswer);
+    form.addEventListener('input', queueAnswer);
+}
+
+function queueAnswer(event) {
+    const input = event.target;
+    if (!/^\d+$/.test(input.name)) return;
+    if (input.type === 'radio' && !input.checked) return;
+    pendingAnswers[input.name] = input.value;
+    clearTimeout(autosaveTimer);
+    autosaveTimer = setTimeout(flushAnswers, 1000);
+}
+
+function flushAnswers() {
+    const form = document.getElementById('examform');
+    const answers = pendingAnswers;
+    if (!Object.keys(answers).length) return;
+    pendingAnswers = {};
+    fetch(form.dataset.autosaveUrl, {
+        method: "POST",
+        credentials: "same-origin",
+        headers: {
+            "X-CSRFToken": getCookie("csrftoken"),
+            "Content-Type": "application/json"
+        },
+        body: JSON.stringify({answers: answers})
+    }).then(response => {
+        if (!response.ok && response.status !== 409) throw new Error(response.status);
+    }).catch(() => {
+        // Keep unsaved answers for the next autosave, without overwriting newer ones
+        pendingAnswers = Object.assign(answers, pendingAnswers);
+    });
+}
+
 // Simple radio button highlight
 function initializeRadioButtons() {
     document.querySelectorAll('input[type="radio"]').forEach(radio => {
@@ -49,6 +229,7 @@ function initializeRadioButtons() {
                 label.classList.remove('border-gray-300');
                 label.classList.add('bg-blue-100', 'border-blue-500', 'ring-2', 'ring-blue-200');
                 radio.checked = true;
+                radio.dispatchEvent(new Event('change', {bubbles: true}));
             });
         }
         if (radio.checked && label) {
@@ -1,18 +1,53 @@
 from django.contrib import admin
 from django.urls import path
+from django.template.loader import render_to_string
 from django.utils.html import format_html
+from .analytics import refresh_item_stats
 from .models import Exam_Model
-from .question_models import Question_DB, QForm
+from .question_models import Question_DB, QForm, QuestionStats
 from .questionpaper_models import Question_Paper
+from .services import regrade_questions
 from django.urls import reverse
 from django import forms
 
+@admin.action(description='Regrade recorded answers to selected questions')
+def regrade_selected_questions(modeladmin, request, queryset):
+    counts = regrade_questions(list(queryset.values_list('qno', flat=True)))
+    modeladmin.message_user(
+        request,
+        f"Checked {counts['answers']} answers: {counts['changed']} changed, "
+        f"{counts['requeued']} short answers requeued for grading, {counts['attempts']} attempt scores recomputed"
+    )
+
+def render_item_analysis(questions):
+    """Render the item analysis table of `questions` for an admin change page, from the stored statistics."""
+    rows = [(question, getattr(question, 'item_stats', None)) for question in questions.select_related('item_stats').order_by('qno')]
+    return render_to_string('admin/questions/item_analysis.html', {'rows': rows})
+
+def _refresh_item_stats_of(modeladmin, request, questions):
+    refreshed = refresh_item_stats(questions.values_list('qno', flat=True))
+    modeladmin.message_user(request, f"Refreshed the item analysis of {refreshed} questions")
+
+@admin.action(description='Refresh item analysis of selected questions')
+def refresh_question_item_stats(modeladmin, request, queryset):
+    _refresh_item_stats_of(modeladmin, request, queryset)
+
+@admin.action(description='Refresh item analysis of the questions of selected papers')
+def refresh_paper_item_stats(modeladmin, request, queryset):
+    _refresh_item_stats_of(modeladmin, request, Question_DB.objects.filter(question_paper__in=queryset))
+
+@admin.action(description='Refresh item analysis of the questions of selected exams')
+def refresh_exam_item_stats(modeladmin, request, queryset):
+    _refresh_item_stats_of(modeladmin, request, Question_DB.objects.filter(question_paper__exams__in=queryset))
+
 class QuestionDBAdmin(admin.ModelAdmin):
     change_list_template = "admin/questions/question_db_changelist.html"
-    list_display = ['qno', 'question', 'question_type', 'mcq_answer', 'short_answer', 'max_marks', 'professor', 'question_image', 'solution_image']
+    actions = [regrade_selected_questions, refresh_question_item_stats]
+    list_display = ['qno', 'question', 'question_type', 'mcq_answer', 'short_answer', 'max_marks', 'professor', 'question_image', 'solution_image', 'get_facility', 'get_discrimination']
+    list_select_related = ('professor', 'item_stats')
     list_filter = ['professor', 'max_marks', 'question_type']
     search_fields = ['question', 'mcq_answer', 'short_answer']
-    readonly_fields = ('question_image_preview', 'solution_image_preview',)
+    readonly_fields = ('question_image_preview', 'solution_image_preview', 'item_analysis')
     fieldsets = (
         ('Question Details', {
             'fields': ('professor', 'question_type', 'question', 'max_marks')
@@ -30,6 +65,10 @@ class QuestionDBAdmin(admin.ModelAdmin):
             'fields': ('solution',),
             'description': 'Provide a detailed explanation of the correct answer.'
         }),
+        ('Item Analysis', {
+            'fields': ('item_analysis',),
+            'description': 'Statistics over every graded answer to this question, refreshed in batches.'
+        }),
     )
     form = QForm
 
@@ -45,6 +84,20 @@ class QuestionDBAdmin(admin.ModelAdmin):
         return "(No Image)"
     solution_image_preview.short_description = 'Solution Image Preview'
 
+    def get_facility(self, obj):
+        stats = getattr(obj, 'item_stats', None)
+        return stats.facility if stats else None
+    get_facility.short_description = 'Facility'
+
+    def get_discrimination(self, obj):
+        stats = getattr(obj, 'item_stats', None)
+        return stats.discrimination if stats else None
+    get_discrimination.short_description = 'Discrimination'
+
+    def item_analysis(self, obj):
+        return render_item_analysis(Question_DB.objects.filter(pk=obj.pk)) if obj and obj.pk else "-"
+    item_analysis.short_description = 'Item Analysis'
+
     class Media:
         js = ('js/question_type_toggle.js',)
 
@@ -79,20 +132,35 @@ class QuestionPaperAdmin(admin.ModelAdmin):
     list_display = ('qPaperTitle', 'topic', 'get_course', 'professor')
     list_filter = ('topic', 'topic__course', 'professor')
     search_fields = ('qPaperTitle',)
+    actions = [refresh_paper_item_stats]
+    readonly_fields = ('item_analysis',)
     def get_course(self, obj):
         return obj.topic.course if obj.topic else None
     get_course.short_description = 'Course'
+    def item_analysis(self, obj):
+        return render_item_analysis(obj.questions.all()) if obj and obj.pk else "-"
+    item_analysis.short_description = 'Item Analysis'
+
+@admin.action(description='Generate missing or out of date question variants')
+def generate_exam_variants(modeladmin, request, queryset):
+    created = sum(exam.generate_variants() for exam in queryset.select_related('question_paper'))
+    modeladmin.message_user(request, f"Generated {created} variants")
 
 class ExamModelAdmin(admin.ModelAdmin):
-    list_display = ('name', 'question_paper', 'get_topic', 'get_course', 'professor', 'start_time', 'end_time')
+    list_display = ('name', 'question_paper', 'get_topic', 'get_course', 'professor', 'start_time', 'end_time', 'variant_count')
     list_filter = ('question_paper__topic', 'question_paper__topic__course', 'professor')
     search_fields = ('name',)
+    actions = [generate_exam_variants, refresh_exam_item_stats]
+    readonly_fields = ('item_analysis',)
     def get_topic(self, obj):
         return obj.question_paper.topic if obj.question_paper else None
     get_topic.short_description = 'Topic'
     def get_course(self, obj):
         return obj.question_paper.topic.course if obj.question_paper and obj.question_paper.topic else None
     get_course.short_description = 'Course'
+    def item_analysis(self, obj):
+        return render_item_analysis(obj.question_paper.questions.all()) if obj and obj.pk else "-"
+    item_analysis.short_description = 'Item Analysis'
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -115,4 +183,5 @@ class ExamModelAdmin(admin.ModelAdmin):
 admin.site.register(Question_DB, QuestionDBAdmin)
 admin.site.register(Question_Paper, QuestionPaperAdmin)
 admin.site.register(Exam_Model, ExamModelAdmin)
+admin.site.register(QuestionStats)
 #admin.site.register(Special_Students)
\ No newline at end of file
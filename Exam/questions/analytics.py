@@ -0,0 +1,108 @@
+"""
+Item analysis of questions over their graded answers.
+
+The answers of a batch of questions are read as a sparse answer matrix, one
+(attempt, question) cell per row, in id-ordered chunks, and folded into
+per-question sums with NumPy. The statistics are derived from the sums, so a
+refresh takes bounded memory however many answers there are.
+"""
+import numpy as np
+from django.utils import timezone
+from questions.question_models import Question_DB, QuestionStats
+from student.models import Stu_Question
+
+ANALYSIS_CHUNK_SIZE = 5000
+ANALYSIS_BATCH_SIZE = 200
+# Columns of the option counts; '' is a blank answer
+OPTIONS = ('', 'A', 'B', 'C', 'D')
+
+def refresh_item_stats(question_ids=None, chunk_size=ANALYSIS_CHUNK_SIZE, batch_size=ANALYSIS_BATCH_SIZE):
+    """
+    Recompute the item statistics of the given questions, or of every stale one, and return how many.
+
+    Questions are refreshed `batch_size` at a time. Their stale flags are
+    cleared before their answers are read, so answers graded while the
+    refresh runs mark them stale again for the next one.
+    """
+    if question_ids is None:
+        question_ids = QuestionStats.objects.filter(stale=True).values_list('question_id', flat=True)
+    question_ids = sorted(set(question_ids))
+    refreshed = 0
+    for start in range(0, len(question_ids), batch_size):
+        refreshed += _refresh_batch(question_ids[start:start + batch_size], chunk_size)
+    return refreshed
+
+def _refresh_batch(question_ids, chunk_size):
+    questions = list(Question_DB.objects.filter(qno__in=question_ids).order_by('qno').values_list('qno', 'question_type', 'max_marks'))
+    if not questions:
+        return 0
+    qnos = np.array([qno for qno, _, _ in questions])
+    is_mcq = np.array([question_type == 'MCQ' for _, question_type, _ in questions])
+    max_marks = np.array([marks for _, _, marks in questions], dtype=float)
+    QuestionStats.objects.filter(question_id__in=qnos.tolist()).update(stale=False)
+
+    # Per question: answers, then sums of x, x², y, y² and xy, where x is the
+    # marks of the answer and y the rest of its attempt's score
+    sums = np.zeros((6, len(qnos)))
+    option_counts = np.zeros((len(qnos), len(OPTIONS)), dtype=int)
+    last_id = 0
+    while True:
+        rows = list(
+            Stu_Question.objects.filter(
+                question_id__in=qnos.tolist(), id__gt=last_id,
+                attempt__completed_at__isnull=False, attempt__grading_status='complete',
+            )
+            .order_by('id')
+            .values_list('id', 'question_id', 'choice', 'marks_awarded', 'attempt__score')[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        _, answer_qnos, choices, marks, scores = (np.array(column) for column in zip(*rows))
+
+        column = np.searchsorted(qnos, answer_qnos)
+        x = marks.astype(float)
+        y = scores.astype(float) - x
+        for row, values in enumerate((np.ones_like(x), x, x * x, y, y * y, x * y)):
+            sums[row] += np.bincount(column, weights=values, minlength=len(qnos))
+
+        picked = np.char.upper(np.char.strip(choices.astype(str)))
+        counted = is_mcq[column] & np.isin(picked, OPTIONS)
+        option = np.searchsorted(OPTIONS, picked[counted])
+        np.add.at(option_counts, (column[counted], option), 1)
+
+    count, sum_x, sum_xx, sum_y, sum_yy, sum_xy = sums
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_marks = sum_x / count
+        facility = mean_marks / max_marks
+        spread_x = count * sum_xx - sum_x ** 2
+        spread_y = count * sum_yy - sum_y ** 2
+        discrimination = (count * sum_xy - sum_x * sum_y) / np.sqrt(spread_x * spread_y)
+    # Undefined when nobody answered or every answer or rest score is the same
+    facility[(count == 0) | (max_marks <= 0)] = np.nan
+    discrimination[(spread_x <= 1e-9) | (spread_y <= 1e-9)] = np.nan
+
+    def value(number):
+        return None if np.isnan(number) else round(float(number), 4)
+
+    refreshed_at = timezone.now()
+    QuestionStats.objects.bulk_create(
+        [
+            QuestionStats(
+                question_id=int(qno),
+                responses=int(count[i]),
+                facility=value(facility[i]),
+                discrimination=value(discrimination[i]),
+                mean_marks=value(mean_marks[i]),
+                option_counts={option: int(n) for option, n in zip(OPTIONS, option_counts[i])} if is_mcq[i] else {},
+                stale=False,
+                refreshed_at=refreshed_at,
+            )
+            for i, qno in enumerate(qnos)
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['question'],
+        update_fields=['responses', 'facility', 'discrimination', 'mean_marks', 'option_counts', 'refreshed_at'],
+    )
+    return len(qnos)
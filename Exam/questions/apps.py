@@ -3,3 +3,31 @@ from django.apps import AppConfig
 
 class QuestionsConfig(AppConfig):
     name = 'questions'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from django.db import transaction
+        from django.db.models.signals import m2m_changed
+        from django.dispatch import receiver
+        from .caching import forget_exam
+        from .models import Exam_Model
+        from .questionpaper_models import Question_Paper
+
+        @receiver(m2m_changed, sender=Question_Paper.questions.through)
+        def forget_paper_exams(sender, instance, action, reverse, pk_set, **kwargs):
+            """Drop the cached exams of papers whose questions changed, once the change is committed."""
+            if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+                exams = Exam_Model.objects.filter(question_paper=instance)
+            elif reverse and action in ('post_add', 'post_remove'):
+                exams = Exam_Model.objects.filter(question_paper_id__in=pk_set)
+            elif reverse and action == 'pre_clear':
+                # The papers are gone from the relation after the clear
+                exams = Exam_Model.objects.filter(question_paper__questions=instance)
+            else:
+                return
+            exam_ids = set(exams.values_list('id', flat=True))
+
+            def forget():
+                for exam_id in exam_ids:
+                    forget_exam(exam_id)
+            transaction.on_commit(forget, robust=True)
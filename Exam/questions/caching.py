@@ -0,0 +1,215 @@
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+# Cached data of an exam outlives its end by this long, so attempts started
+# just before the end are still served from the cache.
+EXAM_CACHE_MARGIN = timedelta(hours=2)
+# Rendered question content is keyed by revision, so it never goes stale and
+# only expires to free space.
+FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7
+# Exams deleted in bulk skip forget_exam, so the count also expires on its own.
+EXAM_COUNT_KEY = 'exam:count'
+EXAM_COUNT_TIMEOUT = 60 * 5
+# Set by every poll of a grading worker, so it lapses soon after the last one stops.
+GRADING_WORKER_KEY = 'grading:worker'
+
+def cache_is_shared():
+    """Whether the default cache is shared by every process, rather than local to each one."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+def _exam_key(exam_id, name):
+    return f'exam:{exam_id}:{name}'
+
+def _exam_timeout(exam):
+    """Seconds until the exam's cached data is no longer needed, at least a minute."""
+    if not exam.end_time:
+        return 60 * 60
+    return max(60, int((exam.end_time + EXAM_CACHE_MARGIN - timezone.now()).total_seconds()))
+
+def forget_exam(exam_id):
+    """
+    Drop everything cached for an exam, after it or its questions change.
+
+    Only the default cache of this process is cleared when it is process-local,
+    so a deployment with several processes needs a shared one; see the
+    `questions.W002` check.
+    """
+    cache.delete_many([_exam_key(exam_id, name) for name in ('exam', 'questions', 'variants')] + [EXAM_COUNT_KEY])
+
+def get_exam(exam_id):
+    """
+    Return an exam with its question paper and professor, cached until the exam is over.
+
+    The exam pages look the exam up here so that, once warm, they run no exam
+    query. Edits reach it through forget_exam, which other processes only see
+    on a shared cache. Raises Exam_Model.DoesNotExist like a plain lookup.
+    """
+    key = _exam_key(exam_id, 'exam')
+    exam = cache.get(key)
+    if exam is None:
+        from .models import Exam_Model
+        exam = Exam_Model.objects.select_related('question_paper', 'professor').get(pk=exam_id)
+        cache.set(key, exam, _exam_timeout(exam))
+    return exam
+
+def get_exam_count():
+    """Return the number of exams, cached for the dashboards."""
+    count = cache.get(EXAM_COUNT_KEY)
+    if count is None:
+        from .models import Exam_Model
+        count = Exam_Model.objects.count()
+        cache.set(EXAM_COUNT_KEY, count, EXAM_COUNT_TIMEOUT)
+    return count
+
+def record_grading_worker(timeout):
+    """Note that a grading worker is polling the queue, for `timeout` seconds."""
+    cache.set(GRADING_WORKER_KEY, timezone.now(), timeout)
+
+def grading_worker_seen():
+    """Whether a grading worker has polled the queue recently; see record_grading_worker."""
+    return cache.get(GRADING_WORKER_KEY) is not None
+
+def get_exam_questions(exam):
+    """Return the questions of an exam's paper as a {qno: Question_DB} dict, cached until the exam is over."""
+    key = _exam_key(exam.id, 'questions')
+    questions = cache.get(key)
+    if questions is None:
+        questions = {q.qno: q for q in exam.question_paper.questions.all()}
+        cache.set(key, questions, _exam_timeout(exam))
+    return questions
+
+def get_variant_pool(exam):
+    """Return the pre-generated variants of an exam as a {number: ExamVariant} dict, cached once generated."""
+    key = _exam_key(exam.id, 'variants')
+    pool = cache.get(key)
+    if pool is None:
+        pool = {variant.number: variant for variant in exam.variants.all()}
+        if pool:
+            cache.set(key, pool, _exam_timeout(exam))
+    return pool
+
+def get_attempt_questions(attempt):
+    """Return an attempt's questions in qno order, from the cached exam paper when it has them all."""
+    qids = attempt.get_question_ids()
+    if qids:
+        questions = get_exam_questions(attempt.exam)
+        if all(qno in questions for qno in qids):
+            return [questions[qno] for qno in sorted(qids)]
+    return list(attempt.get_selected_questions())
+
+def render_question_fragments(question):
+    """Render the content of a question shown on the exam and review pages: body, options and solution."""
+    return {
+        'question': question.get_question_display(),
+        'options': {opt: question.get_option_display(opt) for opt in 'ABCD'},
+        'solution': question.get_solution_display(),
+    }
+
+def _fragment_key(question):
+    return f'question:{question.qno}:{question.revision}:fragments'
+
+def attach_question_fragments(questions):
+    """
+    Set `fragments` on each question to its rendered content and return the questions.
+
+    Fragments are cached per question revision and shared by every student,
+    so each revision of a question is rendered once; the cached ones are
+    fetched in a single round trip.
+    """
+    questions = list(questions)
+    keys = {_fragment_key(question): question for question in questions}
+    cached = cache.get_many(keys)
+    rendered = {}
+    for key, question in keys.items():
+        if key not in cached:
+            cached[key] = rendered[key] = render_question_fragments(question)
+        question.fragments = cached[key]
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+    return questions
+
+def warm_exam(exam):
+    """
+    Load what starting an attempt of an exam needs into the cache ahead of its start.
+
+    Generates the missing variants when the exam uses them and caches the
+    exam itself, the paper's questions with their rendered fragments and the
+    variant pool. Returns a (questions, variants) tuple of the number of each
+    cached.
+    """
+    forget_exam(exam.id)
+    if exam.variant_count:
+        exam.generate_variants()
+    exam = get_exam(exam.id)
+    questions = get_exam_questions(exam)
+    attach_question_fragments(questions.values())
+    return len(questions), len(get_variant_pool(exam))
+
+
+class AdmissionGate:
+    """
+    Caps how many attempts of an exam are being created at the same time.
+
+    Each exam gets a counter in the default cache. A request entering the gate
+    increments it and is turned away when that takes it past `limit`; it must
+    leave the gate once its attempt is created. The counter expires after
+    `timeout` seconds so a crashed request cannot hold its slot for good.
+
+    The limit only holds across server processes when the default cache is
+    shared by them; on a process-local cache each process admits `limit` on
+    its own, which `manage.py check --deploy` reports as the `questions.E001` error.
+    """
+    def __init__(self, limit, retry_seconds=2.0, timeout=60):
+        self.limit = limit
+        self.retry_seconds = retry_seconds
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            getattr(settings, 'EXAM_ADMISSION_LIMIT', 20),
+            getattr(settings, 'EXAM_ADMISSION_RETRY_SECONDS', 2.0),
+        )
+
+    def _key(self, exam_id):
+        return _exam_key(exam_id, 'admitting')
+
+    def enter(self, exam_id):
+        """Take a slot for creating an attempt of the exam; False if the gate is full."""
+        if not self.limit:
+            return True
+        key = self._key(exam_id)
+        cache.add(key, 0, self.timeout)
+        try:
+            admitted = cache.incr(key)
+        except ValueError:
+            # The counter expired between add and incr
+            cache.add(key, 1, self.timeout)
+            return True
+        if admitted > self.limit:
+            self.leave(exam_id)
+            return False
+        return True
+
+    def leave(self, exam_id):
+        if not self.limit:
+            return
+        try:
+            if cache.decr(self._key(exam_id)) < 0:
+                cache.set(self._key(exam_id), 0, self.timeout)
+        except ValueError:
+            pass
+
+    def has_capacity(self, exam_id):
+        return not self.limit or (cache.get(self._key(exam_id)) or 0) < self.limit
+
+    def retry_after(self):
+        """Seconds a waiting student should wait before trying again, jittered to spread the retries."""
+        return round(self.retry_seconds * random.uniform(0.5, 1.5), 2)
+
+admission_gate = AdmissionGate.from_settings()
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from .caching import cache_is_shared, grading_worker_seen
+
+ADMISSION_CACHE_MESSAGE = 'EXAM_ADMISSION_LIMIT is counted in a process-local cache, so each server process admits that many on its own.'
+ADMISSION_CACHE_HINT = 'Set REDIS_URL to share the default cache between processes, or EXAM_ADMISSION_LIMIT=0 to turn the limit off.'
+
+def _admission_limit_is_local():
+    return bool(getattr(settings, 'EXAM_ADMISSION_LIMIT', 0)) and not cache_is_shared()
+
+@register(Tags.caches)
+def check_admission_cache(app_configs, **kwargs):
+    """The exam admission limit counts in the default cache, so it needs one every process shares."""
+    if not _admission_limit_is_local():
+        return []
+    return [Warning(ADMISSION_CACHE_MESSAGE, hint=ADMISSION_CACHE_HINT, id='questions.W001')]
+
+@register(Tags.caches, deploy=True)
+def check_deployed_admission_cache(app_configs, **kwargs):
+    """A deployment runs several processes, where a process-local admission limit does not hold."""
+    if not _admission_limit_is_local():
+        return []
+    return [Error(ADMISSION_CACHE_MESSAGE, hint=ADMISSION_CACHE_HINT, id='questions.E001')]
+
+@register(Tags.caches, deploy=True)
+def check_exam_cache_invalidation(app_configs, **kwargs):
+    """Exams are cached until they are over and forgotten on edit, which only reaches other processes on a shared cache."""
+    if cache_is_shared():
+        return []
+    return [Warning(
+        'The default cache is local to each process, so an exam or question edited through one process stays cached, unedited, in the others.',
+        hint='Set REDIS_URL to share the default cache, or serve the site from a single process.',
+        id='questions.W002',
+    )]
+
+@register()
+def check_grading_worker(app_configs, **kwargs):
+    """Deferred short answers are only graded by a grade_pending_answers worker."""
+    if not getattr(settings, 'ASYNC_SHORT_ANSWER_GRADING', False) or grading_worker_seen():
+        return []
+    return [Warning(
+        'ASYNC_SHORT_ANSWER_GRADING is on but no grade_pending_answers worker has polled the queue, so short answers stay ungraded.',
+        hint='Run `manage.py grade_pending_answers --loop` alongside the server, or set ASYNC_SHORT_ANSWER_GRADING=False '
+             'to grade short answers on submission. Workers are only seen from other processes through a shared cache.',
+        id='questions.W003',
+    )]
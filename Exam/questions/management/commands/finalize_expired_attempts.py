@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from questions.services import finalize_expired_attempts
+
+class Command(BaseCommand):
+    help = 'Grade and close exam attempts left open past their end time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            help='Number of attempts finalized concurrently; GRADING_WORKERS by default, 1 on SQLite')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of expired attempts claimed at a time')
+        parser.add_argument('--grace', type=float, default=30.0,
+                            help='Seconds past an attempt\'s end time before it is swept, to let late submissions land')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sweeping instead of exiting once no expired attempts are left')
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Seconds to wait between sweeps in --loop mode')
+
+    def handle(self, *args, **options):
+        while True:
+            finalized, failed = finalize_expired_attempts(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                grace_seconds=options['grace'],
+            )
+            if finalized or failed:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Finalized {finalized} expired attempts") if not failed
+                    else self.style.WARNING(f"Finalized {finalized} expired attempts, {failed} failed and were reopened")
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
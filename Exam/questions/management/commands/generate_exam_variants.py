@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from questions.models import Exam_Model
+
+class Command(BaseCommand):
+    help = 'Pre-generate the question variants of exams so starting an attempt only assigns one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int)
+        parser.add_argument('--upcoming', action='store_true',
+                            help='Generate variants for every exam that has not started yet')
+        parser.add_argument('--count', type=int,
+                            help='Set the number of variants of the exams before generating them')
+        parser.add_argument('--seed',
+                            help='Seed mixed into the sampling, to draw a different set of variants')
+        parser.add_argument('--regenerate', action='store_true',
+                            help='Delete the variants no attempt uses yet and draw them again')
+
+    def handle(self, *args, **options):
+        exams = Exam_Model.objects.select_related('question_paper')
+        if options['exam_ids']:
+            exams = exams.filter(pk__in=options['exam_ids'])
+        elif options['upcoming']:
+            exams = exams.filter(start_time__gt=timezone.now())
+        else:
+            raise CommandError('Give exam ids or --upcoming')
+
+        for exam in exams:
+            if options['count'] is not None:
+                exam.variant_count = options['count']
+                Exam_Model.objects.filter(pk=exam.pk).update(variant_count=exam.variant_count)
+            if not exam.variant_count:
+                self.stdout.write(self.style.WARNING(f"{exam.name}: variant_count is 0, skipped"))
+                continue
+            if options['regenerate']:
+                deleted, _ = exam.variants.filter(attempts__isnull=True).delete()
+                self.stdout.write(f"{exam.name}: deleted {deleted} unused variants")
+            created = exam.generate_variants(seed=options['seed'])
+            self.stdout.write(self.style.SUCCESS(f"{exam.name}: generated {created} of {exam.variant_count} variants"))
@@ -0,0 +1,52 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from questions.caching import record_grading_worker
+from questions.models import Exam_Model
+from questions.services import drain_grading_queue, grade_exam_pending_answers, requeue_stale_claims
+
+class Command(BaseCommand):
+    help = 'Grade short answers of submitted exam attempts that are waiting for LLM grading'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            help='Number of attempts graded concurrently; GRADING_WORKERS by default, 1 on SQLite')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Number of attempts claimed from the queue at a time')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the queue instead of exiting once it is empty')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to wait between polls in --loop mode')
+        parser.add_argument('--requeue', action='store_true',
+                            help='Put attempts left in progress by a stopped worker back in the queue first')
+        parser.add_argument('--stale-after', type=float, default=30.0,
+                            help='Minutes after which --requeue takes an in-progress claim as abandoned')
+        parser.add_argument('--exam', type=int,
+                            help='Grade all pending attempts of this exam together, batching answers by question')
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            requeued = requeue_stale_claims(timedelta(minutes=options['stale_after']))
+            self.stdout.write(f"Requeued {requeued} attempts left in progress for over {options['stale_after']:g} minutes")
+
+        if options['exam']:
+            exam = Exam_Model.objects.select_related('question_paper').get(pk=options['exam'])
+            graded, failed = grade_exam_pending_answers(exam, batch_size=options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f"Graded {graded} attempts of {exam.name}") if not failed
+                else self.style.WARNING(f"Graded {graded} attempts of {exam.name}, {failed} failed and were requeued")
+            )
+            return
+
+        while True:
+            # Lapses a few polls after the worker stops; see the questions.W003 check
+            record_grading_worker(max(300, int(3 * options['interval'])))
+            graded, failed = drain_grading_queue(batch_size=options['batch_size'], workers=options['workers'])
+            if graded or failed:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Graded {graded} attempts") if not failed
+                    else self.style.WARNING(f"Graded {graded} attempts, {failed} failed and were requeued")
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from questions.models import Exam_Model
+from questions.services import GRADING_TIERS, SimilarityTier
+from student.models import Stu_Question
+from utils.llm_validation import ShortAnswerValidationRequest
+
+class Command(BaseCommand):
+    help = 'Replay the graded short answers of an exam through the local pre-grader tiers to tune their thresholds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--accept', type=float, help='Similarity at or above which an answer gets full marks')
+        parser.add_argument('--reject', type=float, help='Similarity at or below which an answer gets zero marks')
+
+    def handle(self, *args, **options):
+        exam = Exam_Model.objects.select_related('question_paper').get(pk=options['exam_id'])
+        graded_answers = []
+        requests = []
+        graded = Stu_Question.objects.filter(
+            attempt__exam=exam, grading_pending=False, question__question_type='SHORT'
+        ).select_related('question')
+        for sq in graded.iterator():
+            ques = sq.question
+            graded_answers.append(sq)
+            requests.append(ShortAnswerValidationRequest(
+                question=ques.question,
+                correct_answer=ques.short_answer or '',
+                student_answer=sq.choice or '',
+                max_marks=ques.max_marks
+            ))
+
+        if not requests:
+            self.stdout.write(self.style.WARNING(f"No graded short answers found for {exam.name}"))
+            return
+
+        self.stdout.write(f"Replaying {len(requests)} graded short answers of {exam.name}")
+        undecided = list(range(len(requests)))
+        for name, tier_class in GRADING_TIERS.items():
+            tier = SimilarityTier(options['accept'], options['reject']) if tier_class is SimilarityTier else tier_class()
+            results = tier.grade([requests[i] for i in undecided])
+            decided = [(i, result) for i, result in zip(undecided, results) if result is not None]
+            agreed = sum(1 for i, result in decided if result.marks_awarded == graded_answers[i].marks_awarded)
+            self.stdout.write(
+                f"  {name:<10} decided {len(decided):>6} ({len(decided) / len(requests):.1%}), "
+                f"agrees with recorded marks on {agreed}/{len(decided)}"
+            )
+            decided_ids = {i for i, _ in decided}
+            undecided = [i for i in undecided if i not in decided_ids]
+        self.stdout.write(f"  {'llm':<10} would grade {len(undecided):>6} ({len(undecided) / len(requests):.1%})")
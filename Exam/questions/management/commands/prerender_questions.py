@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from questions import math_render
+from questions.caching import forget_exam
+from questions.models import Exam_Model
+from questions.question_models import Question_DB
+
+class Command(BaseCommand):
+    help = 'Pre-render the LaTeX math of stored questions to MathML, for questions saved before pre-rendering or with an older renderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of questions updated per query')
+
+    def handle(self, *args, **options):
+        if math_render.latex_to_mathml is None:
+            raise CommandError('latex2mathml is not installed; run pip install -r requirements.txt')
+
+        changed_ids = []
+        batch = []
+        for question in Question_DB.objects.iterator(chunk_size=options['batch_size']):
+            rendered = math_render.prerender_question(question)
+            if rendered == question.rendered:
+                continue
+            question.rendered = rendered
+            # A new revision keeps the cached fragments of the old content from being served
+            question.revision += 1
+            batch.append(question)
+            if len(batch) >= options['batch_size']:
+                Question_DB.objects.bulk_update(batch, ['rendered', 'revision'])
+                changed_ids += [q.qno for q in batch]
+                batch = []
+        if batch:
+            Question_DB.objects.bulk_update(batch, ['rendered', 'revision'])
+            changed_ids += [q.qno for q in batch]
+
+        exam_ids = Exam_Model.objects.filter(question_paper__questions__in=changed_ids).values_list('id', flat=True).distinct()
+        for exam_id in exam_ids:
+            forget_exam(exam_id)
+        self.stdout.write(self.style.SUCCESS(f"Pre-rendered {len(changed_ids)} questions"))
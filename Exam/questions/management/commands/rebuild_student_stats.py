@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from student.models import StudentStats
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard statistics of students from their exam attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_ids', nargs='*', type=int,
+                            help='Students to recompute; every student with attempts when omitted')
+
+    def handle(self, *args, **options):
+        rebuilt = StudentStats.rebuild(options['student_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the statistics of {rebuilt} students"))
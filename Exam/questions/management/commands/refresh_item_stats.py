@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from questions.analytics import ANALYSIS_CHUNK_SIZE, refresh_item_stats
+from questions.question_models import Question_DB
+
+class Command(BaseCommand):
+    help = 'Recompute the item analysis of questions whose answers were graded since their last refresh'
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_ids', nargs='*', type=int,
+                            help='Questions to recompute; every stale question when omitted')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every question, stale or not')
+        parser.add_argument('--chunk-size', type=int, default=ANALYSIS_CHUNK_SIZE,
+                            help='Number of answers loaded at a time')
+
+    def handle(self, *args, **options):
+        question_ids = options['question_ids'] or None
+        if options['all']:
+            question_ids = Question_DB.objects.values_list('qno', flat=True)
+        refreshed = refresh_item_stats(question_ids, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed the item analysis of {refreshed} questions"))
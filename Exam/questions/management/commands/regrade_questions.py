@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from questions.models import Exam_Model
+from questions.services import drain_grading_queue, regrade_questions
+
+class Command(BaseCommand):
+    help = 'Regrade the recorded answers to questions whose answer key or marks were corrected, and recompute the affected scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_ids', nargs='*', type=int)
+        parser.add_argument('--exam', type=int,
+                            help='Regrade every question of this exam\'s question paper')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of answers loaded and updated at a time')
+        parser.add_argument('--grade', action='store_true',
+                            help='Grade the requeued short answers right away instead of leaving them to the grading worker')
+
+    def handle(self, *args, **options):
+        question_ids = list(options['question_ids'])
+        if options['exam']:
+            exam = Exam_Model.objects.select_related('question_paper').get(pk=options['exam'])
+            question_ids += exam.question_paper.questions.values_list('qno', flat=True)
+        if not question_ids:
+            raise CommandError('Give question ids or --exam')
+
+        counts = regrade_questions(question_ids, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {counts['answers']} answers: {counts['changed']} changed, "
+            f"{counts['requeued']} short answers requeued, {counts['attempts']} attempt scores recomputed"
+        ))
+        if counts['requeued'] and options['grade']:
+            graded, failed = drain_grading_queue()
+            self.stdout.write(f"Graded {graded} attempts, {failed} failed and were requeued")
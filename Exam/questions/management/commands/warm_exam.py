@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from questions.caching import cache_is_shared, warm_exam
+from questions.models import Exam_Model
+
+class Command(BaseCommand):
+    help = 'Load the question paper and variant pool of exams into the cache before they start'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int)
+        parser.add_argument('--upcoming', type=float, metavar='MINUTES',
+                            help='Warm every exam starting within this many minutes')
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError(
+                'The default cache is local to each process, so warming it from a command '
+                'does not reach the server. Set REDIS_URL to use a shared cache.'
+            )
+        exams = Exam_Model.objects.select_related('question_paper')
+        if options['exam_ids']:
+            exams = exams.filter(pk__in=options['exam_ids'])
+        elif options['upcoming'] is not None:
+            now = timezone.now()
+            exams = exams.filter(start_time__gt=now, start_time__lte=now + timedelta(minutes=options['upcoming']))
+        else:
+            raise CommandError('Give exam ids or --upcoming MINUTES')
+
+        for exam in exams:
+            questions, variants = warm_exam(exam)
+            self.stdout.write(self.style.SUCCESS(f"{exam.name}: cached {questions} questions and {variants} variants"))
@@ -0,0 +1,50 @@
+"""
+Server-side pre-rendering of the LaTeX math in question content.
+
+Math written between $...$, $$...$$, \\(...\\) or \\[...\\] is converted to
+MathML, which browsers lay out natively, so exam pages do not have to typeset
+it on every student's device. Spans that fail to convert are left as LaTeX
+for the client-side renderer.
+"""
+import html
+import logging
+import re
+
+try:
+    from latex2mathml.converter import convert as latex_to_mathml
+except ImportError:
+    latex_to_mathml = None
+
+logger = logging.getLogger(__name__)
+
+# Display math first so $$...$$ is not read as two empty $...$ spans
+MATH_PATTERN = re.compile(r'(?<!\\)(?:\$\$(?P<dollars>.+?)\$\$|\\\[(?P<brackets>.+?)\\\]|\$(?P<dollar>.+?)\$|\\\((?P<parens>.+?)\\\))', re.S)
+
+# Question_DB fields whose content is pre-rendered
+RENDERED_FIELDS = ('question', 'optionA', 'optionB', 'optionC', 'optionD', 'solution')
+
+def render_math(text):
+    """Return `text` with each LaTeX math span replaced by MathML."""
+    if not text or latex_to_mathml is None:
+        return text
+
+    def replace(match):
+        display = match['dollars'] is not None or match['brackets'] is not None
+        latex = next(group for group in match.groups() if group is not None)
+        try:
+            return latex_to_mathml(html.unescape(latex).strip(), display='block' if display else 'inline')
+        except Exception as e:
+            logger.warning(f"Could not pre-render {match.group(0)!r}: {e}")
+            return match.group(0)
+
+    return MATH_PATTERN.sub(replace, text)
+
+def prerender_question(question):
+    """Return the pre-rendered HTML of the fields of a question that contain math, as a {field: html} dict."""
+    rendered = {}
+    for field in RENDERED_FIELDS:
+        source = getattr(question, field) or ''
+        output = render_math(source)
+        if output != source:
+            rendered[field] = output
+    return rendered
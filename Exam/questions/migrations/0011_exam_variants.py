@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0010_question_db_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam_model',
+            name='variant_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of question variants generated ahead of the exam and shared round-robin by its attempts. 0 samples questions for every attempt.'),
+        ),
+        migrations.CreateModel(
+            name='ExamVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('question_ids', models.JSONField(default=list, help_text='qno of the questions in this variant')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='questions.exam_model')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('exam', 'number'), name='unique_exam_variant')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0011_exam_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question_db',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped on every save; keys the cached rendered content'),
+        ),
+    ]
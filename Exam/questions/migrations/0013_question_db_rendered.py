@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0012_question_db_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question_db',
+            name='rendered',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Content of the fields with LaTeX math, pre-rendered to MathML on save'),
+        ),
+    ]
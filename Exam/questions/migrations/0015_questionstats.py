@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_answered_questions_stale(apps, schema_editor):
+    Stu_Question = apps.get_model('student', 'Stu_Question')
+    QuestionStats = apps.get_model('questions', 'QuestionStats')
+    question_ids = Stu_Question.objects.filter(question__isnull=False).order_by().values_list('question_id', flat=True).distinct()
+    QuestionStats.objects.bulk_create([QuestionStats(question_id=question_id) for question_id in question_ids], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0014_question_db_answer_revision'),
+        ('student', '0021_studentstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('responses', models.PositiveIntegerField(default=0, help_text='Graded answers the statistics are computed over')),
+                ('facility', models.FloatField(blank=True, help_text='Mean share of the marks awarded, from 0 (nobody scored) to 1 (everybody scored full marks)', null=True)),
+                ('discrimination', models.FloatField(blank=True, help_text="Point-biserial correlation of the marks with the rest of the attempt's score", null=True)),
+                ('mean_marks', models.FloatField(blank=True, help_text='Mean marks awarded, the mean partial credit of short answers', null=True)),
+                ('option_counts', models.JSONField(blank=True, default=dict, help_text="How many answers chose each MCQ option; '' counts blank answers")),
+                ('stale', models.BooleanField(db_index=True, default=True)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='item_stats', to='questions.question_db')),
+            ],
+            options={
+                'verbose_name_plural': 'Question Stats',
+            },
+        ),
+        migrations.RunPython(mark_answered_questions_stale, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0015_questionstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question_db',
+            name='answer_revision',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped when the model answer or max marks change; short answers graded against an older one are regraded'),
+        ),
+    ]
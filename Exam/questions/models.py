@@ -1,13 +1,20 @@
+import random
 from django.db import models
 from django.forms import ModelForm
 from django.contrib.auth.models import User
 from datetime import datetime
 from .questionpaper_models import Question_Paper
+from .caching import forget_exam, get_variant_pool
 from django import forms
 from django.utils import timezone
 from datetime import timedelta
 from django.core.exceptions import ValidationError
 
+def sample_question_ids(qids, size, *key):
+    """Draw `size` of `qids` with a generator seeded by `key`; the same key always yields the same sorted selection."""
+    qids = sorted(qids)
+    return sorted(random.Random(':'.join(str(part) for part in key)).sample(qids, min(size, len(qids))))
+
 class Exam_Model(models.Model):
     professor = models.ForeignKey(User, limit_choices_to={'groups__name': "Professor"}, on_delete=models.CASCADE)
     name = models.CharField(max_length=50)
@@ -19,11 +26,20 @@ class Exam_Model(models.Model):
         default=10,
         help_text="Number of random questions to select for this exam. Must be less than or equal to the number of questions in the question paper."
     )
+    variant_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of question variants generated ahead of the exam and shared round-robin by its attempts. 0 samples questions for every attempt."
+    )
 
     def clean(self):
         super().clean()
         if self.question_paper and self.num_questions > self.question_paper.questions.count():
             raise ValidationError({'num_questions': f"Cannot select more than {self.question_paper.questions.count()} questions for this exam."})
+        # Variants attempts use cannot be drawn again, so they would no longer match the exam
+        if self.pk and ExamVariant.objects.filter(exam_id=self.pk, attempts__isnull=False).exists():
+            previous = Exam_Model.objects.filter(pk=self.pk).values('question_paper_id', 'num_questions').first()
+            if previous and (previous['question_paper_id'], previous['num_questions']) != (self.question_paper_id, self.num_questions):
+                raise ValidationError("Attempts already use the question variants of this exam, so its question paper and number of questions cannot change.")
 
     def __str__(self):
         return self.name
@@ -31,7 +47,84 @@ class Exam_Model(models.Model):
     def save(self, *args, **kwargs):
         if not self.end_time:
             self.end_time = self.start_time + timedelta(minutes=60)
+        previous = Exam_Model.objects.filter(pk=self.pk).values('total_marks', 'question_paper_id', 'num_questions', 'variant_count').first() if self.pk else None
+        rebin = previous is not None and previous['total_marks'] != self.total_marks
+        # Variants only need drawing when they are new or what they are drawn from changed
+        revariant = self.variant_count and (previous is None or any(
+            previous[field] != getattr(self, field) for field in ('question_paper_id', 'num_questions', 'variant_count')
+        ))
         super().save(*args, **kwargs)
+        forget_exam(self.pk)
+        if revariant:
+            self.generate_variants()
+        if rebin:
+            # The leaderboard's score bins are ranges of the total marks
+            from student.models import ExamBestScore
+            ExamBestScore.rebuild([self.pk])
+
+    def delete(self, *args, **kwargs):
+        forget_exam(self.pk)
+        return super().delete(*args, **kwargs)
+
+    def generate_variants(self, seed=None):
+        """
+        Create the variants of 0..variant_count-1 that are missing or out of date and return how many were created.
+
+        Each variant is a sample of num_questions questions of the paper, drawn
+        from a generator seeded by the exam, variant number and `seed`, so a
+        variant can be regenerated identically. Variants no attempt uses yet
+        are drawn again when their size or questions no longer match the exam,
+        and dropped when their number is past variant_count; clean() refuses
+        the edits that would put variants in use out of date.
+        """
+        qids = list(self.question_paper.questions.values_list('qno', flat=True))
+        size, paper = min(self.num_questions, len(qids)), set(qids)
+        stale = [
+            variant.id
+            for variant in self.variants.filter(attempts__isnull=True).only('id', 'number', 'question_ids')
+            if variant.number >= self.variant_count or len(variant.question_ids) != size or not paper.issuperset(variant.question_ids)
+        ]
+        if stale:
+            ExamVariant.objects.filter(id__in=stale).delete()
+            forget_exam(self.pk)
+        existing = set(self.variants.values_list('number', flat=True))
+        missing = [number for number in range(self.variant_count) if number not in existing]
+        if not missing:
+            return 0
+        ExamVariant.objects.bulk_create([
+            ExamVariant(exam=self, number=number, question_ids=sample_question_ids(qids, self.num_questions, self.pk, number, seed))
+            for number in missing
+        ], ignore_conflicts=True)
+        forget_exam(self.pk)
+        return len(missing)
+
+    def get_variant_for(self, attempt):
+        """
+        Return the variant assigned to an attempt, or None if the exam has none yet.
+
+        Variants are assigned round-robin by `attempt.id % variant_count`, so
+        which one an attempt gets depends on the order attempts are inserted
+        in, across every exam, not on the student.
+        """
+        if not self.variant_count:
+            return None
+        return get_variant_pool(self).get(attempt.id % self.variant_count)
+
+
+class ExamVariant(models.Model):
+    """A question selection generated ahead of an exam and shared by several of its attempts."""
+    exam = models.ForeignKey(Exam_Model, on_delete=models.CASCADE, related_name='variants')
+    number = models.PositiveIntegerField()
+    question_ids = models.JSONField(default=list, help_text="qno of the questions in this variant")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'number'], name='unique_exam_variant'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam.name} - variant {self.number}"
 
 
 class ExamForm(ModelForm):
@@ -49,4 +142,5 @@ class ExamForm(ModelForm):
             'start_time': forms.DateTimeInput(attrs = {'class':'form-control'}),
             'end_time': forms.DateTimeInput(attrs = {'class':'form-control'}),
             'num_questions': forms.NumberInput(attrs = {'class':'form-control'}),
+            'variant_count': forms.NumberInput(attrs = {'class':'form-control'}),
         }
\ No newline at end of file
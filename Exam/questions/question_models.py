@@ -3,6 +3,7 @@ from django.forms import ModelForm
 from django.contrib.auth.models import User
 from django import forms
 from course.models import Topic
+from .math_render import prerender_question
 
 class Question_DB(models.Model):
     QUESTION_TYPE_CHOICES = [
@@ -30,6 +31,9 @@ class Question_DB(models.Model):
     solution = models.TextField(blank=True, null=True, help_text="Detailed explanation of the correct answer (supports HTML/markdown formatting)")
     question_image = models.ImageField(upload_to='question_images/', blank=True, null=True, help_text="Image for the question (optional)")
     solution_image = models.ImageField(upload_to='solution_images/', blank=True, null=True, help_text="Image for the solution/answer (optional)")
+    revision = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped on every save; keys the cached rendered content")
+    rendered = models.JSONField(default=dict, blank=True, editable=False, help_text="Content of the fields with LaTeX math, pre-rendered to MathML on save")
+    answer_revision = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped when the model answer or max marks change; short answers graded against an older one are regraded")
 
     class Meta:
         indexes = [
@@ -40,21 +44,73 @@ class Question_DB(models.Model):
     def __str__(self):
         return f'Question No.{self.qno}: {self.question[:50]}...'
 
+    def save(self, *args, **kwargs):
+        if self.pk:
+            self.revision += 1
+            previous = Question_DB.objects.filter(pk=self.pk).values_list('short_answer', 'max_marks').first()
+            # Partial credit is judged against the maximum too, so a new maximum needs a new grading
+            if previous and ((previous[0] or '') != (self.short_answer or '') or previous[1] != self.max_marks):
+                self.answer_revision += 1
+        self.rendered = prerender_question(self)
+        super().save(*args, **kwargs)
+        # Exams of papers with this question cache it; drop them so the new revision is served
+        from .caching import forget_exam
+        from .models import Exam_Model
+        for exam_id in Exam_Model.objects.filter(question_paper__questions=self).values_list('id', flat=True).distinct():
+            forget_exam(exam_id)
+
+    def get_rendered(self, field):
+        """Return a field with HTML formatting, with its math pre-rendered when it has any"""
+        from django.utils.safestring import mark_safe
+        return mark_safe(self.rendered.get(field) or getattr(self, field, '') or '')
+
     def get_question_display(self):
         """Return question with HTML formatting"""
-        from django.utils.safestring import mark_safe
-        return mark_safe(self.question)
+        return self.get_rendered('question')
 
     def get_option_display(self, option):
         """Return option with HTML formatting"""
-        from django.utils.safestring import mark_safe
-        option_text = getattr(self, f'option{option}', '')
-        return mark_safe(option_text)
+        return self.get_rendered(f'option{option}')
 
     def get_solution_display(self):
         """Return solution with HTML formatting"""
-        from django.utils.safestring import mark_safe
-        return mark_safe(self.solution) if self.solution else ''
+        return self.get_rendered('solution')
+
+
+class QuestionStats(models.Model):
+    """
+    Item analysis of a question over every graded answer to it, served by the admin pages.
+
+    Rows are marked stale as answers to their question are graded or
+    regraded, and `questions.analytics.refresh_item_stats` recomputes the
+    stale ones in a batch.
+    """
+    question = models.OneToOneField(Question_DB, on_delete=models.CASCADE, related_name='item_stats')
+    responses = models.PositiveIntegerField(default=0, help_text="Graded answers the statistics are computed over")
+    facility = models.FloatField(null=True, blank=True, help_text="Mean share of the marks awarded, from 0 (nobody scored) to 1 (everybody scored full marks)")
+    discrimination = models.FloatField(null=True, blank=True, help_text="Point-biserial correlation of the marks with the rest of the attempt's score")
+    mean_marks = models.FloatField(null=True, blank=True, help_text="Mean marks awarded, the mean partial credit of short answers")
+    option_counts = models.JSONField(default=dict, blank=True, help_text="How many answers chose each MCQ option; '' counts blank answers")
+    stale = models.BooleanField(default=True, db_index=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Question Stats'
+
+    def __str__(self):
+        return f"Question No.{self.question_id} - {self.responses} responses"
+
+    @classmethod
+    def mark_stale(cls, question_ids):
+        """Flag the statistics of the given questions for the next refresh, creating the missing rows."""
+        cls.objects.bulk_create(
+            # Old answers whose question could not be linked have none
+            [cls(question_id=question_id, stale=True) for question_id in set(question_ids) - {None}],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['question'],
+            update_fields=['stale'],
+        )
 
 
 class QForm(ModelForm):
@@ -14,6 +14,13 @@ class Question_Paper(models.Model):
     def __str__(self):
         return f' Question Paper Title :- {self.qPaperTitle}\n'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Exams of this paper cache it along with its questions
+        from .caching import forget_exam
+        for exam_id in self.exams.values_list('id', flat=True):
+            forget_exam(exam_id)
+
 
 class QPForm(ModelForm):
     course = forms.ModelChoiceField(queryset=Course.objects.all(), required=False, label="Subject")
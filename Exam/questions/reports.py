@@ -0,0 +1,245 @@
+"""
+Read-side queries behind the result and roster pages.
+
+Each report is built as a single queryset over indexed columns and read in
+pages or chunks, so its cost does not grow with the number of exams or
+students it spans.
+"""
+import csv
+import tempfile
+from datetime import datetime
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, IntegerField, Max, Q
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+from openpyxl import Workbook
+from student.models import ExamScoreBin, StuExamAttempt, score_bin, score_bin_count
+
+RESULT_PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 2000
+ROSTER_PAGE_SIZE = 50
+# Rosters are dropped when an attempt of the professor's exams is submitted or
+# graded; the timeout picks up newly registered students.
+ROSTER_TIMEOUT = 60 * 10
+HISTORY_PAGE_SIZE = 25
+LEADERBOARD_SIZE = 10
+
+# Columns of the professor results table and its exports, as (header, field) pairs
+RESULT_COLUMNS = (
+    ('Attempt', 'id'),
+    ('Student', 'student__username'),
+    ('Exam', 'exam__name'),
+    ('Question Paper', 'qpaper__qPaperTitle'),
+    ('Topic', 'exam__question_paper__topic__name'),
+    ('Score', 'score'),
+    ('Started', 'started_at'),
+    ('Completed', 'completed_at'),
+    ('Grading', 'grading_status'),
+)
+
+def professor_results(professor, exam_id=None, topic_id=None):
+    """Return the attempts of a professor's exams, newest first, optionally of one exam or topic."""
+    attempts = StuExamAttempt.objects.filter(exam__professor=professor)
+    if exam_id:
+        attempts = attempts.filter(exam_id=exam_id)
+    if topic_id:
+        attempts = attempts.filter(exam__question_paper__topic_id=topic_id)
+    return attempts.order_by('-id')
+
+def result_page(attempts, after=None, page_size=RESULT_PAGE_SIZE):
+    """
+    Return one page of result rows and the cursor of the next page, or None on the last page.
+
+    Pages are keyset-paginated on the attempt id, so a page deep in the
+    results costs the same as the first.
+    """
+    if after:
+        attempts = attempts.filter(id__lt=after)
+    rows = list(attempts.values(*(field for _, field in RESULT_COLUMNS))[:page_size + 1])
+    next_cursor = rows[page_size - 1]['id'] if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+def iter_result_rows(attempts, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the result rows of `attempts` as tuples, fetched from the database in chunks."""
+    return attempts.values_list(*(field for _, field in RESULT_COLUMNS)).iterator(chunk_size=chunk_size)
+
+class _Echo:
+    """File-like object whose write returns the value, so csv.writer can feed a streaming response."""
+    def write(self, value):
+        return value
+
+def stream_results_csv(attempts):
+    """Yield the results as CSV lines, one row at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in RESULT_COLUMNS])
+    for row in iter_result_rows(attempts):
+        yield writer.writerow(row)
+
+def write_results_xlsx(attempts):
+    """
+    Write the results to a temporary XLSX file and return it, rewound.
+
+    The workbook is opened in write-only mode, which flushes each row as it
+    is appended, so memory use stays flat however many attempts there are.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Results')
+    sheet.append([header for header, _ in RESULT_COLUMNS])
+    for row in iter_result_rows(attempts):
+        # Excel has no time zones; write local times
+        sheet.append([timezone.localtime(value).replace(tzinfo=None) if isinstance(value, datetime) else value for value in row])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+def _roster_key(professor_id):
+    return f'roster:{professor_id}'
+
+def forget_professor_rosters(professor_ids):
+    """Drop the cached rosters of professors whose exams got new or regraded attempts."""
+    cache.delete_many([_roster_key(professor_id) for professor_id in set(professor_ids)])
+
+def professor_roster(professor):
+    """
+    Return every student with their attempts at a professor's exams, cached per professor.
+
+    One grouped query counts the distinct exams each student attempted and
+    finds their last attempt and best score. Students who attempted none are
+    listed with zeros. Rows are dicts ordered by username.
+    """
+    key = _roster_key(professor.id)
+    roster = cache.get(key)
+    if roster is None:
+        of_professor = Q(stuexamattempt__exam__professor=professor)
+        roster = list(
+            User.objects.filter(groups__name='Student')
+            .annotate(
+                exams_attempted=Count('stuexamattempt__exam', filter=of_professor, distinct=True),
+                last_attempt=Max('stuexamattempt__started_at', filter=of_professor),
+                best_score=Max('stuexamattempt__score', filter=of_professor & Q(stuexamattempt__completed_at__isnull=False)),
+            )
+            .order_by('username')
+            .values('id', 'username', 'exams_attempted', 'last_attempt', 'best_score')
+        )
+        cache.set(key, roster, ROSTER_TIMEOUT)
+    return roster
+
+def student_history(student, before=None, page_size=HISTORY_PAGE_SIZE):
+    """
+    Return one page of a student's attempts, newest first, grouped by exam.
+
+    The attempts are read with one query joined to their exam, question paper
+    and professor, and keyset-paginated on the attempt id. Returns a list of
+    exams in the order of their latest attempt on the page, each with its
+    attempts on the page as `exam.attempts`, and the cursor of the next page,
+    or None on the last page.
+    """
+    attempts = StuExamAttempt.objects.filter(student=student)
+    if before:
+        attempts = attempts.filter(id__lt=before)
+    attempts = list(
+        attempts.select_related('exam__question_paper', 'exam__professor')
+        .order_by('-id')[:page_size + 1]
+    )
+    next_cursor = attempts[page_size - 1].id if len(attempts) > page_size else None
+
+    grouped = {}
+    for attempt in attempts[:page_size]:
+        grouped.setdefault(attempt.exam_id, (attempt.exam, []))[1].append(attempt)
+    for exam, exam_page in grouped.values():
+        exam.attempts = exam_page
+    return [exam for exam, _ in grouped.values()], next_cursor
+
+def student_history_stats(student):
+    """Return the totals shown with a student's attempt history, computed in one aggregate query."""
+    return StuExamAttempt.objects.filter(student=student).aggregate(
+        total_exams=Count('exam', distinct=True),
+        total_attempts=Count('id'),
+        average_score=Avg('score', filter=Q(completed_at__isnull=False)),
+        last_attempt_date=Max('started_at'),
+    )
+
+def attempted_exam_ids(student):
+    """Return the ids of the exams a student has attempted."""
+    return set(StuExamAttempt.objects.filter(student=student).values_list('exam_id', flat=True).distinct())
+
+def exam_attempts(student, exam):
+    """
+    Return a student's attempts at an exam, newest first, annotated with their `question_count`.
+
+    Submitted attempts count their graded answers; attempts still open fall
+    back to the number of questions the exam selects.
+    """
+    return (
+        StuExamAttempt.objects.filter(student=student, exam=exam)
+        .annotate(question_count=Coalesce(
+            NullIf(Count('questions'), 0), F('exam__num_questions'), output_field=IntegerField(),
+        ))
+        .order_by('-started_at')
+    )
+
+
+class Leaderboard:
+    """
+    The standings of an exam: its students' best scores and how they spread over its score bins.
+
+    The bins are read in one query when the leaderboard is created. After
+    that, percentiles are looked up in O(bins) without touching the database.
+    A rank costs one count over the (exam, score) index of the best scores.
+    """
+    def __init__(self, exam):
+        self.exam = exam
+        self.bins = [0] * score_bin_count(exam.total_marks)
+        for number, students in ExamScoreBin.objects.filter(exam=exam, number__lt=len(self.bins)).values_list('number', 'students'):
+            self.bins[number] = students
+        self.students = sum(self.bins)
+
+    def percentile(self, score):
+        """
+        Return the percentile rank of `score` among the best scores, or None if there are none.
+
+        This counts the students in the bins below the score's bin and half
+        of those in its bin. It is accurate to the width of a bin.
+        """
+        if not self.students:
+            return None
+        number = score_bin(score, self.exam.total_marks)
+        return round(100 * (sum(self.bins[:number]) + self.bins[number] / 2) / self.students)
+
+    def rank(self, score):
+        """Return the rank of `score`: one more than the number of students whose best score is higher."""
+        return self.exam.best_scores.filter(score__gt=score).count() + 1
+
+    def top(self, limit=LEADERBOARD_SIZE):
+        """Return the `limit` highest best scores with their students."""
+        return list(self.exam.best_scores.select_related('student').order_by('-score', 'id')[:limit])
+
+    def distribution(self):
+        """Return the bins as dicts of their score range, student count and share of the fullest bin, for drawing bars."""
+        width = self.exam.total_marks / len(self.bins)
+        fullest = max(self.bins) or 1
+        return [
+            {'low': round(number * width, 1), 'high': round((number + 1) * width, 1), 'students': students, 'share': round(100 * students / fullest)}
+            for number, students in enumerate(self.bins)
+        ]
+
+def attempt_standing(attempt, exam):
+    """
+    Return the rank and percentile of a graded attempt's score at its exam.
+
+    The result is a dict of rank, students and percentile. Returns None
+    while the attempt is open or being graded, and None if nobody has a
+    best score at the exam yet.
+    """
+    if not attempt.completed_at or attempt.is_grading_pending:
+        return None
+    leaderboard = Leaderboard(exam)
+    if not leaderboard.students:
+        return None
+    return {
+        'rank': leaderboard.rank(attempt.score),
+        'students': leaderboard.students,
+        'percentile': leaderboard.percentile(attempt.score),
+    }
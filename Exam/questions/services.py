@@ -1,15 +1,270 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum
 from django.utils import timezone
-from student.models import Stu_Question
-from utils.llm_validation import ShortAnswerValidationRequest, validate_short_answers_with_llm
+from questions.caching import attach_question_fragments, get_attempt_questions
+from questions.models import sample_question_ids
+from questions.question_models import Question_DB, QuestionStats
+from questions.reports import forget_professor_rosters
+from student.models import AttemptAnswer, ExamBestScore, Stu_Question, StuExamAttempt, StudentStats
+from utils.llm_validation import (
+    ShortAnswerValidationRequest,
+    ShortAnswerValidationResult,
+    normalize_answer,
+    validate_short_answers_with_llm,
+    validate_short_answers_by_question,
+)
 
-def process_exam_submission(attempt, answers):
+logger = logging.getLogger(__name__)
+
+class EmptyAnswerTier:
+    """Awards zero marks to answers left blank."""
+    name = 'empty'
+
+    def grade(self, requests):
+        return [
+            ShortAnswerValidationResult(is_correct=False, explanation="No answer was given.", marks_awarded=0)
+            if not normalize_answer(req.student_answer) else None
+            for req in requests
+        ]
+
+class ExactMatchTier:
+    """Awards full marks to answers identical to the model answer after normalization."""
+    name = 'exact'
+
+    def grade(self, requests):
+        return [
+            ShortAnswerValidationResult(is_correct=True, explanation="Matches the model answer.", marks_awarded=req.max_marks)
+            if normalize_answer(req.correct_answer) and normalize_answer(req.student_answer) == normalize_answer(req.correct_answer) else None
+            for req in requests
+        ]
+
+class SimilarityTier:
+    """
+    Grades answers that are clearly right or clearly wrong by TF-IDF weighted
+    character n-gram cosine similarity to the model answer.
+
+    Answers at or above `accept` get full marks, answers at or below `reject`
+    get zero, and everything in between is left for the next tier. Only
+    answers of at least REJECT_MIN_WORDS words, to a model answer as long, are
+    rejected, and never at zero similarity: a short or reworded answer can be
+    right without sharing the model answer's letters. The IDF is
+    taken over the student and model answer of each pair alone, so n-grams
+    only one of them has weigh more and an answer scores the same whatever
+    else is in the batch. As a few characters can turn a right answer into a
+    wrong one, an answer is only accepted when it also has every word of the
+    model answer in the same order, no number the model answer lacks and the
+    same negations.
+    """
+    name = 'similarity'
+    CHUNK_SIZE = 256
+    REJECT_MIN_WORDS = 4
+    NEGATIONS = frozenset(['not', 'no', 'never', 'none', 'nothing', 'neither', 'nor', 'cannot', 'without'])
+    WORD = re.compile(r"[\w.']+")
+    NUMBER = re.compile(r'^\d+(\.\d+)?$')
+
+    def __init__(self, accept=None, reject=None, ngram=3):
+        self.accept = accept if accept is not None else getattr(settings, 'PREGRADER_ACCEPT_SIMILARITY', 0.95)
+        self.reject = reject if reject is not None else getattr(settings, 'PREGRADER_REJECT_SIMILARITY', 0)
+        self.ngram = ngram
+
+    def _ngrams(self, text):
+        text = f" {normalize_answer(text)} "
+        return [text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)]
+
+    def _words(self, text):
+        return [word.strip(".'") for word in self.WORD.findall(normalize_answer(text)) if word.strip(".'")]
+
+    def acceptable(self, req):
+        """Whether nothing in the answer's words rules out full marks: a missing or moved word, another number or a negation."""
+        student, model = self._words(req.student_answer), self._words(req.correct_answer)
+        negations = lambda words: sorted(word for word in words if word in self.NEGATIONS or word.endswith("n't"))
+        numbers = lambda words: {word for word in words if self.NUMBER.match(word)}
+        remaining = iter(student)
+        in_order = all(word in remaining for word in model)
+        return in_order and numbers(student) <= numbers(model) and negations(student) == negations(model)
+
+    def rejectable(self, req, score):
+        """Whether a low similarity says enough to reject: some overlap, between answers long enough to compare."""
+        return 0 < score <= self.reject and min(len(self._words(req.student_answer)), len(self._words(req.correct_answer))) >= self.REJECT_MIN_WORDS
+
+    def similarities(self, requests):
+        """Return the cosine similarity of each student answer to its model answer."""
+        scores = np.zeros(len(requests))
+        # Work in chunks so the dense term matrices stay small for large batches
+        for start in range(0, len(requests), self.CHUNK_SIZE):
+            chunk = requests[start:start + self.CHUNK_SIZE]
+            vocabulary = {}
+            entries = {'student': ([], []), 'model': ([], [])}
+            for row, req in enumerate(chunk):
+                for side, text in (('student', req.student_answer), ('model', req.correct_answer)):
+                    rows, cols = entries[side]
+                    for gram in self._ngrams(text):
+                        rows.append(row)
+                        cols.append(vocabulary.setdefault(gram, len(vocabulary)))
+            if not vocabulary:
+                continue
+            student = np.zeros((len(chunk), len(vocabulary)))
+            model = np.zeros((len(chunk), len(vocabulary)))
+            np.add.at(student, entries['student'], 1)
+            np.add.at(model, entries['model'], 1)
+
+            # Per pair: 1 where both answers have the n-gram, 2 where only one does
+            document_frequency = (student > 0).astype(int) + (model > 0)
+            idf = np.log(3 / (1 + document_frequency)) + 1
+            student *= idf
+            model *= idf
+            norms = np.linalg.norm(student, axis=1) * np.linalg.norm(model, axis=1)
+            dots = (student * model).sum(axis=1)
+            scores[start:start + len(chunk)] = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+        return scores
+
+    def grade(self, requests):
+        results = []
+        for req, score in zip(requests, self.similarities(requests)):
+            if score >= self.accept and self.acceptable(req):
+                results.append(ShortAnswerValidationResult(
+                    is_correct=True, explanation=f"Closely matches the model answer (similarity {score:.2f}).", marks_awarded=req.max_marks))
+            elif self.rejectable(req, score):
+                results.append(ShortAnswerValidationResult(
+                    is_correct=False, explanation=f"Does not resemble the model answer (similarity {score:.2f}).", marks_awarded=0))
+            else:
+                results.append(None)
+        return results
+
+GRADING_TIERS = {
+    'empty': EmptyAnswerTier,
+    'exact': ExactMatchTier,
+    'similarity': SimilarityTier,
+}
+
+class ShortAnswerGrader:
+    """
+    Grades short answers through a pipeline of cheap local tiers before the LLM.
+
+    Each tier returns a result for the answers it can decide and None for the
+    rest, which move on to the next tier. Answers no tier decides are sent to
+    `validate` (the LLM by default), or left ungraded when `validate` is None.
+    Per-tier hit counts are kept for tuning the similarity thresholds.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        names = getattr(settings, 'PREGRADER_TIERS', list(GRADING_TIERS))
+        return cls([GRADING_TIERS[name]() for name in names])
+
+    def grade(self, requests, validate=validate_short_answers_with_llm):
+        results = [None] * len(requests)
+        hits = Counter(total=len(requests))
+        for tier in self.tiers:
+            undecided = [i for i, result in enumerate(results) if result is None]
+            if not undecided:
+                break
+            for i, result in zip(undecided, tier.grade([requests[i] for i in undecided])):
+                if result is not None:
+                    results[i] = result
+                    hits[tier.name] += 1
+
+        undecided = [i for i, result in enumerate(results) if result is None]
+        if undecided and validate is not None:
+            for i, result in zip(undecided, validate([requests[i] for i in undecided])):
+                results[i] = result
+            hits['llm'] += len(undecided)
+        else:
+            hits['undecided'] += len(undecided)
+
+        with self._lock:
+            self.stats.update(hits)
+        logger.info(f"Short answer grading tiers: {dict(hits)}")
+        return results
+
+    def hit_rates(self):
+        """Return the share of answers decided by each tier since startup."""
+        with self._lock:
+            total = self.stats['total']
+            return {name: count / total for name, count in self.stats.items() if name != 'total'} if total else {}
+
+short_answer_grader = ShortAnswerGrader.from_settings()
+
+def select_attempt_questions(attempt):
+    """
+    Choose the questions of a newly created attempt and save it.
+
+    When the exam has pre-generated variants the attempt is assigned one of
+    them, and the variant's questions are copied to question_ids so the
+    attempt keeps them if the variant is deleted. Otherwise num_questions questions
+    are sampled with a generator seeded by the exam, the attempt and a random
+    seed, and their qno are stored on the attempt, so the selection can be
+    reconstructed from those three values.
+    """
+    exam = attempt.exam
+    variant = exam.get_variant_for(attempt)
+    if variant:
+        attempt.variant = variant
+        attempt.question_ids = variant.question_ids
+        attempt.save()
+        return
+
+    all_qids = exam.question_paper.questions.values_list('qno', flat=True)
+    attempt.question_seed = random.getrandbits(31)
+    attempt.question_ids = sample_question_ids(all_qids, exam.num_questions, exam.id, attempt.id, attempt.question_seed)
+    attempt.save()
+
+def process_exam_submission(attempt, answers, defer_grading=None, submission_key=None):
     """
     Processes the final submission of an exam attempt.
 
     This service handles creating student answer records, calculating scores for
     MCQs, dispatching short answer questions to an LLM for validation, and
     updating the final score and completion time on the attempt object.
+
+    Short answers first go through the local pre-grader tiers. When
+    `defer_grading` is true (defaults to the ASYNC_SHORT_ANSWER_GRADING
+    setting), the answers they cannot decide are stored as pending and the
+    attempt is left for the grading worker instead of waiting on the LLM.
+
+    Submitting is idempotent: the attempt is claimed by setting its
+    `submission_key` with a conditional update before anything is graded,
+    so a repeated or concurrent submission of the same attempt is not graded
+    again and returns the attempt as the first one left it. The answers, the
+    final score and the student's stats and best score are written in one
+    transaction; if grading fails before it commits the claim is released so
+    the attempt can be submitted again. Cache invalidation and analytics
+    flags run once it has committed and never release the claim.
     """
+    if defer_grading is None:
+        defer_grading = getattr(settings, 'ASYNC_SHORT_ANSWER_GRADING', False)
+    submission_key = submission_key or uuid.uuid4().hex
+
+    if not StuExamAttempt.objects.filter(id=attempt.id, submission_key='').update(submission_key=submission_key):
+        attempt.refresh_from_db()
+        return attempt
+    attempt.submission_key = submission_key
+    try:
+        return _grade_submission(attempt, answers, defer_grading)
+    except Exception:
+        # Work after the grading transaction runs in robust on_commit hooks, so
+        # an exception here means the attempt's grading was rolled back
+        StuExamAttempt.objects.filter(id=attempt.id, submission_key=submission_key).update(submission_key='')
+        raise
+
+def _grade_submission(attempt, answers, defer_grading):
     selected_questions = list(attempt.get_selected_questions())
     
     student_questions_to_create = []
@@ -23,14 +278,8 @@ def process_exam_submission(attempt, answers):
         student_ans = answers.get(str(ques.qno), "")
         
         sq = Stu_Question(
-            student=attempt.student,
-            question=ques.question,
-            optionA=ques.optionA or '',
-            optionB=ques.optionB or '',
-            optionC=ques.optionC or '',
-            optionD=ques.optionD or '',
-            answer=ques.mcq_answer if ques.question_type == 'MCQ' else ques.short_answer,
-            choice=student_ans,
+            attempt=attempt, student=attempt.student, question=ques, choice=student_ans,
+            answer_revision=ques.answer_revision,
         )
 
         if ques.question_type == 'MCQ':
@@ -50,88 +299,516 @@ def process_exam_submission(attempt, answers):
             
         student_questions_to_create.append(sq)
 
-    # Handle short answer validation in a batch
+    # Handle short answer validation in a batch. The local tiers always run;
+    # answers they cannot decide go to the LLM now or are left pending.
     if short_answer_requests:
-        llm_results = validate_short_answers_with_llm(short_answer_requests)
+        validate = None if defer_grading else validate_short_answers_with_llm
+        llm_results = short_answer_grader.grade(short_answer_requests, validate=validate)
         for i, result in enumerate(llm_results):
             if sq_to_update := short_answer_map.get(i):
+                if result is None:
+                    sq_to_update.grading_pending = True
+                    continue
                 sq_to_update.marks_awarded = result.marks_awarded
                 sq_to_update.llm_explanation = result.explanation
                 exam_score += result.marks_awarded
 
     # Bulk create all student questions and finalize the attempt
-    attempt.questions.clear()
-    created_questions = Stu_Question.objects.bulk_create(student_questions_to_create)
-    attempt.questions.add(*created_questions)
-    
-    attempt.score = exam_score
-    attempt.completed_at = timezone.now()
-    attempt.save()
+    with transaction.atomic():
+        StuExamAttempt.objects.select_for_update().filter(id=attempt.id).exists()
+        attempt.questions.all().delete()
+        created_questions = Stu_Question.objects.bulk_create(student_questions_to_create)
+
+        # Scores are stored as whole marks; keep the attempt and the stats on the stored value
+        attempt.score = int(exam_score)
+        attempt.completed_at = timezone.now()
+        if any(sq.grading_pending for sq in student_questions_to_create):
+            attempt.grading_status = 'pending'
+        else:
+            attempt.grading_status = 'complete'
+        attempt.review_snapshot = build_review_snapshot(attempt, selected_questions, created_questions)
+        attempt.save()
+        StudentStats.record(attempt.student_id, completed_count=1, total_score=attempt.score)
+        if attempt.grading_status == 'complete':
+            ExamBestScore.record(attempt.exam, attempt.student_id, attempt.score)
+            transaction.on_commit(lambda: QuestionStats.mark_stale(ques.qno for ques in selected_questions), robust=True)
+        transaction.on_commit(lambda: forget_professor_rosters([attempt.exam.professor_id]), robust=True)
     return attempt
 
-def prepare_review_data(attempt):
+def _short_answer_request(student_question):
+    ques = student_question.question
+    return ShortAnswerValidationRequest(
+        question=ques.question,
+        correct_answer=ques.short_answer or '',
+        student_answer=student_question.choice or '',
+        max_marks=ques.max_marks
+    )
+
+def grade_pending_attempt(attempt):
     """
-    Prepares the data required for the exam review page.
+    Grades the short answers an attempt left pending at submission.
 
-    This service fetches the original questions, the student's answers, and
-    the LLM feedback, then computes summary statistics for display.
+    The pending answers are validated with the LLM in one batch, written back
+    to their Stu_Question rows, and the attempt score is recomputed from all
+    of its answers.
     """
-    questions_from_bank = list(attempt.get_selected_questions())
-    student_question_map = {sq.question: sq for sq in attempt.questions.all()}
-    
-    review_data = []
-    correct_count = 0
-    wrong_count = 0
-    not_attempted_count = 0
-    total_possible_marks = 0
+    pending_questions = list(attempt.questions.filter(grading_pending=True).select_related('question'))
+    short_answer_requests = [_short_answer_request(sq) for sq in pending_questions]
+
+    if short_answer_requests:
+        llm_results = validate_short_answers_with_llm(short_answer_requests)
+        for sq, result in zip(pending_questions, llm_results):
+            sq.marks_awarded = result.marks_awarded
+            sq.llm_explanation = result.explanation
+            sq.grading_pending = False
+            sq.answer_revision = sq.question.answer_revision
+        Stu_Question.objects.bulk_update(pending_questions, ['marks_awarded', 'llm_explanation', 'grading_pending', 'answer_revision'])
+
+    with transaction.atomic():
+        # The stats move by the change of the stored score, read under the same lock it is written under
+        previous_score = StuExamAttempt.objects.select_for_update().values_list('score', flat=True).get(id=attempt.id)
+        attempt.score = int(attempt.questions.aggregate(total=Sum('marks_awarded'))['total'] or 0)
+        attempt.grading_status = 'complete'
+        attempt.review_snapshot = build_review_snapshot(attempt)
+        attempt.save(update_fields=['score', 'grading_status', 'review_snapshot'])
+        StudentStats.record(attempt.student_id, total_score=attempt.score - previous_score)
+        ExamBestScore.record(attempt.exam, attempt.student_id, attempt.score)
+        transaction.on_commit(lambda: forget_professor_rosters([attempt.exam.professor_id]), robust=True)
+        transaction.on_commit(lambda: QuestionStats.mark_stale(attempt.questions.values_list('question_id', flat=True)), robust=True)
+    return attempt
+
+def claim_pending_attempts(limit, exclude_ids=(), exam=None):
+    """
+    Claims up to `limit` pending attempts for grading, optionally of one exam.
+
+    Each attempt is claimed with a conditional update so that several worker
+    processes can drain the same queue without grading an attempt twice.
+    """
+    pending = StuExamAttempt.objects.filter(grading_status='pending')
+    if exam is not None:
+        pending = pending.filter(exam=exam)
+    candidate_ids = list(
+        pending.exclude(id__in=exclude_ids)
+        .order_by('completed_at')
+        .values_list('id', flat=True)[:limit]
+    )
+    now = timezone.now()
+    claimed_ids = []
+    for attempt_id in candidate_ids:
+        if StuExamAttempt.objects.filter(id=attempt_id, grading_status='pending').update(grading_status='in_progress', grading_claimed_at=now):
+            claimed_ids.append(attempt_id)
+    return claimed_ids
+
+def requeue_stale_claims(stale_after):
+    """
+    Puts back in the queue the attempts claimed for grading more than
+    `stale_after` (a timedelta) ago, which a stopped worker left in progress.
+
+    Younger claims are left alone, since a live worker may still be grading
+    them. Returns the number of attempts requeued.
+    """
+    return (
+        StuExamAttempt.objects.filter(grading_status='in_progress')
+        .filter(Q(grading_claimed_at__lt=timezone.now() - stale_after) | Q(grading_claimed_at__isnull=True))
+        .update(grading_status='pending')
+    )
+
+def _grade_claimed_attempt(attempt_id):
+    try:
+        attempt = StuExamAttempt.objects.select_related('exam', 'qpaper', 'variant').get(id=attempt_id)
+        grade_pending_attempt(attempt)
+        return True
+    except Exception as e:
+        logger.error(f"Grading failed for attempt {attempt_id}: {e}")
+        StuExamAttempt.objects.filter(id=attempt_id, grading_status='in_progress').update(grading_status='pending')
+        return False
+    finally:
+        # Worker threads open their own connections; release them once done.
+        connection.close()
+
+def grading_workers(workers=None):
+    """
+    Return how many threads a grading worker runs: `workers`, else the
+    GRADING_WORKERS setting, else 1 on SQLite and 4 on other databases.
+
+    SQLite takes a lock on the whole database for every write, so concurrent
+    grading threads mostly fail with "database is locked" there.
+    """
+    if workers:
+        return workers
+    if getattr(settings, 'GRADING_WORKERS', 0):
+        return settings.GRADING_WORKERS
+    return 1 if connection.vendor == 'sqlite' else 4
 
-    for ques_db in questions_from_bank:
-        student_question = student_question_map.get(ques_db.question)
+def drain_grading_queue(batch_size=50, workers=None):
+    """
+    Grades pending attempts with a local thread pool until the queue is empty.
+
+    Attempts that fail are put back in the queue but are not retried within
+    the same call. Returns a (graded, failed) tuple of counts.
+    """
+    workers = grading_workers(workers)
+    graded = 0
+    failed_ids = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            attempt_ids = claim_pending_attempts(batch_size, exclude_ids=failed_ids)
+            if not attempt_ids:
+                break
+            for attempt_id, ok in zip(attempt_ids, pool.map(_grade_claimed_attempt, attempt_ids)):
+                if ok:
+                    graded += 1
+                else:
+                    failed_ids.append(attempt_id)
+    return graded, len(failed_ids)
+
+def claim_expired_attempts(limit, exclude_ids=(), grace_seconds=0):
+    """
+    Claims up to `limit` open attempts whose end_time passed at least
+    `grace_seconds` ago, oldest first. Returns the claimed ids and the
+    claim time they were marked completed at.
+
+    An attempt is claimed by setting its completed_at with a conditional
+    update, so a final submission or another sweeper racing on the same
+    attempt cannot finalize it twice.
+    """
+    now = timezone.now()
+    candidate_ids = list(
+        StuExamAttempt.objects.filter(completed_at__isnull=True, end_time__lt=now - timedelta(seconds=grace_seconds))
+        .exclude(id__in=exclude_ids)
+        .order_by('end_time')
+        .values_list('id', flat=True)[:limit]
+    )
+    claimed_ids = []
+    for attempt_id in candidate_ids:
+        if StuExamAttempt.objects.filter(id=attempt_id, completed_at__isnull=True).update(completed_at=now):
+            claimed_ids.append(attempt_id)
+    return claimed_ids, now
+
+def _finalize_claimed_attempt(attempt_id, answers, claimed_at):
+    try:
+        attempt = StuExamAttempt.objects.select_related('exam', 'qpaper', 'variant').get(id=attempt_id)
+        process_exam_submission(attempt, answers, submission_key='expired')
+        return True
+    except Exception as e:
+        logger.error(f"Finalizing expired attempt {attempt_id} failed: {e}")
+        # Reopen the attempt only if it is still our claim and no submission
+        # holds it: a committed grading leaves its submission_key set, and so
+        # does a student's own submission that won the race.
+        StuExamAttempt.objects.filter(id=attempt_id, completed_at=claimed_at, submission_key='').update(completed_at=None)
+        return False
+    finally:
+        # Worker threads open their own connections; release them once done.
+        connection.close()
+
+def finalize_expired_attempts(batch_size=200, workers=None, grace_seconds=0):
+    """
+    Grades and closes the attempts students left open past their end_time.
+
+    Expired attempts are claimed a batch at a time, their saved answers are
+    loaded with one query per batch, and each attempt is submitted through
+    process_exam_submission on a bounded thread pool, so short answers are
+    deferred to the grading queue like any other submission. Attempts that
+    fail are reopened but not retried within the same call. Returns a
+    (finalized, failed) tuple of counts.
+    """
+    workers = grading_workers(workers)
+    finalized = 0
+    failed_ids = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            attempt_ids, claimed_at = claim_expired_attempts(batch_size, exclude_ids=failed_ids, grace_seconds=grace_seconds)
+            if not attempt_ids:
+                break
+            answers = {attempt_id: {} for attempt_id in attempt_ids}
+            for attempt_id, qno, answer in AttemptAnswer.objects.filter(attempt_id__in=attempt_ids).values_list('attempt_id', 'question_id', 'answer'):
+                answers[attempt_id][str(qno)] = answer
+            results = pool.map(_finalize_claimed_attempt, attempt_ids, [answers[attempt_id] for attempt_id in attempt_ids], [claimed_at] * len(attempt_ids))
+            for attempt_id, ok in zip(attempt_ids, results):
+                if ok:
+                    finalized += 1
+                else:
+                    failed_ids.append(attempt_id)
+    return finalized, len(failed_ids)
+
+def grade_exam_pending_answers(exam, batch_size=500):
+    """
+    Grades the pending short answers of all attempts of an exam together.
+
+    Pending answers are collected across attempts and grouped by question, so
+    each LLM prompt states the question and model answer once followed by many
+    student answers. Each attempt's marks and score are then written in a
+    transaction of its own, so one failing attempt is put back in the queue
+    without losing the others; a failed LLM call puts back its whole batch.
+    Failed attempts are not retried within the same call. Returns a
+    (graded, failed) tuple of counts.
+    """
+    graded = 0
+    failed_ids = []
+    while True:
+        attempt_ids = claim_pending_attempts(batch_size, exclude_ids=failed_ids, exam=exam)
+        if not attempt_ids:
+            return graded, len(failed_ids)
+        try:
+            pending_questions = list(
+                Stu_Question.objects.filter(grading_pending=True, attempt_id__in=attempt_ids).select_related('question')
+            )
+            short_answer_requests = [_short_answer_request(sq) for sq in pending_questions]
+            llm_results = validate_short_answers_by_question(short_answer_requests) if short_answer_requests else []
+        except Exception as e:
+            logger.error(f"Grading failed for attempts {attempt_ids} of exam {exam.id}: {e}")
+            StuExamAttempt.objects.filter(id__in=attempt_ids, grading_status='in_progress').update(grading_status='pending')
+            failed_ids.extend(attempt_ids)
+            continue
+
+        graded_questions = {}
+        for sq, result in zip(pending_questions, llm_results):
+            sq.marks_awarded = result.marks_awarded
+            sq.llm_explanation = result.explanation
+            sq.grading_pending = False
+            sq.answer_revision = sq.question.answer_revision
+            graded_questions.setdefault(sq.attempt_id, []).append(sq)
+
+        attempts = StuExamAttempt.objects.filter(id__in=attempt_ids).select_related('exam', 'qpaper', 'variant')
+        committed = []
+        for attempt in attempts:
+            try:
+                with transaction.atomic():
+                    Stu_Question.objects.bulk_update(graded_questions.get(attempt.id, []), ['marks_awarded', 'llm_explanation', 'grading_pending', 'answer_revision'])
+                    attempt.score = int(attempt.questions.aggregate(total=Sum('marks_awarded'))['total'] or 0)
+                    attempt.grading_status = 'complete'
+                    attempt.review_snapshot = build_review_snapshot(attempt)
+                    attempt.save(update_fields=['score', 'grading_status', 'review_snapshot'])
+                    ExamBestScore.record(exam, attempt.student_id, attempt.score)
+                committed.append(attempt)
+            except Exception as e:
+                logger.error(f"Grading failed for attempt {attempt.id}: {e}")
+                StuExamAttempt.objects.filter(id=attempt.id, grading_status='in_progress').update(grading_status='pending')
+                failed_ids.append(attempt.id)
+
+        if committed:
+            StudentStats.rebuild({attempt.student_id for attempt in committed})
+            forget_professor_rosters([exam.professor_id])
+            QuestionStats.mark_stale(
+                Stu_Question.objects.filter(attempt__in=committed).values_list('question_id', flat=True)
+            )
+        graded += len(committed)
+
+def regrade_questions(question_ids, chunk_size=5000):
+    """
+    Regrades every recorded answer to the given questions after their answer key or marks changed.
+
+    Answers are read in id-ordered chunks of `chunk_size` rows, so the work
+    takes bounded memory however many there are. MCQ answers are marked
+    again against the current mcq_answer and max_marks with vectorized
+    comparisons. Short answers graded against an older model answer or
+    max_marks are put back in the grading queue; the others keep their
+    marks. Changed answers are written with bulk updates, then
+    the scores of the affected attempts are recomputed and their review
+    snapshots dropped, to be rebuilt on the next visit. Returns a dict of
+    counts: answers, changed, requeued and attempts.
+    """
+    questions = Question_DB.objects.filter(qno__in=question_ids).values_list('qno', 'question_type', 'mcq_answer', 'max_marks', 'answer_revision')
+    mcq_keys, max_marks, is_short, revisions = {}, {}, {}, {}
+    for qno, question_type, mcq_answer, marks, answer_revision in questions:
+        mcq_keys[qno] = (mcq_answer or '').upper() if question_type == 'MCQ' else ''
+        max_marks[qno] = marks
+        is_short[qno] = question_type == 'SHORT'
+        revisions[qno] = answer_revision
+
+    counts = Counter(answers=0, changed=0, requeued=0)
+    affected_attempts = set()
+    affected_exams = set()
+    requeued_attempts = set()
+    last_id = 0
+    while mcq_keys:
+        rows = list(
+            Stu_Question.objects.filter(question_id__in=list(mcq_keys), id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'attempt_id', 'question_id', 'choice', 'marks_awarded', 'answer_revision', 'grading_pending')[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ids, attempt_ids, qnos, choices, marks, graded_revisions, pending = (np.array(column) for column in zip(*rows))
+
+        # Look the key of each answer's question up through the distinct questions of the chunk
+        chunk_qnos, question_index = np.unique(qnos, return_inverse=True)
+        keys = np.array([mcq_keys[qno] for qno in chunk_qnos])[question_index]
+        full_marks = np.array([max_marks[qno] for qno in chunk_qnos], dtype=float)[question_index]
+        short = np.array([is_short[qno] for qno in chunk_qnos])[question_index]
+        current_revisions = np.array([revisions[qno] for qno in chunk_qnos])[question_index]
+
+        correct = (np.char.upper(choices.astype(str)) == keys) & (keys != '')
+        new_marks = np.where(short, np.minimum(marks, full_marks), np.where(correct, full_marks, 0.0))
+        requeue = short & ~pending & (graded_revisions != current_revisions)
+        new_marks[requeue] = 0.0
+        changed = requeue | (new_marks != marks)
+
+        Stu_Question.objects.bulk_update(
+            [Stu_Question(id=int(i), marks_awarded=float(m)) for i, m in zip(ids[changed & ~requeue], new_marks[changed & ~requeue])],
+            ['marks_awarded'], batch_size=500,
+        )
+        Stu_Question.objects.bulk_update(
+            [Stu_Question(id=int(i), marks_awarded=0.0, llm_explanation='', grading_pending=True) for i in ids[requeue]],
+            ['marks_awarded', 'llm_explanation', 'grading_pending'], batch_size=500,
+        )
+        affected_attempts.update(attempt_ids[changed].tolist())
+        requeued_attempts.update(attempt_ids[requeue].tolist())
+        counts['answers'] += len(rows)
+        counts['changed'] += int(changed.sum())
+        counts['requeued'] += int(requeue.sum())
+
+    affected_attempts = sorted(affected_attempts)
+    for start in range(0, len(affected_attempts), 500):
+        chunk = affected_attempts[start:start + 500]
+        scores = dict(
+            Stu_Question.objects.filter(attempt_id__in=chunk)
+            .values_list('attempt_id')
+            .annotate(total=Sum('marks_awarded'))
+        )
+        StuExamAttempt.objects.bulk_update(
+            [StuExamAttempt(id=attempt_id, score=scores.get(attempt_id) or 0, review_snapshot=None) for attempt_id in chunk],
+            ['score', 'review_snapshot'],
+        )
+        StuExamAttempt.objects.filter(id__in=requeued_attempts.intersection(chunk)).update(grading_status='pending')
+        owners = list(StuExamAttempt.objects.filter(id__in=chunk).values_list('student_id', 'exam__professor_id', 'exam_id'))
+        StudentStats.rebuild({student_id for student_id, _, _ in owners})
+        forget_professor_rosters(professor_id for _, professor_id, _ in owners)
+        affected_exams.update(exam_id for _, _, exam_id in owners)
+        # The rest scores behind the discrimination of the attempts' other questions changed too
+        QuestionStats.mark_stale(Stu_Question.objects.filter(attempt_id__in=chunk).values_list('question_id', flat=True).distinct())
+    # Scores may have gone down, so the best scores are recomputed rather than raised
+    ExamBestScore.rebuild(affected_exams)
+    counts['attempts'] = len(affected_attempts)
+    return dict(counts)
+
+def build_exam_paper(attempt):
+    """
+    Build the full question set of an attempt for the exam page to paginate client-side.
+
+    Returns an (etag, paper) tuple. The ETag is a digest of the paper, so a
+    reloaded exam page revalidates it instead of downloading it again, and an
+    edited question yields a new one. Answers are not part of the paper as they
+    change on every autosave.
+    """
+    questions = attach_question_fragments(get_attempt_questions(attempt))
+    paper = {
+        'attempt': attempt.id,
+        'exam': attempt.exam.name,
+        'questions': [
+            {
+                'qno': ques.qno,
+                'number': number,
+                'question_type': ques.question_type,
+                'question': ques.fragments['question'],
+                'options': ques.fragments['options'] if ques.question_type == 'MCQ' else None,
+                'max_marks': ques.max_marks,
+                'image': ques.question_image.url if ques.question_image else None,
+            }
+            for number, ques in enumerate(questions, start=1)
+        ],
+    }
+    digest = hashlib.sha1(json.dumps(paper, sort_keys=True).encode('utf-8')).hexdigest()
+    return digest, paper
+
+def build_review_snapshot(attempt, questions=None, student_questions=None):
+    """
+    Computes the review snapshot of an attempt: the outcome of each question and the summary counts.
+
+    Only what is specific to the attempt is kept, as a compact JSON-ready
+    dict; the question content is added back from the cached fragments when
+    the review page is served. `questions` and `student_questions` may be
+    given when the caller already has them loaded.
+    """
+    if questions is None:
+        questions = get_attempt_questions(attempt)
+    if student_questions is None:
+        student_questions = attempt.questions.all()
+    student_question_map = {sq.question_id: sq for sq in student_questions}
+
+    items = []
+    counts = Counter()
+    total_possible_marks = 0
+    for ques_db in questions:
+        student_question = student_question_map.get(ques_db.qno)
         student_ans = student_question.choice if student_question else ""
-        
-        is_correct = False
-        marks_awarded = 0.0
-        llm_explanation = ""
-        
-        if student_question:
-            marks_awarded = student_question.marks_awarded
-            if ques_db.question_type == 'SHORT':
-                llm_explanation = student_question.llm_explanation
+        marks_awarded = student_question.marks_awarded if student_question else 0.0
+        grading_pending = student_question.grading_pending if student_question else False
+        llm_explanation = student_question.llm_explanation if student_question and ques_db.question_type == 'SHORT' else ""
+
+        items.append({
+            'qno': ques_db.qno,
+            'answer': student_ans,
+            'marks': marks_awarded,
+            'explanation': llm_explanation,
+            'pending': grading_pending,
+        })
+        total_possible_marks += ques_db.max_marks
 
-        is_correct = marks_awarded == ques_db.max_marks
+        if not student_ans:
+            counts['not_attempted'] += 1
+        elif grading_pending:
+            counts['pending'] += 1
+        elif marks_awarded == ques_db.max_marks:
+            counts['correct'] += 1
+        else:
+            counts['wrong'] += 1
 
+    return {
+        'items': items,
+        'summary': {
+            'correct': counts['correct'],
+            'wrong': counts['wrong'],
+            'not_attempted': counts['not_attempted'],
+            'pending': counts['pending'],
+            'total_possible_marks': total_possible_marks,
+        },
+    }
+
+def prepare_review_data(attempt):
+    """
+    Prepares the data required for the exam review page.
+
+    The review is served from the attempt's snapshot and the cached question
+    fragments. Attempts completed before snapshots existed get theirs built
+    and stored on the first visit.
+    """
+    snapshot = attempt.review_snapshot
+    if snapshot is None:
+        snapshot = build_review_snapshot(attempt)
+        if attempt.completed_at and not attempt.is_grading_pending:
+            attempt.review_snapshot = snapshot
+            StuExamAttempt.objects.filter(id=attempt.id).update(review_snapshot=snapshot)
+
+    questions = {q.qno: q for q in attach_question_fragments(get_attempt_questions(attempt))}
+    review_data = []
+    for item in snapshot['items']:
+        ques_db = questions.get(item['qno'])
+        if ques_db is None:
+            continue
         review_data.append({
+            'question_id': ques_db.qno,
             'question_type': ques_db.question_type,
-            'question': ques_db.question,
-            'optionA': ques_db.optionA or '',
-            'optionB': ques_db.optionB or '',
-            'optionC': ques_db.optionC or '',
-            'optionD': ques_db.optionD or '',
+            'question': ques_db.fragments['question'],
+            'optionA': ques_db.fragments['options']['A'],
+            'optionB': ques_db.fragments['options']['B'],
+            'optionC': ques_db.fragments['options']['C'],
+            'optionD': ques_db.fragments['options']['D'],
             'mcq_answer': ques_db.mcq_answer or '',
             'short_answer': ques_db.short_answer or '',
-            'student_answer': student_ans,
-            'is_correct': is_correct,
-            'solution': ques_db.solution or '',
-            'marks_awarded': marks_awarded,
-            'llm_explanation': llm_explanation,
+            'student_answer': item['answer'],
+            'is_correct': item['marks'] == ques_db.max_marks,
+            'solution': ques_db.fragments['solution'],
+            'marks_awarded': item['marks'],
+            'llm_explanation': item['explanation'],
             'max_marks': ques_db.max_marks,
+            'grading_pending': item['pending'],
         })
-        
-        total_possible_marks += ques_db.max_marks
-        
-        if not student_ans:
-            not_attempted_count += 1
-        elif is_correct:
-            correct_count += 1
-        else:
-            wrong_count += 1
 
     summary = {
         'total_marks': attempt.score,
-        'correct': correct_count,
-        'wrong': wrong_count,
-        'not_attempted': not_attempted_count,
-        'total_possible_marks': total_possible_marks
+        'grading_pending': attempt.is_grading_pending,
+        **snapshot['summary'],
     }
-    
-    return review_data, summary 
\ No newline at end of file
+    return review_data, summary
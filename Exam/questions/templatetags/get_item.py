@@ -3,7 +3,8 @@ register = template.Library()
 
 @register.filter
 def get_item(dictionary, key):
-    return dictionary.get(key, '')
+    # Saved answers are keyed by the question number as a string
+    return dictionary.get(key, dictionary.get(str(key), ''))
 
 @register.filter
 def get_item_option(question, letter):
@@ -1,9 +1,620 @@
-from django.test import TestCase
-
-# Create your tests here.
+import csv
+import openai
+from datetime import timedelta
+from unittest import mock, skipUnless
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from questions import caching, checks, math_render, services
+from questions.analytics import refresh_item_stats
+from questions.caching import AdmissionGate, get_exam, get_exam_questions, record_grading_worker
+from questions.models import Exam_Model
+from questions.question_models import Question_DB, QuestionStats
+from questions.questionpaper_models import Question_Paper
+from questions.reports import (
+    professor_results, professor_roster, result_page, stream_results_csv, student_history, student_history_stats,
+)
+from questions.services import SimilarityTier
+from student.models import StuExamAttempt, StudentStats
+from utils import llm_standin_server, llm_validation, openai_client
+from utils.llm_validation import ShortAnswerValidationResult, ShortAnswerValidationRequest
 
 # In test data creation and assertions, use mcq_answer for MCQ and short_answer for Short Answer
 # Example:
 # Question_DB.objects.create(question_type='MCQ', ..., mcq_answer='A', ...)
 # Question_DB.objects.create(question_type='SHORT', ..., short_answer='Some answer', ...)
 # And update any assertions to check these fields
+
+def make_paper(professor, mcqs=4, shorts=2):
+    """Create a question paper of `mcqs` one-mark MCQs answered A and `shorts` two-mark short answers."""
+    questions = [
+        Question_DB.objects.create(professor=professor, question_type='MCQ', question=f'MCQ {i}?', optionA='a', optionB='b',
+                                   optionC='c', optionD='d', mcq_answer='A', max_marks=1)
+        for i in range(mcqs)
+    ] + [
+        Question_DB.objects.create(professor=professor, question_type='SHORT', question=f'Short {i}?',
+                                   short_answer=f'the answer is {i}', max_marks=2)
+        for i in range(shorts)
+    ]
+    paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper')
+    paper.questions.set(questions)
+    return paper, questions
+
+def make_exam(professor, paper, questions, **fields):
+    fields.setdefault('total_marks', sum(question.max_marks for question in questions))
+    return Exam_Model.objects.create(professor=professor, name='Exam', question_paper=paper, num_questions=len(questions), **fields)
+
+def submit(student, exam, answers, **kwargs):
+    """Start an attempt of the exam and submit `answers`, a {qno: answer} dict."""
+    attempt = StuExamAttempt.objects.create(student=student, exam=exam, qpaper=exam.question_paper)
+    services.select_attempt_questions(attempt)
+    return services.process_exam_submission(attempt, {str(qno): answer for qno, answer in answers.items()}, **kwargs)
+
+def full_marks(requests):
+    return [ShortAnswerValidationResult(is_correct=True, explanation='Correct.', marks_awarded=req.max_marks) for req in requests]
+
+MODEL_ANSWER = 'Photosynthesis converts light energy into chemical energy stored in glucose.'
+
+def short_answer(student_answer, correct_answer=MODEL_ANSWER):
+    return ShortAnswerValidationRequest(question='What does photosynthesis do?', correct_answer=correct_answer,
+                                        student_answer=student_answer, max_marks=2)
+
+
+class SimilarityTierTests(SimpleTestCase):
+    def setUp(self):
+        self.tier = SimilarityTier(accept=0.95, reject=0.05)
+
+    def grade(self, student_answer, correct_answer=MODEL_ANSWER):
+        return self.tier.grade([short_answer(student_answer, correct_answer)])[0]
+
+    def test_close_answer_gets_full_marks(self):
+        result = self.grade('photosynthesis converts light energy into chemical energy stored in glucose')
+        self.assertEqual(result.marks_awarded, 2)
+
+    def test_unrelated_answer_gets_zero(self):
+        self.assertEqual(self.grade('The mitochondria is the powerhouse of the cell').marks_awarded, 0)
+
+    def test_synonyms_are_left_for_the_llm(self):
+        synonyms = [('H2O', 'water'), ('four', '4'), ('The powerhouse of the cell', 'mitochondria'),
+                    ('It is the organelle that makes energy', 'The mitochondria supply the cell with chemical energy')]
+        for answer, correct_answer in synonyms:
+            with self.subTest(answer=answer):
+                self.assertIsNone(self.grade(answer, correct_answer))
+
+    def test_rejecting_is_off_by_default(self):
+        self.assertIsNone(SimilarityTier().grade([short_answer('The mitochondria is the powerhouse of the cell')])[0])
+
+    def test_similarity_does_not_depend_on_the_batch(self):
+        request = short_answer('Photosynthesis turns light energy into chemical energy in glucose')
+        others = [short_answer(f'answer number {i} about something else entirely') for i in range(300)]
+        alone = self.tier.similarities([request])[0]
+        self.assertEqual(self.tier.similarities([request] + others)[0], alone)
+        self.assertEqual(self.tier.similarities(others[:100] + [request])[100], alone)
+
+    def test_negated_answer_is_left_for_the_llm(self):
+        negated = [
+            'Photosynthesis does not convert light energy into chemical energy stored in glucose.',
+            "Photosynthesis doesn't convert light energy into chemical energy stored in glucose.",
+        ]
+        for answer in negated:
+            with self.subTest(answer=answer):
+                self.assertIsNone(self.grade(answer))
+        # Dropping the model answer's negation is a near miss too
+        self.assertIsNone(self.grade('Light energy is stored', 'Light energy is not stored'))
+
+    def test_near_misses_are_left_for_the_llm(self):
+        near_misses = [
+            ('Photosynthesis converts chemical energy into light energy stored in glucose.', MODEL_ANSWER),
+            ('Photosynthesis converts light energy into chemical energy stored in fructose.', MODEL_ANSWER),
+            ('The area of the circle is 3.15 square metres', 'The area of the circle is 3.14 square metres'),
+            ('The area of the circle is 3.14 or 4 square metres', 'The area of the circle is 3.14 square metres'),
+        ]
+        for answer, correct_answer in near_misses:
+            with self.subTest(answer=answer):
+                self.assertIsNone(self.grade(answer, correct_answer))
+
+
+class ExamVariantTests(TestCase):
+    def setUp(self):
+        self.professor = User.objects.create(username='prof')
+        self.paper, self.questions = make_paper(self.professor, mcqs=6, shorts=0)
+        self.exam = Exam_Model.objects.create(professor=self.professor, name='Exam', total_marks=4,
+                                              question_paper=self.paper, num_questions=4, variant_count=3)
+
+    def variant_sizes(self):
+        return sorted((variant.number, len(variant.question_ids)) for variant in self.exam.variants.all())
+
+    def test_saving_generates_the_variants(self):
+        self.assertEqual(self.variant_sizes(), [(0, 4), (1, 4), (2, 4)])
+
+    def test_unused_variants_are_redrawn_when_the_exam_changes(self):
+        self.exam.num_questions = 2
+        self.exam.variant_count = 2
+        self.exam.save()
+        self.assertEqual(self.variant_sizes(), [(0, 2), (1, 2)])
+
+        other_paper, other_questions = make_paper(self.professor, mcqs=3, shorts=0)
+        self.exam.question_paper = other_paper
+        self.exam.save()
+        qnos = {question.qno for question in other_questions}
+        self.assertTrue(all(qnos.issuperset(variant.question_ids) for variant in self.exam.variants.all()))
+
+    def test_saving_an_unchanged_exam_keeps_the_variants(self):
+        before = list(self.exam.variants.values_list('id', flat=True))
+        self.exam.name = 'Renamed'
+        self.exam.save()
+        self.assertEqual(list(self.exam.variants.values_list('id', flat=True)), before)
+
+    def test_attempted_exams_and_variants_can_be_deleted(self):
+        student = User.objects.create(username='student')
+        attempt = StuExamAttempt.objects.create(student=student, exam=self.exam, qpaper=self.paper)
+        services.select_attempt_questions(attempt)
+        questions = attempt.get_question_ids()
+        attempt.variant.delete()
+        attempt.refresh_from_db()
+        self.assertIsNone(attempt.variant)
+        self.assertEqual(attempt.get_question_ids(), questions)
+
+        self.exam.delete()
+        self.assertFalse(StuExamAttempt.objects.exists())
+
+    def test_clean_refuses_changes_once_attempts_use_a_variant(self):
+        student = User.objects.create(username='student')
+        StuExamAttempt.objects.create(student=student, exam=self.exam, qpaper=self.paper, variant=self.exam.variants.get(number=0))
+        self.exam.num_questions = 2
+        with self.assertRaises(ValidationError):
+            self.exam.clean()
+        self.exam.num_questions = 4
+        self.exam.variant_count = 5
+        self.exam.clean()
+
+
+class RegradeTests(TestCase):
+    def setUp(self):
+        self.professor = User.objects.create(username='prof')
+        self.paper, self.questions = make_paper(self.professor, mcqs=2, shorts=1)
+        self.mcq, self.short = self.questions[0], self.questions[2]
+        self.exam = make_exam(self.professor, self.paper, self.questions)
+        self.student = User.objects.create(username='student')
+        answers = {question.qno: 'A' for question in self.questions[:2]}
+        answers[self.short.qno] = self.short.short_answer
+        self.attempt = submit(self.student, self.exam, answers, defer_grading=True)
+
+    def test_submission_grades_mcqs_and_exact_short_answers(self):
+        self.assertEqual(self.attempt.score, 4)
+        self.assertEqual(self.attempt.grading_status, 'complete')
+
+    def test_changed_mcq_answer_is_marked_again(self):
+        self.mcq.mcq_answer = 'B'
+        self.mcq.save()
+        counts = services.regrade_questions([self.mcq.qno])
+        self.assertEqual((counts['changed'], counts['requeued']), (1, 0))
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 3)
+
+    def test_max_marks_change_requeues_the_short_answer(self):
+        self.short.max_marks = 4
+        self.short.save()
+        counts = services.regrade_questions([self.short.qno])
+        self.assertEqual(counts['requeued'], 1)
+        answer = self.attempt.questions.get(question=self.short)
+        self.assertTrue(answer.grading_pending)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.grading_status, 'pending')
+
+        with mock.patch.object(services, 'validate_short_answers_by_question', side_effect=full_marks):
+            self.assertEqual(services.grade_exam_pending_answers(self.exam), (1, 0))
+        answer.refresh_from_db()
+        self.attempt.refresh_from_db()
+        self.assertEqual((answer.marks_awarded, answer.grading_pending), (4, False))
+        self.assertEqual((self.attempt.score, self.attempt.grading_status), (6, 'complete'))
+
+    def test_unchanged_short_answer_keeps_its_marks(self):
+        self.short.solution = 'Explained.'
+        self.short.save()
+        counts = services.regrade_questions([self.short.qno])
+        self.assertEqual((counts['changed'], counts['requeued']), (0, 0))
+
+
+
+class ExamGradingTests(TestCase):
+    def setUp(self):
+        self.professor = User.objects.create(username='prof')
+        self.paper, self.questions = make_paper(self.professor, mcqs=1, shorts=1)
+        self.exam = make_exam(self.professor, self.paper, self.questions)
+        answers = {self.questions[0].qno: 'A', self.questions[1].qno: 'something else entirely'}
+        self.attempts = [
+            submit(User.objects.create(username=f'student{i}'), self.exam, answers, defer_grading=True)
+            for i in range(2)
+        ]
+
+    def test_failing_attempt_is_requeued_without_losing_the_others(self):
+        good, bad = self.attempts
+        build_review_snapshot = services.build_review_snapshot
+
+        def snapshot(attempt, *args, **kwargs):
+            if attempt.id == bad.id:
+                raise RuntimeError('boom')
+            return build_review_snapshot(attempt, *args, **kwargs)
+
+        with mock.patch.object(services, 'validate_short_answers_by_question', side_effect=full_marks), \
+                mock.patch.object(services, 'build_review_snapshot', side_effect=snapshot):
+            self.assertEqual(services.grade_exam_pending_answers(self.exam), (1, 1))
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((good.score, good.grading_status), (3, 'complete'))
+        self.assertEqual(StudentStats.objects.get(student=good.student).total_score, 3)
+        self.assertEqual((bad.score, bad.grading_status), (1, 'pending'))
+        self.assertTrue(bad.questions.get(question=self.questions[1]).grading_pending)
+
+    def test_failed_llm_call_requeues_the_batch(self):
+        with mock.patch.object(services, 'validate_short_answers_by_question', side_effect=RuntimeError('API down')):
+            self.assertEqual(services.grade_exam_pending_answers(self.exam), (0, 2))
+        self.assertEqual(set(StuExamAttempt.objects.values_list('grading_status', flat=True)), {'pending'})
+
+    def test_requeue_only_takes_back_stale_claims(self):
+        stale, live = self.attempts
+        self.assertEqual(len(services.claim_pending_attempts(10, exam=self.exam)), 2)
+        StuExamAttempt.objects.filter(id=stale.id).update(grading_claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(services.requeue_stale_claims(timedelta(minutes=30)), 1)
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((stale.grading_status, live.grading_status), ('pending', 'in_progress'))
+
+class ItemAnalysisTests(TestCase):
+    def setUp(self):
+        self.professor = User.objects.create(username='prof')
+        self.paper, self.questions = make_paper(self.professor, mcqs=2, shorts=0)
+        self.exam = make_exam(self.professor, self.paper, self.questions)
+        easy, hard = self.questions
+        choices = [('A', 'A'), ('A', 'A'), ('A', 'B'), ('B', 'C'), ('A', '')]
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, (easy_choice, hard_choice) in enumerate(choices):
+                submit(User.objects.create(username=f'student{i}'), self.exam, {easy.qno: easy_choice, hard.qno: hard_choice})
+
+    def test_graded_questions_are_marked_stale_and_refreshed(self):
+        self.assertEqual(QuestionStats.objects.filter(stale=True).count(), 2)
+        self.assertEqual(refresh_item_stats(), 2)
+        easy, hard = (QuestionStats.objects.get(question=question) for question in self.questions)
+        self.assertEqual((easy.responses, easy.facility), (5, 0.8))
+        self.assertEqual(hard.facility, 0.4)
+        self.assertEqual(hard.option_counts, {'': 1, 'A': 2, 'B': 1, 'C': 1, 'D': 0})
+        self.assertFalse(QuestionStats.objects.filter(stale=True).exists())
+
+
+class ResultReportTests(TestCase):
+    def setUp(self):
+        self.professor = User.objects.create(username='prof')
+        paper, questions = make_paper(self.professor, mcqs=1, shorts=0)
+        self.exam = make_exam(self.professor, paper, questions)
+        for i in range(7):
+            submit(User.objects.create(username=f'student{i}'), self.exam, {questions[0].qno: 'A'})
+
+    def test_pages_cover_every_attempt_once(self):
+        attempts = professor_results(self.professor, exam_id=self.exam.id)
+        seen, cursor = [], None
+        while True:
+            rows, cursor = result_page(attempts, after=cursor, page_size=3)
+            seen += [row['id'] for row in rows]
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(attempts.values_list('id', flat=True)))
+        self.assertEqual(len(seen), 7)
+
+    def test_csv_export_has_a_row_per_attempt(self):
+        rows = list(csv.reader(stream_results_csv(professor_results(self.professor))))
+        self.assertEqual(rows[0][:2], ['Attempt', 'Student'])
+        self.assertEqual(len(rows), 8)
+
+
+class ExamCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.professor = User.objects.create(username='prof')
+        self.paper, self.questions = make_paper(self.professor, mcqs=3, shorts=0)
+        self.exam = make_exam(self.professor, self.paper, self.questions)
+
+    def cached_qnos(self):
+        return set(get_exam_questions(get_exam(self.exam.id)))
+
+    def test_exam_is_served_from_the_cache_once_loaded(self):
+        get_exam(self.exam.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_exam(self.exam.id).name, 'Exam')
+
+    def test_editing_the_exam_drops_it(self):
+        get_exam(self.exam.id)
+        self.exam.name = 'Renamed'
+        self.exam.save()
+        self.assertEqual(get_exam(self.exam.id).name, 'Renamed')
+
+    def test_changing_the_paper_questions_drops_the_cached_questions(self):
+        removed = self.questions[0]
+        self.assertIn(removed.qno, self.cached_qnos())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paper.questions.remove(removed)
+        self.assertNotIn(removed.qno, self.cached_qnos())
+
+        added = Question_DB.objects.create(professor=self.professor, question='New?', optionA='a', optionB='b',
+                                           optionC='c', optionD='d', mcq_answer='A', max_marks=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            added.question_paper_set.add(self.paper)
+        self.assertIn(added.qno, self.cached_qnos())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            added.question_paper_set.clear()
+        self.assertNotIn(added.qno, self.cached_qnos())
+
+    def test_cached_questions_are_kept_until_the_change_commits(self):
+        self.cached_qnos()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.paper.questions.clear()
+            self.assertEqual(len(self.cached_qnos()), 3)
+        self.assertEqual(len(callbacks), 1)
+
+
+
+class GradingWorkerCheckTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def warnings(self):
+        return [message.id for message in checks.check_grading_worker(None)]
+
+    @override_settings(ASYNC_SHORT_ANSWER_GRADING=False)
+    def test_synchronous_grading_needs_no_worker(self):
+        self.assertEqual(self.warnings(), [])
+
+    @override_settings(ASYNC_SHORT_ANSWER_GRADING=True)
+    def test_async_grading_warns_until_a_worker_polls(self):
+        self.assertEqual(self.warnings(), ['questions.W003'])
+        record_grading_worker(60)
+        self.assertEqual(self.warnings(), [])
+
+
+
+@override_settings(LLM_GRADING_RETRIES=0, LLM_GRADING_CONCURRENCY=1)
+class VerdictCacheTests(TestCase):
+    def setUp(self):
+        caches[llm_validation.VERDICT_CACHE_ALIAS].clear()
+        self.graded = []
+
+    def grade_with_llm(self, requests, build_prompt):
+        self.graded.extend(req.student_answer for req in requests)
+        if any(req.student_answer == 'unlucky' for req in requests):
+            raise openai.APIConnectionError(request=mock.Mock())
+        return full_marks(requests)
+
+    def validate(self, answers):
+        with mock.patch.object(llm_validation, '_grade_with_llm', side_effect=self.grade_with_llm):
+            return llm_validation.validate_short_answers_with_llm([short_answer(answer) for answer in answers])
+
+    def test_answers_are_graded_once(self):
+        self.validate(['Light to sugar', '  light TO sugar', 'Something else'])
+        self.assertEqual(len(self.graded), 2)
+        results = self.validate(['light to sugar', 'Something else'])
+        self.assertEqual(len(self.graded), 2)
+        self.assertEqual([result.marks_awarded for result in results], [2, 2])
+
+    @override_settings(LLM_GRADING_MAX_TOKENS=llm_validation.COMPLETION_TOKENS_PER_ANSWER)
+    def test_verdicts_of_other_chunks_survive_an_api_error(self):
+        with self.assertRaises(openai.APIConnectionError):
+            self.validate(['first', 'unlucky', 'second'])
+        self.graded.clear()
+        with self.assertRaises(openai.APIConnectionError):
+            self.validate(['first', 'unlucky', 'second'])
+        self.assertEqual(self.graded, ['unlucky'])
+
+    def test_chunks_fit_the_token_budget(self):
+        requests = [short_answer(f'answer {i} ' + 'word ' * 50) for i in range(20)]
+        with self.settings(LLM_GRADING_PROMPT_TOKEN_BUDGET=1000, LLM_GRADING_MAX_TOKENS=10000):
+            chunks = llm_validation.chunk_requests(requests)
+            self.assertGreater(len(chunks), 1)
+            for chunk in chunks:
+                self.assertLessEqual(llm_validation.estimate_tokens(llm_validation._build_prompt(chunk)), 1000)
+        self.assertEqual([req for chunk in chunks for req in chunk], requests)
+        with self.settings(LLM_GRADING_MAX_TOKENS=llm_validation.COMPLETION_TOKENS_PER_ANSWER * 3):
+            self.assertEqual([len(chunk) for chunk in llm_validation.chunk_requests(requests[:7])], [3, 3, 1])
+
+
+
+class StandinBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(setattr, openai_client, '_client', None)
+        openai_client._client = None
+
+    @override_settings(LLM_BACKEND='standin', LLM_STANDIN_URL='http://127.0.0.1:9999/v1')
+    def test_standin_backend_points_the_client_at_the_local_server(self):
+        self.assertEqual(str(openai_client.get_client().base_url), 'http://127.0.0.1:9999/v1/')
+
+    @override_settings(LLM_BACKEND='bard')
+    def test_unknown_backend_is_refused(self):
+        with self.assertRaises(ValueError):
+            openai_client.get_client()
+
+    def test_standin_grades_both_prompt_shapes(self):
+        requests = [short_answer(MODEL_ANSWER.upper()), short_answer(f'I think {MODEL_ANSWER}'), short_answer('No idea')]
+        for build_prompt in (llm_validation._build_prompt, llm_validation._build_question_prompt):
+            with self.subTest(build_prompt=build_prompt.__name__):
+                verdicts = llm_standin_server.grading_verdicts(build_prompt(requests))
+                self.assertEqual([verdict['marks_awarded'] for verdict in verdicts], [2, 1, 0])
+
+
+
+class AdmissionGateTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_gate_turns_away_attempts_past_the_limit_until_one_leaves(self):
+        gate = AdmissionGate(limit=2)
+        self.assertEqual([gate.enter(1), gate.enter(1), gate.enter(1)], [True, True, False])
+        self.assertFalse(gate.has_capacity(1))
+        # Each exam has its own counter
+        self.assertTrue(gate.enter(2))
+        gate.leave(1)
+        self.assertTrue(gate.has_capacity(1))
+        self.assertTrue(gate.enter(1))
+
+    def test_zero_limit_admits_everyone(self):
+        gate = AdmissionGate(limit=0)
+        self.assertTrue(all(gate.enter(1) for _ in range(100)))
+        self.assertTrue(gate.has_capacity(1))
+
+    def test_limit_on_a_local_cache_is_reported(self):
+        with self.settings(EXAM_ADMISSION_LIMIT=20):
+            self.assertEqual([message.id for message in checks.check_admission_cache(None)], ['questions.W001'])
+            self.assertEqual([message.id for message in checks.check_deployed_admission_cache(None)], ['questions.E001'])
+        with self.settings(EXAM_ADMISSION_LIMIT=0):
+            self.assertEqual(checks.check_admission_cache(None), [])
+
+    def test_warming_a_local_cache_is_refused(self):
+        with self.assertRaises(CommandError):
+            call_command('warm_exam', '1')
+
+
+
+class QuestionFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.professor = User.objects.create(username='prof')
+        _, self.questions = make_paper(self.professor, mcqs=2, shorts=1)
+
+    def attach(self):
+        with mock.patch.object(caching, 'render_question_fragments', wraps=caching.render_question_fragments) as render:
+            questions = caching.attach_question_fragments(Question_DB.objects.filter(qno__in=[q.qno for q in self.questions]))
+        return {question.qno: question.fragments for question in questions}, render.call_count
+
+    def test_each_revision_is_rendered_once(self):
+        fragments, rendered = self.attach()
+        self.assertEqual(rendered, 3)
+        self.assertEqual(self.attach(), (fragments, 0))
+
+        self.questions[0].question = 'Edited?'
+        self.questions[0].save()
+        fragments, rendered = self.attach()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Edited?', fragments[self.questions[0].qno]['question'])
+
+
+
+@skipUnless(math_render.latex_to_mathml, 'latex2mathml is not installed')
+class MathPrerenderTests(TestCase):
+    def test_math_spans_become_mathml(self):
+        self.assertIn('display="inline"', math_render.render_math(r'Solve $x^2 = 4$ for x'))
+        self.assertIn('display="block"', math_render.render_math(r'$$\frac{a}{b}$$'))
+        self.assertEqual(math_render.render_math('Costs $5 and more'), 'Costs $5 and more')
+
+    def test_question_math_is_prerendered_on_save(self):
+        professor = User.objects.create(username='prof')
+        question = Question_DB.objects.create(professor=professor, question=r'What is \(\sqrt{16}\)?', optionA='4', optionB='8',
+                                              optionC='2', optionD='16', mcq_answer='A', max_marks=1)
+        self.assertEqual(set(question.rendered), {'question'})
+        self.assertIn('<math', question.get_question_display())
+        self.assertEqual(question.get_option_display('A'), '4')
+
+
+
+class ReviewSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create(username='prof')
+        paper, self.questions = make_paper(professor, mcqs=2, shorts=1)
+        exam = make_exam(professor, paper, self.questions)
+        answers = {self.questions[0].qno: 'A', self.questions[1].qno: 'B', self.questions[2].qno: 'Something else'}
+        self.attempt = submit(User.objects.create(username='student'), exam, answers, defer_grading=True)
+
+    def summary(self):
+        self.attempt.refresh_from_db()
+        return {key: value for key, value in self.attempt.review_snapshot['summary'].items() if value}
+
+    def test_snapshot_is_taken_on_submission_and_again_when_graded(self):
+        self.assertEqual(self.summary(), {'correct': 1, 'wrong': 1, 'pending': 1, 'total_possible_marks': 4})
+        with mock.patch.object(services, 'validate_short_answers_with_llm', side_effect=full_marks):
+            services.grade_pending_attempt(self.attempt)
+        self.assertEqual(self.summary(), {'correct': 2, 'wrong': 1, 'total_possible_marks': 4})
+
+    def test_review_is_served_from_the_snapshot(self):
+        self.attempt.refresh_from_db()
+        with mock.patch.object(services, 'build_review_snapshot') as build:
+            review_data, summary = services.prepare_review_data(self.attempt)
+        build.assert_not_called()
+        self.assertEqual([item['student_answer'] for item in review_data], ['A', 'B', 'Something else'])
+        self.assertEqual((summary['total_marks'], summary['grading_pending']), (1, True))
+
+
+
+class ProfessorRosterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.professor = User.objects.create(username='prof')
+        other = User.objects.create(username='other-prof')
+        paper, questions = make_paper(self.professor, mcqs=2, shorts=0)
+        self.exams = [make_exam(self.professor, paper, questions) for _ in range(2)]
+        other_paper, other_questions = make_paper(other, mcqs=1, shorts=0)
+        other_exam = make_exam(other, other_paper, other_questions)
+        self.answers = {question.qno: 'A' for question in questions}
+
+        students = Group.objects.get(name='Student')
+        self.ann, self.bob, self.cat = [User.objects.create(username=name) for name in ('ann', 'bob', 'cat')]
+        students.user_set.add(self.ann, self.bob, self.cat)
+        submit(self.ann, self.exams[0], {questions[0].qno: 'A'})
+        submit(self.ann, self.exams[0], self.answers)
+        submit(self.ann, self.exams[1], {})
+        submit(self.cat, other_exam, {other_questions[0].qno: 'A'})
+
+    def rows(self):
+        return [(row['username'], row['exams_attempted'], row['best_score']) for row in professor_roster(self.professor)]
+
+    def test_roster_counts_only_the_professor_s_exams(self):
+        self.assertEqual(self.rows(), [('ann', 2, 2), ('bob', 0, None), ('cat', 0, None)])
+
+    def test_roster_is_cached_until_a_submission(self):
+        self.rows()
+        with self.assertNumQueries(0):
+            self.rows()
+        with self.captureOnCommitCallbacks(execute=True):
+            submit(self.bob, self.exams[1], self.answers)
+        self.assertEqual(self.rows()[1], ('bob', 1, 2))
+
+    def test_roster_page(self):
+        self.client.force_login(self.professor)
+        with mock.patch('questions.views.ROSTER_PAGE_SIZE', 2):
+            page = self.client.get(reverse('faculty-student'), {'page': 2}).context['students']
+        self.assertEqual([row['username'] for row in page], ['cat'])
+
+
+
+class StudentHistoryTests(TestCase):
+    def setUp(self):
+        professor = User.objects.create(username='prof')
+        paper, questions = make_paper(professor, mcqs=2, shorts=0)
+        self.exams = [make_exam(professor, paper, questions) for _ in range(2)]
+        self.student = User.objects.create(username='student')
+        self.attempts = [
+            submit(self.student, self.exams[i], {questions[0].qno: 'A'} if i else {}).id
+            for i in (0, 1, 0, 1, 1)
+        ]
+        # Another student's attempts are not part of the history
+        submit(User.objects.create(username='other'), self.exams[0], {})
+
+    def page(self, before=None):
+        with self.assertNumQueries(1):
+            exams, next_cursor = student_history(self.student, before=before, page_size=2)
+        return [(exam.id, [attempt.id for attempt in exam.attempts]) for exam in exams], next_cursor
+
+    def test_history_is_paged_newest_first_and_grouped_by_exam(self):
+        a = self.attempts
+        first, second = self.exams[0].id, self.exams[1].id
+        page, cursor = self.page()
+        self.assertEqual(page, [(second, [a[4], a[3]])])
+        page, cursor = self.page(cursor)
+        self.assertEqual(page, [(first, [a[2]]), (second, [a[1]])])
+        self.assertEqual(self.page(cursor), ([(first, [a[0]])], None))
+
+    def test_stats_are_aggregated(self):
+        stats = student_history_stats(self.student)
+        self.assertEqual((stats['total_exams'], stats['total_attempts'], stats['average_score']), (2, 5, 0.6))
@@ -20,10 +20,17 @@ from django.core.paginator import Paginator
 import random
 from utils.performance_monitor import monitor_performance
 import time
+import uuid
 from utils import validate_short_answers_with_llm, ShortAnswerValidationRequest
 import openai
 import os
-from .services import process_exam_submission, prepare_review_data
+from .services import process_exam_submission, prepare_review_data, select_attempt_questions
+from .caching import admission_gate, attach_question_fragments, get_attempt_questions, get_exam
+from .reports import (
+    ROSTER_PAGE_SIZE, Leaderboard, attempt_standing, attempted_exam_ids, exam_attempts, professor_results, professor_roster,
+    result_page, stream_results_csv, student_history, student_history_stats, write_results_xlsx,
+)
+from django.http import FileResponse, StreamingHttpResponse
 from course.models import Course, Topic
 
 def has_group(user, group_name):
@@ -123,92 +130,69 @@ def view_previousexams_prof(request):
 
 @login_required(login_url='login')
 def student_view_previous(request):
-    exams = Exam_Model.objects.all()
-    list_of_completed = []
-    list_un = []
-    exam_attempts_map = {}
-    from student.models import StuExamAttempt
-    
-    for exam in exams:
-        attempts = StuExamAttempt.objects.filter(student=request.user, exam=exam).order_by('-started_at')
-        if attempts.exists():
-            list_of_completed.append(exam)
-            exam_attempts_map[exam.id] = attempts
-        else:
-            list_un.append(exam)
-    
-    # Attach attempts to each exam for template
-    for exam in list_of_completed:
-        exam.attempts = exam_attempts_map.get(exam.id, [])
-    
-    # Calculate statistics
-    total_exams = len(list_of_completed)
-    total_attempts = sum(len(attempts) for attempts in exam_attempts_map.values())
-    
-    # Calculate average score
-    total_score = 0
-    total_count = 0
-    last_attempt_date = None
-    
-    for attempts in exam_attempts_map.values():
-        for attempt in attempts:
-            total_score += attempt.score
-            total_count += 1
-            if last_attempt_date is None or attempt.started_at > last_attempt_date:
-                last_attempt_date = attempt.started_at
-    
-    average_score = round(total_score / total_count, 1) if total_count > 0 else 0
-    
+    before = request.GET.get('before')
+    completed, next_cursor = student_history(request.user, before=int(before) if before and before.isdigit() else None)
+    stats = student_history_stats(request.user)
     return render(request, 'exam/previousstudent.html', {
-        'exams': list_un,
-        'completed': list_of_completed,
-        'total_exams': total_exams,
-        'total_attempts': total_attempts,
-        'average_score': average_score,
-        'last_attempt_date': last_attempt_date
+        'completed': completed,
+        'next_cursor': next_cursor,
+        'paged': bool(before),
+        'total_exams': stats['total_exams'],
+        'total_attempts': stats['total_attempts'],
+        'average_score': round(stats['average_score'] or 0, 1),
+        'last_attempt_date': stats['last_attempt_date'],
     })
 
 @login_required(login_url='faculty-login')
 def view_students_prof(request):
-    students = User.objects.filter(groups__name = "Student")
-    student_name = []
-    student_completed = []
-    count = 0
-    dicts = {}
-    examn = Exam_Model.objects.filter(professor=request.user)
-    for student in students:
-        student_name.append(student.username)
-        count = 0
-        for exam in examn:
-            if StuExamAttempt.objects.filter(student=student, exam=exam).exists():
-                count += 1
-            else:
-                count += 0
-        student_completed.append(count)
-    i = 0
-    for x in student_name:
-        dicts[x] = student_completed[i]
-        i+=1
+    roster = Paginator(professor_roster(request.user), ROSTER_PAGE_SIZE)
     return render(request, 'exam/viewstudents.html', {
-        'students':dicts
+        'students': roster.get_page(request.GET.get('page')),
+        'exam_count': Exam_Model.objects.filter(professor=request.user).count(),
     })
 
+def _results_filters(request):
+    """Read the exam and topic filters of the results pages, ignoring malformed values"""
+    exam_id = request.GET.get('exam')
+    topic_id = request.GET.get('topic')
+    return (int(exam_id) if exam_id and exam_id.isdigit() else None,
+            int(topic_id) if topic_id and topic_id.isdigit() else None)
+
 @login_required(login_url='faculty-login')
 def view_results_prof(request):
-    students = User.objects.filter(groups__name = "Student")
-    dicts = {}
-    prof = request.user
-    professor = User.objects.get(username=prof.username)
-    examn = Exam_Model.objects.filter(professor=professor)
-    for exam in examn:
-        attempts = StuExamAttempt.objects.filter(exam=exam)
-        for attempt in attempts:
-            key = f"{attempt.student.username} {attempt.exam.name} {attempt.qpaper.qPaperTitle}"
-            dicts[key] = attempt.score
+    exam_id, topic_id = _results_filters(request)
+    after = request.GET.get('after')
+    attempts = professor_results(request.user, exam_id=exam_id, topic_id=topic_id)
+    rows, next_cursor = result_page(attempts, after=int(after) if after and after.isdigit() else None)
+    exams = list(Exam_Model.objects.filter(professor=request.user).order_by('name'))
+    topics = Topic.objects.filter(question_papers__exams__professor=request.user).distinct().order_by('name')
+    # Standings are shown for one exam at a time
+    leaderboard = next((Leaderboard(exam) for exam in exams if exam.id == exam_id), None)
+    if leaderboard:
+        for row in rows:
+            row['percentile'] = leaderboard.percentile(row['score']) if row['completed_at'] and row['grading_status'] == 'complete' else None
     return render(request, 'exam/resultsstudent.html', {
-        'students':dicts
+        'results': rows,
+        'next_cursor': next_cursor,
+        'exams': exams,
+        'topics': topics,
+        'exam_id': exam_id,
+        'topic_id': topic_id,
+        'paged': bool(after),
+        'leaderboard': leaderboard,
     })
 
+@login_required(login_url='faculty-login')
+def export_results_prof(request):
+    """Download the professor's results as CSV or XLSX, written as the rows are fetched"""
+    exam_id, topic_id = _results_filters(request)
+    attempts = professor_results(request.user, exam_id=exam_id, topic_id=topic_id)
+    if request.GET.get('format') == 'xlsx':
+        return FileResponse(write_results_xlsx(attempts), as_attachment=True, filename='results.xlsx')
+    response = StreamingHttpResponse(stream_results_csv(attempts), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="results.csv"'
+    return response
+
 @login_required(login_url='student-login')
 def view_exams_student(request):
     stud = request.user
@@ -241,11 +225,11 @@ def view_exams_student(request):
 
 @login_required(login_url='login')
 def view_students_attendance(request):
-    exams = Exam_Model.objects.all()
+    attempted = attempted_exam_ids(request.user)
     list_of_completed = []
     list_un = []
-    for exam in exams:
-        if StuExamAttempt.objects.filter(student=request.user, exam=exam).exists():
+    for exam in Exam_Model.objects.select_related('professor'):
+        if exam.id in attempted:
             list_of_completed.append(exam)
         else:
             list_un.append(exam)
@@ -272,7 +256,7 @@ def appear_exam(request, id):
     
     if request.method == 'GET':
         # Optimize database queries with select_related and prefetch_related
-        exam = Exam_Model.objects.select_related('question_paper', 'professor').get(pk=id)
+        exam = get_exam(id)
         
         # Create a new attempt for each exam start
         attempt_id = request.session.get(f'exam_{exam.id}_attempt_id')
@@ -280,7 +264,7 @@ def appear_exam(request, id):
         now = timezone.now()
         if attempt_id:
             try:
-                attempt = StuExamAttempt.objects.select_related('exam', 'qpaper').prefetch_related('selected_questions').get(
+                attempt = StuExamAttempt.objects.select_related('exam', 'qpaper', 'variant').get(
                     id=attempt_id, student=student, exam=exam
                 )
                 # If the attempt is completed or expired, ignore it and create a new one
@@ -291,49 +275,34 @@ def appear_exam(request, id):
                 attempt = None
         
         if not attempt:
-            # Create new attempt with explicit started_at
-            attempt = StuExamAttempt.objects.create(
-                student=student, 
-                exam=exam, 
-                qpaper=exam.question_paper,
-                started_at=timezone.now()
-            )
-            request.session[f'exam_{exam.id}_attempt_id'] = attempt.id
-            
-            # Optimize question selection - use database-level random selection
-            all_questions = exam.question_paper.questions.all()
-            question_count = all_questions.count()
-            num_questions = getattr(exam, 'num_questions', 10)
-            if question_count > num_questions:
-                # Use database-level random selection for better performance
-                from django.db.models import Q
-                import random
-                
-                # Get random question IDs efficiently
-                all_qids = list(all_questions.values_list('qno', flat=True))
-                if len(all_qids) > num_questions:
-                    random_qids = random.sample(all_qids, num_questions)
-                    random_qs = Question_DB.objects.filter(qno__in=random_qids)
-                else:
-                    random_qs = all_questions
+            # Cap concurrent attempt creations; the rest wait in the waiting room
+            if not admission_gate.enter(exam.id):
+                return render(request, 'exam/waiting_room.html', {
+                    'exam': exam,
+                    'retry_after': admission_gate.retry_after(),
+                })
+            try:
+                # Create new attempt with explicit started_at
+                attempt = StuExamAttempt.objects.create(
+                    student=student, 
+                    exam=exam, 
+                    qpaper=exam.question_paper,
+                    started_at=timezone.now()
+                )
+                request.session[f'exam_{exam.id}_attempt_id'] = attempt.id
                 
-                # Store the selected questions directly in the attempt
-                attempt.selected_questions.set(random_qs)
-                # Also store IDs for backward compatibility
-                attempt.random_qids = ','.join(str(q.qno) for q in random_qs)
-            else:
-                # If num_questions or fewer questions, use all questions
-                attempt.selected_questions.set(all_questions)
-                attempt.random_qids = ','.join(str(q.qno) for q in all_questions)
-            attempt.save()
+                # Assign a pre-generated variant or sample the questions
+                select_attempt_questions(attempt)
+            finally:
+                admission_gate.leave(exam.id)
         
-        # Get the questions selected for this attempt - optimize with prefetch
-        selected_questions = list(attempt.selected_questions.all().order_by('qno'))
+        # Get the questions selected for this attempt, from the cached paper when warm
+        selected_questions = get_attempt_questions(attempt)
         
         paginator = Paginator(selected_questions, QUESTIONS_PER_PAGE)
         page_number = request.GET.get('page', 1)
         page_obj = paginator.get_page(page_number)
-        answers = request.session.get(f'exam_{exam.id}_answers', {})
+        answers = attempt.get_saved_answers()
         
         # Calculate starting question number for this page
         start_question_number = (page_obj.number - 1) * QUESTIONS_PER_PAGE + 1
@@ -349,8 +318,7 @@ def appear_exam(request, id):
             if attempt.end_time and now >= attempt.end_time:
                 # Auto-submit the exam if not already completed
                 if not attempt.completed_at:
-                    attempt.completed_at = now
-                    attempt.save()
+                    process_exam_submission(attempt, attempt.get_saved_answers())
                 return redirect('review_answers', exam_id=exam.id)
             # If no end time set, set to 0
             minutes = 0
@@ -358,7 +326,7 @@ def appear_exam(request, id):
         
         context = {
             "exam": exam,
-            "question_list": page_obj.object_list,
+            "question_list": attach_question_fragments(page_obj.object_list),
             "page_obj": page_obj,
             "paginator": paginator,
             "page_number": int(page_number),
@@ -368,6 +336,8 @@ def appear_exam(request, id):
             "student_started_at": attempt.started_at,
             "student_end_time": attempt.end_time,
             "answers": answers,
+            "attempt_id": attempt.id,
+            "submission_key": uuid.uuid4().hex,
         }
         
         # Simple page load timing
@@ -379,22 +349,28 @@ def appear_exam(request, id):
         return render(request, 'exam/giveExam.html', context)
     
     if request.method == 'POST':
-        paper = request.POST['paper']
-        examMain = Exam_Model.objects.select_related('question_paper').get(name=paper)
+        examMain = get_exam(id)
         attempt_id = request.session.get(f'exam_{examMain.id}_attempt_id')
-        attempt = StuExamAttempt.objects.select_related('exam', 'qpaper').get(id=attempt_id, student=student, exam=examMain)
+        attempt = StuExamAttempt.objects.select_related('exam', 'qpaper', 'variant').filter(id=attempt_id, student=student, exam=examMain).first()
+        if attempt is None or attempt.submission_key:
+            # A repeated final submit; the first one already graded the attempt
+            request.session.pop(f'exam_{examMain.id}_attempt_id', None)
+            return redirect('review_answers', exam_id=examMain.id)
         
         # Get the questions selected for this attempt
-        paginator = Paginator(list(attempt.get_selected_questions()), 5)
+        selected_questions = get_attempt_questions(attempt)
+        paginator = Paginator(selected_questions, 5)
         page_number = int(request.POST.get('page', 1))
-        answers = request.session.get(f'exam_{examMain.id}_answers', {})
+        # Answers kept in the session before the answer store existed
+        answers = request.session.pop(f'exam_{examMain.id}_answers', {})
         
-        # Collect answers from the current page
-        for ques in paginator.get_page(page_number).object_list:
+        # Collect answers from the form, which holds one page or, when the
+        # page paginates client-side, every question
+        for ques in selected_questions:
             ans = request.POST.get(str(ques.qno))
             if ans is not None:
                 answers[str(ques.qno)] = ans
-        request.session[f'exam_{examMain.id}_answers'] = answers
+        attempt.save_answers(answers)
 
         # Navigation logic
         if 'prev_page' in request.POST:
@@ -407,11 +383,9 @@ def appear_exam(request, id):
 
         # Final submit
         if 'final_submit' in request.POST:
-            process_exam_submission(attempt, answers)
+            process_exam_submission(attempt, attempt.get_saved_answers(), submission_key=request.POST.get('submission_key', '')[:64])
             
             # Clean up session data after submission
-            if f'exam_{examMain.id}_answers' in request.session:
-                del request.session[f'exam_{examMain.id}_answers']
             if f'exam_{examMain.id}_attempt_id' in request.session:
                 del request.session[f'exam_{examMain.id}_attempt_id']
                 
@@ -424,18 +398,17 @@ def appear_exam(request, id):
 def view_exam_attempts(request, exam_id):
     """View all attempts for a specific exam"""
     student = request.user
-    exam = Exam_Model.objects.get(pk=exam_id)
-    attempts = StuExamAttempt.objects.filter(student=student, exam=exam).order_by('-started_at')
+    exam = get_exam(exam_id)
     
     attempts_data = []
-    for attempt in attempts:
+    for attempt in exam_attempts(student, exam):
         attempts_data.append({
             'attempt': attempt,
             'score': attempt.score,
             'started_at': attempt.started_at,
             'completed_at': attempt.completed_at,
-            'duration': attempt.completed_at - attempt.started_at if attempt.completed_at else None,
-            'question_count': attempt.selected_questions.count()
+            'duration': (attempt.completed_at - attempt.started_at).total_seconds() / 60 if attempt.completed_at else None,
+            'question_count': attempt.question_count
         })
     
     return render(request, 'exam/exam_attempts.html', {
@@ -446,15 +419,14 @@ def view_exam_attempts(request, exam_id):
 @login_required(login_url='login')
 def review_answers(request, exam_id):
     student = request.user
-    exam = Exam_Model.objects.get(pk=exam_id)
+    exam = get_exam(exam_id)
     attempt_id = request.GET.get('attempt_id')
     from student.models import StuExamAttempt
     
-    # Optimize query with prefetch_related
     if attempt_id:
-        attempt = StuExamAttempt.objects.prefetch_related('questions', 'selected_questions').filter(student=student, exam=exam, id=attempt_id).first()
+        attempt = StuExamAttempt.objects.select_related('exam', 'variant').filter(student=student, exam=exam, id=attempt_id).first()
     else:
-        attempt = StuExamAttempt.objects.prefetch_related('questions', 'selected_questions').filter(student=student, exam=exam).order_by('-started_at').first()
+        attempt = StuExamAttempt.objects.select_related('exam', 'variant').filter(student=student, exam=exam).order_by('-started_at').first()
     
     if not attempt:
         return render(request, 'exam/review_answers.html', {'exam': exam, 'review_data': [], 'summary': {}})
@@ -464,7 +436,8 @@ def review_answers(request, exam_id):
     return render(request, 'exam/review_answers.html', {
         'exam': exam,
         'review_data': review_data,
-        'summary': summary
+        'summary': summary,
+        'standing': attempt_standing(attempt, exam),
     })
 
 def upload_questions_excel(request):
@@ -1,20 +1,43 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import *
+from questions.question_models import QuestionStats
+from questions.reports import forget_professor_rosters
 
 @admin.action(description='Reset selected Exam Attempts')
 def reset_exam_attempts(modeladmin, request, queryset):
-    queryset.update(score=0, completed_at=None)
+    # Attempts a grading worker has claimed are left alone; resetting them
+    # under the worker would let it finish and count them again.
+    with transaction.atomic():
+        attempts = list(
+            queryset.select_for_update().exclude(grading_status='in_progress')
+            .values_list('id', 'student_id', 'exam_id', 'exam__professor_id')
+        )
+        attempt_ids = [attempt_id for attempt_id, _, _, _ in attempts]
+        graded = Stu_Question.objects.filter(attempt_id__in=attempt_ids)
+        question_ids = set(graded.values_list('question_id', flat=True))
+        graded.delete()
+        StuExamAttempt.objects.filter(id__in=attempt_ids).update(
+            score=0, completed_at=None, grading_status='complete', review_snapshot=None, submission_key='',
+        )
+        # Recomputed in the same transaction, so a concurrent grading cannot land between the reset and the rebuild
+        StudentStats.rebuild({student_id for _, student_id, _, _ in attempts})
+        ExamBestScore.rebuild({exam_id for _, _, exam_id, _ in attempts})
+        transaction.on_commit(lambda: forget_professor_rosters(professor_id for _, _, _, professor_id in attempts), robust=True)
+        transaction.on_commit(lambda: QuestionStats.mark_stale(question_ids), robust=True)
+    skipped = queryset.count() - len(attempts)
+    modeladmin.message_user(request, f"Reset {len(attempts)} attempts" + (f", skipped {skipped} being graded" if skipped else ""))
 
 class StuExamAttemptAdmin(admin.ModelAdmin):
-    list_display = ('student', 'exam', 'qpaper', 'started_at', 'completed_at', 'score', 'get_question_count')
-    list_filter = ('exam', 'student', 'started_at', 'completed_at')
+    list_display = ('student', 'exam', 'qpaper', 'started_at', 'completed_at', 'score', 'grading_status', 'get_question_count')
+    list_filter = ('exam', 'student', 'started_at', 'completed_at', 'grading_status')
     search_fields = ('student__username', 'exam__name', 'qpaper__qPaperTitle')
-    readonly_fields = ('started_at', 'random_qids', 'get_question_count')
+    readonly_fields = ('started_at', 'question_ids', 'question_seed', 'variant', 'get_question_count')
     actions = [reset_exam_attempts]
     ordering = ('-started_at',)
     
     def get_question_count(self, obj):
-        return obj.selected_questions.count()
+        return obj.get_selected_questions().count()
     get_question_count.short_description = 'Questions Selected'
 
 class StuResultsDBAdmin(admin.ModelAdmin):
@@ -36,5 +59,7 @@ admin.site.register(StudentInfo)
 admin.site.register(Stu_Question)
 admin.site.register(StuExamAttempt, StuExamAttemptAdmin)
 admin.site.register(StuResults_DB, StuResultsDBAdmin)
+admin.site.register(StudentStats)
+admin.site.register(ExamBestScore)
 admin.site.register(QuestionFeedback)
 admin.site.register(PaperFeedback)
\ No newline at end of file
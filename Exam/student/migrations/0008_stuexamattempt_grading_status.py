@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0010_question_db_images'),
+        ('student', '0007_alter_paperfeedback_id_alter_questionfeedback_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stu_question',
+            name='grading_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='stuexamattempt',
+            name='grading_status',
+            field=models.CharField(choices=[('complete', 'Complete'), ('pending', 'Pending'), ('in_progress', 'In Progress')], default='complete', help_text='Short answers are graded by the grade_pending_answers worker while this is pending.', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='stuexamattempt',
+            index=models.Index(fields=['grading_status'], name='student_stu_grading_b7bf57_idx'),
+        ),
+    ]
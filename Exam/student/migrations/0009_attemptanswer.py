@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0010_question_db_images'),
+        ('student', '0008_stuexamattempt_grading_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_answers', to='student.stuexamattempt')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='questions.question_db')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('attempt', 'question'), name='unique_attempt_answer')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0011_exam_variants'),
+        ('student', '0009_attemptanswer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stuexamattempt',
+            name='variant',
+            field=models.ForeignKey(blank=True, help_text='Pre-generated question variant of the exam; set instead of selected_questions.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attempts', to='questions.examvariant'),
+        ),
+    ]
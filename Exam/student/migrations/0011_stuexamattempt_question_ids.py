@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0011_exam_variants'),
+        ('student', '0010_stuexamattempt_variant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stuexamattempt',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list, help_text='qno of the questions selected for this attempt, sampled with a generator seeded by exam, attempt and question_seed.'),
+        ),
+        migrations.AddField(
+            model_name='stuexamattempt',
+            name='question_seed',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='stuexamattempt',
+            name='variant',
+            field=models.ForeignKey(blank=True, help_text='Pre-generated question variant of the exam; set instead of question_ids.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attempts', to='questions.examvariant'),
+        ),
+    ]
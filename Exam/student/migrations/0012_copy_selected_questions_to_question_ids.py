@@ -0,0 +1,66 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def batches(queryset):
+    """Yield the rows of a queryset in lists of BATCH_SIZE, streamed from the database."""
+    batch = []
+    for row in queryset.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def copy_to_question_ids(apps, schema_editor):
+    """Fill question_ids from the selected_questions join table, or the random_qids CSV of older attempts."""
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    Through = StuExamAttempt.selected_questions.through
+
+    for batch in batches(StuExamAttempt.objects.only('id', 'random_qids')):
+        selected = {}
+        rows = Through.objects.filter(stuexamattempt_id__in=[attempt.id for attempt in batch])
+        for attempt_id, qno in rows.values_list('stuexamattempt_id', 'question_db_id'):
+            selected.setdefault(attempt_id, []).append(qno)
+
+        updated = []
+        for attempt in batch:
+            qids = selected.get(attempt.id)
+            if not qids and attempt.random_qids:
+                qids = [int(qid) for qid in attempt.random_qids.split(',') if qid.strip()]
+            if qids:
+                attempt.question_ids = sorted(qids)
+                updated.append(attempt)
+        StuExamAttempt.objects.bulk_update(updated, ['question_ids'])
+
+
+def copy_from_question_ids(apps, schema_editor):
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    Question_DB = apps.get_model('questions', 'Question_DB')
+    Through = StuExamAttempt.selected_questions.through
+
+    for batch in batches(StuExamAttempt.objects.exclude(question_ids=[]).only('id', 'question_ids')):
+        # question_ids filled from random_qids may name questions deleted since
+        named = {qno for attempt in batch for qno in attempt.question_ids}
+        existing = set(Question_DB.objects.filter(qno__in=named).values_list('qno', flat=True))
+        rows = []
+        for attempt in batch:
+            attempt.random_qids = ','.join(str(qno) for qno in attempt.question_ids)
+            rows += [Through(stuexamattempt_id=attempt.id, question_db_id=qno) for qno in attempt.question_ids if qno in existing]
+        StuExamAttempt.objects.bulk_update(batch, ['random_qids'])
+        Through.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0011_exam_variants'),
+        ('student', '0011_stuexamattempt_question_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_question_ids, copy_from_question_ids),
+    ]
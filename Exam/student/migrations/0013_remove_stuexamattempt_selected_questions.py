@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0012_copy_selected_questions_to_question_ids'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='stuexamattempt',
+            name='random_qids',
+        ),
+        migrations.RemoveField(
+            model_name='stuexamattempt',
+            name='selected_questions',
+        ),
+    ]
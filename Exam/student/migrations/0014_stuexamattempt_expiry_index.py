@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0011_exam_variants'),
+        ('student', '0013_remove_stuexamattempt_selected_questions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stuexamattempt',
+            index=models.Index(fields=['completed_at', 'end_time'], name='student_stu_complet_3cba7b_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0014_stuexamattempt_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stuexamattempt',
+            name='review_snapshot',
+            field=models.JSONField(blank=True, editable=False, help_text='Per-question outcome and summary of the attempt, built when it is submitted and again when its grading completes.', null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0013_question_db_rendered'),
+        ('student', '0015_stuexamattempt_review_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stu_question',
+            name='attempt',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='student.stuexamattempt'),
+        ),
+        migrations.AddField(
+            model_name='stu_question',
+            name='question_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questions.question_db'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def text_key(text):
+    return ' '.join((text or '').lower().split())[:100]
+
+
+def link_stu_questions(apps, schema_editor):
+    """
+    Point each Stu_Question at its attempt and at the question its text was copied from.
+
+    The copied text may have been cut to 100 characters and the question
+    edited since, so both are compared by their first 100 characters with
+    case and spacing ignored. Only the questions the attempt was given, its
+    question_ids and the questions of its paper, are candidates: a match
+    elsewhere in the bank would credit the marks to a question the student
+    never saw. Nothing is deleted. Rows no attempt refers to, left behind by
+    resubmissions, and rows whose question cannot be found any more keep a
+    NULL attempt or question, and their copied text in legacy_question.
+    """
+    Stu_Question = apps.get_model('student', 'Stu_Question')
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    Question_DB = apps.get_model('questions', 'Question_DB')
+    Question_Paper = apps.get_model('questions', 'Question_Paper')
+    Through = StuExamAttempt.questions.through
+
+    attempt_of = dict(Through.objects.values_list('stu_question_id', 'stuexamattempt_id').iterator())
+    attempts = {
+        attempt_id: (qpaper_id, question_ids or [])
+        for attempt_id, qpaper_id, question_ids in StuExamAttempt.objects.values_list('id', 'qpaper_id', 'question_ids').iterator()
+    }
+    paper_qnos = {}
+    for qpaper_id, qno in Question_Paper.questions.through.objects.values_list('question_paper_id', 'question_db_id').iterator():
+        paper_qnos.setdefault(qpaper_id, set()).add(qno)
+    candidates = {}
+
+    def find_question(attempt_id, text):
+        if attempt_id not in candidates:
+            qpaper_id, question_ids = attempts[attempt_id]
+            qnos = set(question_ids) | paper_qnos.get(qpaper_id, set())
+            candidates[attempt_id] = {}
+            # The attempt's own question_ids come first, as the paper may have been edited since
+            for qno, question_text in sorted(
+                Question_DB.objects.filter(qno__in=qnos).values_list('qno', 'question'),
+                key=lambda row: row[0] not in question_ids,
+            ):
+                candidates[attempt_id].setdefault(text_key(question_text), qno)
+        return candidates[attempt_id].get(text)
+
+    batch = []
+    for sq in Stu_Question.objects.only('id', 'question').iterator():
+        attempt_id = attempt_of.get(sq.id)
+        if attempt_id is None:
+            continue
+        sq.attempt_id = attempt_id
+        sq.question_ref_id = find_question(attempt_id, text_key(sq.question))
+        batch.append(sq)
+        if len(batch) >= BATCH_SIZE:
+            Stu_Question.objects.bulk_update(batch, ['attempt', 'question_ref'])
+            batch = []
+    if batch:
+        Stu_Question.objects.bulk_update(batch, ['attempt', 'question_ref'])
+
+
+def copy_question_text(apps, schema_editor):
+    """Copy the question text back from the linked questions; unlinked rows kept theirs."""
+    Stu_Question = apps.get_model('student', 'Stu_Question')
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    Through = StuExamAttempt.questions.through
+
+    batch, rows = [], []
+    for sq in Stu_Question.objects.select_related('question_ref').iterator():
+        ques = sq.question_ref
+        if ques is not None:
+            sq.question = ques.question[:100]
+            sq.optionA = (ques.optionA or '')[:100]
+            sq.optionB = (ques.optionB or '')[:100]
+            sq.optionC = (ques.optionC or '')[:100]
+            sq.optionD = (ques.optionD or '')[:100]
+            sq.answer = ((ques.mcq_answer if ques.question_type == 'MCQ' else ques.short_answer) or '')[:200]
+            batch.append(sq)
+        if sq.attempt_id is not None:
+            rows.append(Through(stuexamattempt_id=sq.attempt_id, stu_question_id=sq.id))
+        if len(batch) >= BATCH_SIZE or len(rows) >= BATCH_SIZE:
+            Stu_Question.objects.bulk_update(batch, ['question', 'optionA', 'optionB', 'optionC', 'optionD', 'answer'])
+            Through.objects.bulk_create(rows, ignore_conflicts=True)
+            batch, rows = [], []
+    Stu_Question.objects.bulk_update(batch, ['question', 'optionA', 'optionB', 'optionC', 'optionD', 'answer'])
+    Through.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0013_question_db_rendered'),
+        ('student', '0016_stu_question_attempt_question'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_stu_questions, copy_question_text),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0013_question_db_rendered'),
+        ('student', '0017_link_stu_questions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='stuexamattempt',
+            name='questions',
+        ),
+        # The copied text is kept for the answers 0017 could not link to a question
+        migrations.RenameField(
+            model_name='stu_question',
+            old_name='question',
+            new_name='legacy_question',
+        ),
+        migrations.AlterField(
+            model_name='stu_question',
+            name='legacy_question',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Question text copied by answers saved before they referred to their question', max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name='stu_question',
+            name='optionA',
+        ),
+        migrations.RemoveField(
+            model_name='stu_question',
+            name='optionB',
+        ),
+        migrations.RemoveField(
+            model_name='stu_question',
+            name='optionC',
+        ),
+        migrations.RemoveField(
+            model_name='stu_question',
+            name='optionD',
+        ),
+        migrations.RemoveField(
+            model_name='stu_question',
+            name='answer',
+        ),
+        migrations.RenameField(
+            model_name='stu_question',
+            old_name='question_ref',
+            new_name='question',
+        ),
+        migrations.AlterField(
+            model_name='stu_question',
+            name='attempt',
+            field=models.ForeignKey(blank=True, help_text='Empty for answers left behind by resubmissions before answers referred to their attempt', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='student.stuexamattempt'),
+        ),
+        migrations.AlterField(
+            model_name='stu_question',
+            name='question',
+            field=models.ForeignKey(blank=True, help_text='Empty for old answers whose question could not be found any more', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='graded_answers', to='questions.question_db'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+def mark_submitted_attempts(apps, schema_editor):
+    """Attempts completed before submission keys existed must not be graded again."""
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    StuExamAttempt.objects.filter(completed_at__isnull=False).update(submission_key='submitted')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0018_stu_question_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stuexamattempt',
+            name='submission_key',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Idempotency key of the submission that finalizes the attempt, claimed before it is graded.', max_length=64),
+        ),
+        migrations.RunPython(mark_submitted_attempts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0019_stuexamattempt_submission_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stu_question',
+            name='answer_revision',
+            field=models.PositiveIntegerField(default=0, help_text="answer_revision of the question's model answer this answer was graded against"),
+        ),
+    ]
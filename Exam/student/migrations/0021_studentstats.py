@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def fill_student_stats(apps, schema_editor):
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    StudentStats = apps.get_model('student', 'StudentStats')
+    totals = (
+        StuExamAttempt.objects.order_by()
+        .values('student_id')
+        .annotate(
+            attempt_count=Count('id'),
+            completed_count=Count('id', filter=Q(completed_at__isnull=False)),
+            total_score=Sum('score', filter=Q(completed_at__isnull=False), default=0),
+            last_attempt_at=Max('started_at'),
+        )
+    )
+    StudentStats.objects.bulk_create([StudentStats(**row) for row in totals], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0020_stu_question_answer_revision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('total_score', models.FloatField(default=0)),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='exam_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Student Stats',
+            },
+        ),
+        migrations.RunPython(fill_student_stats, migrations.RunPython.noop),
+    ]
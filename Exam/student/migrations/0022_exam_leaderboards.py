@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+from django.db import migrations, models
+from django.db.models import Max
+
+SCORE_BINS = 20
+
+
+def fill_leaderboards(apps, schema_editor):
+    Exam_Model = apps.get_model('questions', 'Exam_Model')
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    ExamBestScore = apps.get_model('student', 'ExamBestScore')
+    ExamScoreBin = apps.get_model('student', 'ExamScoreBin')
+    total_marks = dict(Exam_Model.objects.values_list('id', 'total_marks'))
+    best = (
+        StuExamAttempt.objects.filter(completed_at__isnull=False, grading_status='complete')
+        .order_by()
+        .values('exam_id', 'student_id')
+        .annotate(score=Max('score'))
+    )
+    rows = [ExamBestScore(**row) for row in best]
+    ExamBestScore.objects.bulk_create(rows, batch_size=500)
+    bin_counts = {exam_id: max(1, min(SCORE_BINS, marks)) for exam_id, marks in total_marks.items()}
+    bins = Counter(
+        (row.exam_id, min(max(int(row.score * bin_counts[row.exam_id] // total_marks[row.exam_id]), 0), bin_counts[row.exam_id] - 1) if total_marks[row.exam_id] > 0 else 0)
+        for row in rows
+    )
+    ExamScoreBin.objects.bulk_create(
+        [ExamScoreBin(exam_id=exam_id, number=number, students=bins[exam_id, number]) for exam_id, count in bin_counts.items() for number in range(count)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0015_questionstats'),
+        ('student', '0021_studentstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamBestScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField()),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='best_scores', to='questions.exam_model')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='best_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['exam', '-score'], name='student_exa_exam_id_26ac4d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('exam', 'student'), name='unique_exam_best_score')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExamScoreBin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField()),
+                ('students', models.PositiveIntegerField(default=0)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_bins', to='questions.exam_model')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('exam', 'number'), name='unique_exam_score_bin')],
+            },
+        ),
+        migrations.RunPython(fill_leaderboards, migrations.RunPython.noop),
+    ]
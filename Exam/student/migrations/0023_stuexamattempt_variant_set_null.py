@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def copy_variant_questions(apps, schema_editor):
+    """Copy the questions of assigned variants to the attempts, which only stored the variant id."""
+    StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+    batch = []
+    for attempt in StuExamAttempt.objects.filter(variant__isnull=False).select_related('variant').only('id', 'variant__question_ids').iterator(chunk_size=BATCH_SIZE):
+        attempt.question_ids = attempt.variant.question_ids
+        batch.append(attempt)
+        if len(batch) >= BATCH_SIZE:
+            StuExamAttempt.objects.bulk_update(batch, ['question_ids'])
+            batch = []
+    StuExamAttempt.objects.bulk_update(batch, ['question_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0017_llm_verdict_cache_table'),
+        ('student', '0022_exam_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stuexamattempt',
+            name='variant',
+            field=models.ForeignKey(blank=True, help_text='Pre-generated question variant of the exam; its questions are copied to question_ids, which serve the attempt if the variant is deleted.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempts', to='questions.examvariant'),
+        ),
+        migrations.RunPython(copy_variant_questions, migrations.RunPython.noop),
+    ]
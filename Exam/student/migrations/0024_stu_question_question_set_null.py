@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0017_llm_verdict_cache_table'),
+        ('student', '0023_stuexamattempt_variant_set_null'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stu_question',
+            name='question',
+            field=models.ForeignKey(blank=True, help_text="Empty once the question is deleted, and for old answers whose question could not be found any more; the marks stay in the attempt's score", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='graded_answers', to='questions.question_db'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0024_stu_question_question_set_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stuexamattempt',
+            name='grading_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When a grading worker last claimed the attempt; grade_pending_answers --requeue only takes back claims older than --stale-after.', null=True),
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from collections import Counter
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, Q, Sum
 from django.contrib.auth.models import User
 from questions.question_models import Question_DB
 from questions.questionpaper_models import Question_Paper
-from questions.models import Exam_Model
+from questions.models import Exam_Model, ExamVariant
 
 class StudentInfo(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -17,28 +19,72 @@ class StudentInfo(models.Model):
         verbose_name_plural = 'Student Info'
 
 class Stu_Question(models.Model):
+    """A student's graded answer to one question of a submitted attempt."""
+    attempt = models.ForeignKey('StuExamAttempt', on_delete=models.CASCADE, null=True, blank=True, related_name='questions', help_text="Empty for answers left behind by resubmissions before answers referred to their attempt")
     student = models.ForeignKey(User, on_delete=models.CASCADE)
-    question = models.CharField(max_length=100)
-    optionA = models.CharField(max_length=100, blank=True, default='')
-    optionB = models.CharField(max_length=100, blank=True, default='')
-    optionC = models.CharField(max_length=100, blank=True, default='')
-    optionD = models.CharField(max_length=100, blank=True, default='')
-    answer = models.CharField(max_length=200, blank=True, default='')
+    question = models.ForeignKey(Question_DB, on_delete=models.SET_NULL, null=True, blank=True, related_name='graded_answers', help_text="Empty once the question is deleted, and for old answers whose question could not be found any more; the marks stay in the attempt's score")
+    legacy_question = models.CharField(max_length=100, blank=True, default='', editable=False, help_text="Question text copied by answers saved before they referred to their question")
     choice = models.CharField(max_length=10, blank=True, default='')
     marks_awarded = models.FloatField(default=0)
     llm_explanation = models.TextField(blank=True, default='')
+    grading_pending = models.BooleanField(default=False)
+    answer_revision = models.PositiveIntegerField(default=0, help_text="answer_revision of the question's model answer this answer was graded against")
+
+    def __str__(self):
+        return f"Attempt {self.attempt_id} - Q{self.question_id}: {self.choice}"
 
 class StuExamAttempt(models.Model):
+    GRADING_STATUS_CHOICES = [
+        ('complete', 'Complete'),
+        ('pending', 'Pending'),
+        ('in_progress', 'In Progress'),
+    ]
     student = models.ForeignKey(User, limit_choices_to={'groups__name': "Student"}, on_delete=models.CASCADE)
     exam = models.ForeignKey(Exam_Model, on_delete=models.CASCADE)
     qpaper = models.ForeignKey(Question_Paper, on_delete=models.CASCADE)
-    questions = models.ManyToManyField(Stu_Question)
-    selected_questions = models.ManyToManyField(Question_DB, related_name='attempts')
     started_at = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     score = models.IntegerField(default=0)
-    random_qids = models.CharField(max_length=500, blank=True, null=True)  # Keep for backward compatibility
+    question_ids = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="qno of the questions selected for this attempt, sampled with a generator seeded by exam, attempt and question_seed."
+    )
+    question_seed = models.PositiveIntegerField(null=True, blank=True)
+    variant = models.ForeignKey(
+        ExamVariant,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='attempts',
+        help_text="Pre-generated question variant of the exam; its questions are copied to question_ids, which serve the attempt if the variant is deleted."
+    )
+    grading_status = models.CharField(
+        max_length=20,
+        choices=GRADING_STATUS_CHOICES,
+        default='complete',
+        help_text="Short answers are graded by the grade_pending_answers worker while this is pending."
+    )
+    grading_claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="When a grading worker last claimed the attempt; grade_pending_answers --requeue only takes back claims older than --stale-after."
+    )
+    submission_key = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Idempotency key of the submission that finalizes the attempt, claimed before it is graded."
+    )
+    review_snapshot = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Per-question outcome and summary of the attempt, built when it is submitted and again when its grading completes."
+    )
 
     class Meta:
         indexes = [
@@ -46,6 +92,8 @@ class StuExamAttempt(models.Model):
             models.Index(fields=['started_at']),
             models.Index(fields=['completed_at']),
             models.Index(fields=['student', 'exam', 'started_at']),
+            models.Index(fields=['grading_status']),
+            models.Index(fields=['completed_at', 'end_time']),
         ]
         ordering = ['-started_at']
 
@@ -63,23 +111,242 @@ class StuExamAttempt(models.Model):
             from datetime import timedelta
             self.end_time = self.started_at + timedelta(hours=1)
         
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding:
+            StudentStats.record(self.student_id, attempt_count=1, last_attempt_at=self.started_at)
     
+    @property
+    def is_grading_pending(self):
+        return self.grading_status != 'complete'
+
+    def get_saved_answers(self):
+        """Return the autosaved answers of this attempt as a {qno: answer} dict"""
+        return {str(qno): answer for qno, answer in self.saved_answers.values_list('question_id', 'answer')}
+
+    def save_answers(self, answers):
+        """Upsert {qno: answer} pairs into the attempt's answer store, one row per question"""
+        rows = [AttemptAnswer(attempt=self, question_id=int(qno), answer=answer or '') for qno, answer in answers.items()]
+        if rows:
+            AttemptAnswer.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['attempt', 'question'],
+                update_fields=['answer', 'updated_at'],
+            )
+        return len(rows)
+
+    def get_question_ids(self):
+        """Return the qno of this attempt's questions, from its variant or its own selection"""
+        if self.variant_id:
+            return self.variant.question_ids
+        return self.question_ids
+
     def get_selected_questions(self):
         """Get the questions selected for this attempt - optimized version"""
-        if self.selected_questions.exists():
-            # Use prefetch_related if not already done
-            return self.selected_questions.all().order_by('qno')
-        elif self.random_qids:
-            # Fallback to old method for backward compatibility
-            qids = [int(qid) for qid in self.random_qids.split(',')]
-            return Question_DB.objects.filter(qno__in=qids).order_by('qno')
+        question_ids = self.get_question_ids()
+        if question_ids:
+            return Question_DB.objects.filter(qno__in=question_ids).order_by('qno')
         else:
             # If no questions selected, return first N from question paper
             num = self.exam.num_questions if hasattr(self.exam, 'num_questions') else 10
             return self.qpaper.questions.all()[:num]
 
 
+class StudentStats(models.Model):
+    """
+    Running totals of a student's exam attempts, served by the dashboard.
+
+    Counters are adjusted with F() updates as attempts are started, submitted
+    and graded; `rebuild` recomputes them from the attempts for changes made
+    in bulk.
+    """
+    student = models.OneToOneField(User, on_delete=models.CASCADE, related_name='exam_stats')
+    attempt_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    total_score = models.FloatField(default=0)
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Student Stats'
+
+    def __str__(self):
+        return f"{self.student.username} - {self.completed_count}/{self.attempt_count} attempts"
+
+    @property
+    def average_score(self):
+        return self.total_score / self.completed_count if self.completed_count else 0
+
+    @classmethod
+    def record(cls, student_id, last_attempt_at=None, **increments):
+        """Add `increments` to a student's counters, once the change they reflect is saved."""
+        updates = {field: F(field) + value for field, value in increments.items()}
+        if last_attempt_at is not None:
+            updates['last_attempt_at'] = last_attempt_at
+        if not cls.objects.filter(student_id=student_id).update(**updates):
+            cls.rebuild([student_id])
+
+    @classmethod
+    def rebuild(cls, student_ids=None):
+        """Recompute the stats of the given students, or of every student with attempts, from their attempts."""
+        attempts = StuExamAttempt.objects.all()
+        if student_ids is not None:
+            attempts = attempts.filter(student_id__in=student_ids)
+        totals = (
+            attempts.order_by()
+            .values('student_id')
+            .annotate(
+                attempt_count=Count('id'),
+                completed_count=Count('id', filter=Q(completed_at__isnull=False)),
+                total_score=Sum('score', filter=Q(completed_at__isnull=False), default=0),
+                last_attempt_at=Max('started_at'),
+            )
+        )
+        rows = [cls(**row) for row in totals]
+        cls.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['attempt_count', 'completed_count', 'total_score', 'last_attempt_at'],
+        )
+        if student_ids is not None:
+            # Students whose last attempts were removed
+            cls.objects.filter(student_id__in=student_ids).exclude(student_id__in=[row.student_id for row in rows]).delete()
+        return len(rows)
+
+
+# Leaderboards split the marks of an exam into at most this many equal score bins
+SCORE_BINS = 20
+
+def score_bin_count(total_marks):
+    """Return how many score bins an exam out of `total_marks` has; scores are whole marks, so no more than marks."""
+    return max(1, min(SCORE_BINS, total_marks))
+
+def score_bin(score, total_marks):
+    """Return the number of the score bin of an exam out of `total_marks` that `score` falls in."""
+    bins = score_bin_count(total_marks)
+    if total_marks <= 0:
+        return bins - 1
+    return min(max(int(score * bins // total_marks), 0), bins - 1)
+
+
+class ExamBestScore(models.Model):
+    """
+    A student's best score at an exam, over their submitted and fully graded attempts.
+
+    The rows of an exam, together with how many of them fall in each of its
+    ExamScoreBin rows, are its leaderboard. `record` raises a best score as
+    a graded attempt beats it; `rebuild` recomputes them from the attempts
+    after scores were lowered or attempts reset.
+    """
+    exam = models.ForeignKey(Exam_Model, on_delete=models.CASCADE, related_name='best_scores')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='best_scores')
+    score = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'student'], name='unique_exam_best_score'),
+        ]
+        indexes = [
+            models.Index(fields=['exam', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.exam.name}: {self.score}"
+
+    @classmethod
+    def record(cls, exam, student_id, score):
+        """Raise a student's best score at an exam to `score` if it is higher, moving them to its bin."""
+        # Compare as stored; attempt scores are whole marks in the database
+        score = int(score)
+        while True:
+            previous = cls.objects.filter(exam=exam, student_id=student_id).values_list('score', flat=True).first()
+            if previous is None:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(exam=exam, student_id=student_id, score=score)
+                except IntegrityError:
+                    # Another submission of the student recorded a score first; compare against it
+                    continue
+                ExamScoreBin.move(exam, None, score)
+                return
+            if score <= previous:
+                return
+            if cls.objects.filter(exam=exam, student_id=student_id, score=previous).update(score=score):
+                ExamScoreBin.move(exam, previous, score)
+                return
+
+    @classmethod
+    def rebuild(cls, exam_ids):
+        """Recompute the best scores and score bins of the given exams from their attempts."""
+        exams = dict(Exam_Model.objects.filter(id__in=exam_ids).values_list('id', 'total_marks'))
+        best = (
+            StuExamAttempt.objects.filter(exam_id__in=exams, completed_at__isnull=False, grading_status='complete')
+            .order_by()
+            .values('exam_id', 'student_id')
+            .annotate(score=Max('score'))
+        )
+        rows = [cls(**row) for row in best]
+        bins = Counter((row.exam_id, score_bin(row.score, exams[row.exam_id])) for row in rows)
+        with transaction.atomic():
+            cls.objects.filter(exam_id__in=exams).delete()
+            cls.objects.bulk_create(rows, batch_size=500)
+            ExamScoreBin.objects.filter(exam_id__in=exams).delete()
+            ExamScoreBin.objects.bulk_create(
+                [
+                    ExamScoreBin(exam_id=exam_id, number=number, students=bins[exam_id, number])
+                    for exam_id, total_marks in exams.items() for number in range(score_bin_count(total_marks))
+                ],
+                batch_size=500,
+            )
+        return len(rows)
+
+
+class ExamScoreBin(models.Model):
+    """How many students have their best score at an exam in one of its equal score ranges."""
+    exam = models.ForeignKey(Exam_Model, on_delete=models.CASCADE, related_name='score_bins')
+    number = models.PositiveSmallIntegerField()
+    students = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'number'], name='unique_exam_score_bin'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam.name} - bin {self.number}: {self.students}"
+
+    @classmethod
+    def move(cls, exam, previous, score):
+        """Move a student from the bin of their `previous` best score, if they had one, to the bin of `score`."""
+        old = None if previous is None else score_bin(previous, exam.total_marks)
+        new = score_bin(score, exam.total_marks)
+        if old == new:
+            return
+        if old is not None:
+            cls.objects.filter(exam=exam, number=old, students__gt=0).update(students=F('students') - 1)
+        if not cls.objects.filter(exam=exam, number=new).update(students=F('students') + 1):
+            cls.objects.bulk_create([cls(exam=exam, number=number) for number in range(score_bin_count(exam.total_marks))], ignore_conflicts=True)
+            cls.objects.filter(exam=exam, number=new).update(students=F('students') + 1)
+
+
+class AttemptAnswer(models.Model):
+    """The latest answer a student has given to one question of an attempt, saved as they go."""
+    attempt = models.ForeignKey(StuExamAttempt, on_delete=models.CASCADE, related_name='saved_answers')
+    question = models.ForeignKey(Question_DB, on_delete=models.CASCADE)
+    answer = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['attempt', 'question'], name='unique_attempt_answer'),
+        ]
+
+    def __str__(self):
+        return f"Attempt {self.attempt_id} - Q{self.question_id}: {self.answer[:20]}"
+
+
 class StuResults_DB(models.Model):
     student = models.ForeignKey(User, limit_choices_to={'groups__name': "Student"}, on_delete=models.CASCADE, null=True)
     attempts = models.ManyToManyField(StuExamAttempt)
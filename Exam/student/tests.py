@@ -1,3 +1,403 @@
-from django.test import TestCase
+import importlib
+import json
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from questions import services
+from questions.question_models import QuestionStats
+from questions.reports import Leaderboard
+from questions.tests import full_marks, make_exam, make_paper, submit
+from student.models import AttemptAnswer, ExamBestScore, ExamScoreBin, Stu_Question, StuExamAttempt, StudentStats
 
-# Create your tests here.
+
+def start(student, exam):
+    attempt = StuExamAttempt.objects.create(student=student, exam=exam, qpaper=exam.question_paper)
+    services.select_attempt_questions(attempt)
+    return attempt
+
+
+class AutosaveTests(TestCase):
+    def setUp(self):
+        professor = User.objects.create(username='prof')
+        paper, self.questions = make_paper(professor, mcqs=2, shorts=1)
+        self.exam = make_exam(professor, paper, self.questions)
+        self.student = User.objects.create(username='student')
+        self.attempt = start(self.student, self.exam)
+        self.client.force_login(self.student)
+        self.url = reverse('autosave-answers', args=[self.attempt.id])
+        self.mcq, _, self.short = (str(question.qno) for question in self.questions)
+
+    def autosave(self, answers):
+        return self.client.post(self.url, json.dumps({'answers': answers}), content_type='application/json')
+
+    def saved(self):
+        return dict(AttemptAnswer.objects.filter(attempt=self.attempt).values_list('question_id', 'answer'))
+
+    def test_answers_are_saved_and_updated(self):
+        self.assertEqual(self.autosave({self.mcq: 'B', self.short: 'first draft'}).json(), {'saved': 2})
+        self.assertEqual(self.autosave({self.short: 'second draft'}).json(), {'saved': 1})
+        self.assertEqual(self.saved(), {int(self.mcq): 'B', int(self.short): 'second draft'})
+
+    def test_null_clears_an_answer(self):
+        self.autosave({self.mcq: 'B'})
+        self.assertEqual(self.autosave({self.mcq: None}).json(), {'saved': 1})
+        self.assertEqual(self.saved(), {int(self.mcq): ''})
+
+    def test_answers_that_are_not_text_are_refused(self):
+        for answer in (123, ['A'], {'choice': 'A'}, True):
+            with self.subTest(answer=answer):
+                self.assertEqual(self.autosave({self.mcq: answer}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, '{"answers": [1]}', content_type='application/json').status_code, 400)
+        self.assertEqual(self.saved(), {})
+
+    def test_questions_outside_the_attempt_are_ignored(self):
+        self.assertEqual(self.autosave({'999999': 'A', self.mcq: 'A'}).json(), {'saved': 1})
+
+    def test_closed_and_foreign_attempts_are_refused(self):
+        StuExamAttempt.objects.filter(id=self.attempt.id).update(end_time=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.autosave({self.mcq: 'A'}).status_code, 409)
+        self.client.force_login(User.objects.create(username='other'))
+        self.assertEqual(self.autosave({self.mcq: 'A'}).status_code, 404)
+
+
+class ExamPaperTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create(username='prof')
+        paper, self.questions = make_paper(professor, mcqs=2, shorts=1)
+        self.exam = make_exam(professor, paper, self.questions)
+        self.student = User.objects.create(username='student')
+        self.attempt = start(self.student, self.exam)
+        self.client.force_login(self.student)
+        self.url = reverse('exam-paper', args=[self.attempt.id])
+
+    def test_paper_is_revalidated_by_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([question['number'] for question in response.json()['questions']], [1, 2, 3])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.questions[0].question = 'Edited?'
+        self.questions[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_only_the_student_s_open_attempt_is_served(self):
+        self.client.force_login(User.objects.create(username='other'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.student)
+        services.process_exam_submission(self.attempt, {})
+        self.assertEqual(self.client.get(self.url).status_code, 409)
+
+
+class SubmissionClaimTests(TestCase):
+    def setUp(self):
+        professor = User.objects.create(username='prof')
+        self.paper, self.questions = make_paper(professor, mcqs=3, shorts=0)
+        self.exam = make_exam(professor, self.paper, self.questions)
+        self.student = User.objects.create(username='student')
+        self.attempt = start(self.student, self.exam)
+        self.answers = {str(question.qno): 'A' for question in self.questions}
+
+    def stats(self):
+        return StudentStats.objects.values_list('attempt_count', 'completed_count', 'total_score').get(student=self.student)
+
+    def test_repeated_submission_is_graded_once(self):
+        first = services.process_exam_submission(self.attempt, self.answers)
+        again = services.process_exam_submission(StuExamAttempt.objects.get(id=self.attempt.id), {})
+        self.assertEqual((first.score, again.score), (3, 3))
+        self.assertEqual(again.submission_key, first.submission_key)
+        self.assertEqual(Stu_Question.objects.filter(attempt=self.attempt).count(), 3)
+        self.assertEqual(self.stats(), (1, 1, 3))
+
+    def test_failure_before_commit_releases_the_claim(self):
+        with mock.patch.object(ExamBestScore, 'record', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                services.process_exam_submission(self.attempt, self.answers)
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.attempt.submission_key, self.attempt.completed_at), ('', None))
+        self.assertFalse(Stu_Question.objects.filter(attempt=self.attempt).exists())
+        self.assertEqual(self.stats(), (1, 0, 0))
+
+        services.process_exam_submission(self.attempt, self.answers)
+        self.assertEqual(self.stats(), (1, 1, 3))
+        self.assertEqual(ExamBestScore.objects.get(student=self.student).score, 3)
+
+    def test_failure_after_commit_keeps_the_claim(self):
+        with mock.patch.object(QuestionStats, 'mark_stale', side_effect=RuntimeError('analytics down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                services.process_exam_submission(self.attempt, self.answers)
+        self.attempt.refresh_from_db()
+        self.assertNotEqual(self.attempt.submission_key, '')
+        self.assertEqual(self.attempt.score, 3)
+
+        services.process_exam_submission(StuExamAttempt.objects.get(id=self.attempt.id), self.answers)
+        self.assertEqual(self.stats(), (1, 1, 3))
+
+
+class DeletedQuestionTests(TestCase):
+    def test_deleting_a_question_keeps_the_graded_answers_and_score(self):
+        professor = User.objects.create(username='prof')
+        paper, questions = make_paper(professor, mcqs=3, shorts=0)
+        exam = make_exam(professor, paper, questions)
+        attempt = submit(User.objects.create(username='student'), exam, {question.qno: 'A' for question in questions})
+        deleted = questions[0]
+        deleted.delete()
+
+        self.assertEqual(attempt.questions.count(), 3)
+        self.assertEqual(attempt.questions.filter(question__isnull=True).count(), 1)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 3)
+        # Scores recomputed from the answers still count the orphaned one
+        questions[1].max_marks = 2
+        questions[1].save()
+        services.regrade_questions([questions[1].qno])
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 4)
+
+
+class ExpiredAttemptTests(TransactionTestCase):
+    """The sweeper grades on a thread pool, whose connections only see committed rows."""
+
+    def setUp(self):
+        professor = User.objects.create(username='prof')
+        paper, self.questions = make_paper(professor, mcqs=3, shorts=0)
+        self.exam = make_exam(professor, paper, self.questions)
+        self.student = User.objects.create(username='student')
+
+    def expired_attempt(self, answers=None):
+        attempt = start(self.student, self.exam)
+        attempt.save_answers(answers or {})
+        StuExamAttempt.objects.filter(id=attempt.id).update(end_time=timezone.now() - timedelta(hours=2))
+        return attempt
+
+    def test_expired_attempts_are_graded_from_their_saved_answers(self):
+        attempt = self.expired_attempt({question.qno: 'A' for question in self.questions[:2]})
+        open_attempt = start(self.student, self.exam)
+        self.assertEqual(services.finalize_expired_attempts(), (1, 0))
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.score, attempt.submission_key), (2, 'expired'))
+        self.assertIsNotNone(attempt.completed_at)
+        open_attempt.refresh_from_db()
+        self.assertIsNone(open_attempt.completed_at)
+
+    def test_failed_grading_reopens_the_attempt(self):
+        attempt = self.expired_attempt()
+        with mock.patch.object(services, 'build_review_snapshot', side_effect=RuntimeError('boom')):
+            with self.assertLogs('questions.services', 'ERROR'):
+                self.assertEqual(services.finalize_expired_attempts(), (0, 1))
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.completed_at, attempt.submission_key), (None, ''))
+        self.assertEqual(services.finalize_expired_attempts(), (1, 0))
+
+    def test_failure_after_commit_does_not_reopen_the_attempt(self):
+        attempt = self.expired_attempt()
+        with mock.patch.object(services, 'forget_professor_rosters', side_effect=RuntimeError('cache down')):
+            self.assertEqual(services.finalize_expired_attempts(), (1, 0))
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.completed_at)
+        self.assertEqual(services.finalize_expired_attempts(), (0, 0))
+        self.assertEqual(StudentStats.objects.values_list('completed_count', flat=True).get(student=self.student), 1)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        professor = User.objects.create(username='prof')
+        paper, self.questions = make_paper(professor, mcqs=10, shorts=0)
+        self.exam = make_exam(professor, paper, self.questions)
+        self.students = [User.objects.create(username=f'student{i}') for i in range(4)]
+
+    def submit(self, student, correct):
+        return submit(student, self.exam, {question.qno: 'A' if i < correct else 'B' for i, question in enumerate(self.questions)})
+
+    def bins(self):
+        return dict(ExamScoreBin.objects.filter(exam=self.exam, students__gt=0).values_list('number', 'students'))
+
+    def test_best_scores_and_bins_follow_graded_attempts(self):
+        for student, correct in zip(self.students, (2, 5, 5, 9)):
+            self.submit(student, correct)
+        self.submit(self.students[0], 7)
+        self.submit(self.students[0], 1)
+        self.assertEqual(ExamBestScore.objects.get(student=self.students[0]).score, 7)
+        self.assertEqual(self.bins(), {5: 2, 7: 1, 9: 1})
+
+        leaderboard = Leaderboard(self.exam)
+        self.assertEqual(leaderboard.students, 4)
+        self.assertEqual((leaderboard.rank(9), leaderboard.rank(5), leaderboard.rank(0)), (1, 3, 5))
+        self.assertEqual(leaderboard.percentile(5), 25)
+
+    def test_rebuild_after_a_regrade_lowers_the_scores(self):
+        for student in self.students:
+            self.submit(student, 10)
+        question = self.questions[0]
+        question.mcq_answer = 'D'
+        question.save()
+        services.regrade_questions([question.qno])
+        self.assertEqual(set(ExamBestScore.objects.values_list('score', flat=True)), {9})
+        self.assertEqual(self.bins(), {9: 4})
+
+    def test_total_marks_change_rebins(self):
+        for student, correct in zip(self.students, (2, 4, 6, 8)):
+            self.submit(student, correct)
+        self.exam.total_marks = 20
+        self.exam.save()
+        self.assertEqual(self.bins(), {2: 1, 4: 1, 6: 1, 8: 1})
+        self.assertEqual(ExamScoreBin.objects.filter(exam=self.exam).count(), 20)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create(username='prof')
+        paper, self.questions = make_paper(professor, mcqs=2, shorts=1)
+        self.exam = make_exam(professor, paper, self.questions)
+        self.student = User.objects.create(username='student')
+        self.answers = {self.questions[0].qno: 'A', self.questions[1].qno: 'A', self.questions[2].qno: 'Something else'}
+
+    def stats(self):
+        return StudentStats.objects.values_list('attempt_count', 'completed_count', 'total_score').get(student=self.student)
+
+    def test_stats_follow_submission_and_grading(self):
+        pending = submit(self.student, self.exam, self.answers, defer_grading=True)
+        submit(self.student, self.exam, {self.questions[0].qno: 'A'})
+        start(self.student, self.exam)
+        self.assertEqual(self.stats(), (3, 2, 3))
+        with mock.patch.object(services, 'validate_short_answers_with_llm', side_effect=full_marks):
+            services.grade_pending_attempt(pending)
+        self.assertEqual(self.stats(), (3, 2, 5))
+
+        StudentStats.rebuild([self.student.id])
+        self.assertEqual(self.stats(), (3, 2, 5))
+
+    def test_dashboard_is_served_from_the_stats(self):
+        submit(self.student, self.exam, self.answers, defer_grading=True)
+        submit(self.student, self.exam, {self.questions[0].qno: 'A'})
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(
+            (response.context['total_exams'], response.context['completed_exams'], response.context['average_score']),
+            (1, 2, 1.5),
+        )
+
+
+class CopyQuestionIdsMigrationTests(TransactionTestCase):
+    """0012 fills question_ids from the join table or random_qids, a batch of attempts at a time."""
+    migrate_from = [('student', '0011_stuexamattempt_question_ids'), ('questions', '0011_exam_variants')]
+    migrate_to = [('student', '0012_copy_selected_questions_to_question_ids'), ('questions', '0011_exam_variants')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        User = apps.get_model('auth', 'User')
+        Question_DB = apps.get_model('questions', 'Question_DB')
+        Question_Paper = apps.get_model('questions', 'Question_Paper')
+        Exam_Model = apps.get_model('questions', 'Exam_Model')
+        StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+
+        professor = User.objects.create(username='prof')
+        student = User.objects.create(username='student')
+        questions = [Question_DB.objects.create(professor=professor, question=f'Q{i}?', max_marks=1).qno for i in range(3)]
+        self.questions = questions
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper')
+        exam = Exam_Model.objects.create(professor=professor, name='Exam', total_marks=3, question_paper=paper)
+
+        def attempt(**fields):
+            return StuExamAttempt.objects.create(student=student, exam=exam, qpaper=paper, **fields)
+        selected = attempt()
+        selected.selected_questions.set([questions[2], questions[0]])
+        self.attempts = [selected.id] + [
+            attempt(random_qids=f'{questions[1]},{questions[0]}').id,
+            attempt().id,
+            attempt(random_qids=str(questions[2])).id,
+        ]
+
+        migration = importlib.import_module('student.migrations.0012_copy_selected_questions_to_question_ids')
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            executor.migrate(self.migrate_to)
+        self.apps = executor.loader.project_state(self.migrate_to).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_question_ids_are_copied_across_batches(self):
+        StuExamAttempt = self.apps.get_model('student', 'StuExamAttempt')
+        q = self.questions
+        self.assertEqual(
+            [StuExamAttempt.objects.get(id=attempt_id).question_ids for attempt_id in self.attempts],
+            [sorted([q[0], q[2]]), sorted([q[0], q[1]]), [], [q[2]]],
+        )
+
+
+class LinkStuQuestionsMigrationTests(TransactionTestCase):
+    """0017 links the answers copied as text to their attempt and question, within what the attempt was given."""
+    migrate_from = [('student', '0016_stu_question_attempt_question'), ('questions', '0013_question_db_rendered')]
+    migrate_to = [('student', '0017_link_stu_questions'), ('questions', '0013_question_db_rendered')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        User = apps.get_model('auth', 'User')
+        Question_DB = apps.get_model('questions', 'Question_DB')
+        Question_Paper = apps.get_model('questions', 'Question_Paper')
+        Exam_Model = apps.get_model('questions', 'Exam_Model')
+        StuExamAttempt = apps.get_model('student', 'StuExamAttempt')
+        Stu_Question = apps.get_model('student', 'Stu_Question')
+
+        professor = User.objects.create(username='prof')
+        student = User.objects.create(username='student')
+        in_paper = Question_DB.objects.create(professor=professor, question='What is the capital of France?', max_marks=1)
+        selected = Question_DB.objects.create(professor=professor, question='Name the largest planet. ' + 'x' * 120, max_marks=1)
+        self.in_paper, self.selected = in_paper.qno, selected.qno
+        # Same text as an answer below, but given to no attempt
+        Question_DB.objects.create(professor=professor, question='Which gas do plants absorb?', max_marks=1)
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper')
+        paper.questions.add(in_paper)
+        exam = Exam_Model.objects.create(professor=professor, name='Exam', total_marks=3, question_paper=paper)
+        attempt = StuExamAttempt.objects.create(student=student, exam=exam, qpaper=paper, question_ids=[selected.qno], score=3)
+        self.attempt = attempt.id
+
+        def answer(text, marks):
+            return Stu_Question.objects.create(student=student, question=text[:100], choice='A', marks_awarded=marks)
+        linked = [
+            answer('what is the  capital of france?', 1),
+            answer(selected.question, 1),
+            answer('Which gas do plants absorb?', 1),
+        ]
+        attempt.questions.set(linked)
+        self.linked = [sq.id for sq in linked]
+        self.orphan = answer('What is the capital of France?', 0).id
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        self.apps = executor.loader.project_state(self.migrate_to).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_answers_are_linked_within_the_attempt_and_never_deleted(self):
+        Stu_Question = self.apps.get_model('student', 'Stu_Question')
+        rows = {sq.id: (sq.attempt_id, sq.question_ref_id) for sq in Stu_Question.objects.all()}
+        self.assertEqual(rows, {
+            self.linked[0]: (self.attempt, self.in_paper),
+            self.linked[1]: (self.attempt, self.selected),
+            # Never matched against the rest of the bank
+            self.linked[2]: (self.attempt, None),
+            self.orphan: (None, None),
+        })
+        total = sum(Stu_Question.objects.filter(attempt_id=self.attempt).values_list('marks_awarded', flat=True))
+        self.assertEqual(total, 3)
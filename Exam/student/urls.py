@@ -21,8 +21,11 @@ urlpatterns = [
     path('exams/', views.view_exams_student, name='student-exams'),
     path('exams/previous/', views.student_view_previous, name='student-previous'),
     path('exams/appear/<int:id>/', views.appear_exam, name='appear-exam'),
+    path('exams/appear/<int:id>/admission/', views.exam_admission, name='exam-admission'),
     path('exams/answers/<int:exam_id>/', views.review_answers, name='review_answers'),
     path('exams/attempts/<int:exam_id>/', views.view_exam_attempts, name='view_exam_attempts'),
+    path('exams/attempt/<int:attempt_id>/paper/', views.exam_paper, name='exam-paper'),
+    path('exams/attempt/<int:attempt_id>/autosave/', views.autosave_answers, name='autosave-answers'),
     path('exams/attendance/', views.view_students_attendance, name='view_students_attendance'),
     path('feedback/question/', views.student_feedback_question, name='student_feedback_question'),
     path('feedback/paper/', views.student_feedback_paper, name='student_feedback_paper'),
@@ -16,40 +16,36 @@ from studentPreferences.models import StudentPreferenceModel
 from django.contrib.auth.models import Group
 from questions.models import Exam_Model
 from questions.questionpaper_models import Question_Paper
-from student.models import StuExamAttempt
+from student.models import StuExamAttempt, StudentStats
 from django.contrib.auth.forms import AuthenticationForm
 from course.models import Course, Topic
-from questions.services import process_exam_submission, prepare_review_data
+from questions.services import process_exam_submission, prepare_review_data, build_exam_paper, select_attempt_questions
+from questions.reports import attempt_standing, attempted_exam_ids, exam_attempts, student_history, student_history_stats
+from questions.caching import admission_gate, attach_question_fragments, get_attempt_questions, get_exam, get_exam_count
 from django.core.paginator import Paginator
 import time
+import uuid
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from utils.performance_monitor import monitor_performance
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
 from .models import QuestionFeedback, PaperFeedback
 from questions.question_models import Question_DB
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+import json
 
 @login_required(login_url='login')
 def index(request):
-    # Get statistics for the dashboard
-    total_exams = Exam_Model.objects.count()
-    completed_exams = StuExamAttempt.objects.filter(student=request.user).count()
-    
-    # Calculate average score
-    attempts = StuExamAttempt.objects.filter(student=request.user)
-    if attempts.exists():
-        total_score = sum(attempt.score for attempt in attempts)
-        average_score = (total_score / attempts.count()) if attempts.count() > 0 else 0
-    else:
-        average_score = 0
-    
+    # Statistics for the dashboard, kept up to date as attempts are taken and graded
+    stats = StudentStats.objects.filter(student=request.user).first() or StudentStats(student=request.user)
     context = {
-        'total_exams': total_exams,
-        'completed_exams': completed_exams,
-        'average_score': average_score,
+        'total_exams': get_exam_count(),
+        'completed_exams': stats.completed_count,
+        'average_score': stats.average_score,
     }
     
     return render(request, 'student/index.html', context)
@@ -213,11 +209,11 @@ def view_exams_student(request):
 
 @login_required(login_url='login')
 def view_students_attendance(request):
-    exams = Exam_Model.objects.all()
+    attempted = attempted_exam_ids(request.user)
     list_of_completed = []
     list_un = []
-    for exam in exams:
-        if StuExamAttempt.objects.filter(student=request.user, exam=exam).exists():
+    for exam in Exam_Model.objects.select_related('professor'):
+        if exam.id in attempted:
             list_of_completed.append(exam)
         else:
             list_un.append(exam)
@@ -233,8 +229,18 @@ def student_view_previous(request):
     permissions = has_group(stud, "Student")
     if not permissions:
         return redirect('index')
-    attempts = StuExamAttempt.objects.filter(student=stud).order_by('-started_at')
-    return render(request, 'exam/previousstudent.html', {'attempts': attempts})
+    before = request.GET.get('before')
+    completed, next_cursor = student_history(stud, before=int(before) if before and before.isdigit() else None)
+    stats = student_history_stats(stud)
+    return render(request, 'exam/previousstudent.html', {
+        'completed': completed,
+        'next_cursor': next_cursor,
+        'paged': bool(before),
+        'total_exams': stats['total_exams'],
+        'total_attempts': stats['total_attempts'],
+        'average_score': round(stats['average_score'] or 0, 1),
+        'last_attempt_date': stats['last_attempt_date'],
+    })
 
 @monitor_performance("appear_exam")
 @login_required(login_url='login')
@@ -244,13 +250,13 @@ def appear_exam(request, id):
     from questions.question_models import Question_DB
     QUESTIONS_PER_PAGE = 5
     if request.method == 'GET':
-        exam = Exam_Model.objects.select_related('question_paper', 'professor').get(pk=id)
+        exam = get_exam(id)
         attempt_id = request.session.get(f'exam_{exam.id}_attempt_id')
         attempt = None
         now = timezone.now()
         if attempt_id:
             try:
-                attempt = StuExamAttempt.objects.select_related('exam', 'qpaper').prefetch_related('selected_questions').get(
+                attempt = StuExamAttempt.objects.select_related('exam', 'qpaper', 'variant').get(
                     id=attempt_id, student=student, exam=exam
                 )
                 if attempt.completed_at or (attempt.end_time and now >= attempt.end_time):
@@ -259,36 +265,27 @@ def appear_exam(request, id):
             except StuExamAttempt.DoesNotExist:
                 attempt = None
         if not attempt:
-            attempt = StuExamAttempt.objects.create(
-                student=student, 
-                exam=exam, 
-                qpaper=exam.question_paper,
-                started_at=timezone.now()
-            )
-            request.session[f'exam_{exam.id}_attempt_id'] = attempt.id
-            all_questions = exam.question_paper.questions.all()
-            question_count = all_questions.count()
-            num_questions = getattr(exam, 'num_questions', 10)
-            if question_count > num_questions:
-                from django.db.models import Q
-                import random
-                all_qids = list(all_questions.values_list('qno', flat=True))
-                if len(all_qids) > num_questions:
-                    random_qids = random.sample(all_qids, num_questions)
-                    random_qs = Question_DB.objects.filter(qno__in=random_qids)
-                else:
-                    random_qs = all_questions
-                attempt.selected_questions.set(random_qs)
-                attempt.random_qids = ','.join(str(q.qno) for q in random_qs)
-            else:
-                attempt.selected_questions.set(all_questions)
-                attempt.random_qids = ','.join(str(q.qno) for q in all_questions)
-            attempt.save()
-        selected_questions = list(attempt.selected_questions.all().order_by('qno'))
+            if not admission_gate.enter(exam.id):
+                return render(request, 'exam/waiting_room.html', {
+                    'exam': exam,
+                    'retry_after': admission_gate.retry_after(),
+                })
+            try:
+                attempt = StuExamAttempt.objects.create(
+                    student=student, 
+                    exam=exam, 
+                    qpaper=exam.question_paper,
+                    started_at=timezone.now()
+                )
+                request.session[f'exam_{exam.id}_attempt_id'] = attempt.id
+                select_attempt_questions(attempt)
+            finally:
+                admission_gate.leave(exam.id)
+        selected_questions = get_attempt_questions(attempt)
         paginator = Paginator(selected_questions, QUESTIONS_PER_PAGE)
         page_number = request.GET.get('page', 1)
         page_obj = paginator.get_page(page_number)
-        answers = request.session.get(f'exam_{exam.id}_answers', {})
+        answers = attempt.get_saved_answers()
         start_question_number = (page_obj.number - 1) * QUESTIONS_PER_PAGE + 1
         if attempt.end_time and now < attempt.end_time:
             time_remaining = attempt.end_time - now
@@ -298,14 +295,13 @@ def appear_exam(request, id):
         else:
             if attempt.end_time and now >= attempt.end_time:
                 if not attempt.completed_at:
-                    attempt.completed_at = now
-                    attempt.save()
+                    process_exam_submission(attempt, attempt.get_saved_answers())
                 return redirect('review_answers', exam_id=exam.id)
             minutes = 0
             seconds = 0
         context = {
             "exam": exam,
-            "question_list": page_obj.object_list,
+            "question_list": attach_question_fragments(page_obj.object_list),
             "page_obj": page_obj,
             "paginator": paginator,
             "page_number": int(page_number),
@@ -315,6 +311,8 @@ def appear_exam(request, id):
             "student_started_at": attempt.started_at,
             "student_end_time": attempt.end_time,
             "answers": answers,
+            "attempt_id": attempt.id,
+            "submission_key": uuid.uuid4().hex,
         }
         end_time = time.time()
         execution_time = end_time - start_time
@@ -322,18 +320,24 @@ def appear_exam(request, id):
         print(f"[PAGE LOAD] Questions: {len(selected_questions)}, Page: {page_number}/{paginator.num_pages}")
         return render(request, 'exam/giveExam.html', context)
     if request.method == 'POST':
-        paper = request.POST['paper']
-        examMain = Exam_Model.objects.select_related('question_paper').get(name=paper)
+        examMain = get_exam(id)
         attempt_id = request.session.get(f'exam_{examMain.id}_attempt_id')
-        attempt = StuExamAttempt.objects.select_related('exam', 'qpaper').get(id=attempt_id, student=student, exam=examMain)
-        paginator = Paginator(list(attempt.get_selected_questions()), 5)
+        attempt = StuExamAttempt.objects.select_related('exam', 'qpaper', 'variant').filter(id=attempt_id, student=student, exam=examMain).first()
+        if attempt is None or attempt.submission_key:
+            # A repeated final submit; the first one already graded the attempt
+            request.session.pop(f'exam_{examMain.id}_attempt_id', None)
+            return redirect('review_answers', exam_id=examMain.id)
+        selected_questions = get_attempt_questions(attempt)
+        paginator = Paginator(selected_questions, 5)
         page_number = int(request.POST.get('page', 1))
-        answers = request.session.get(f'exam_{examMain.id}_answers', {})
-        for ques in paginator.get_page(page_number).object_list:
+        # Answers kept in the session before the answer store existed
+        answers = request.session.pop(f'exam_{examMain.id}_answers', {})
+        # The form holds one page, or every question when the page paginates client-side
+        for ques in selected_questions:
             ans = request.POST.get(str(ques.qno))
             if ans is not None:
                 answers[str(ques.qno)] = ans
-        request.session[f'exam_{examMain.id}_answers'] = answers
+        attempt.save_answers(answers)
         if 'prev_page' in request.POST:
             prev_page = max(1, page_number - 1)
             return redirect(f"{request.path}?page={prev_page}")
@@ -341,28 +345,75 @@ def appear_exam(request, id):
             next_page = min(paginator.num_pages, page_number + 1)
             return redirect(f"{request.path}?page={next_page}")
         if 'final_submit' in request.POST:
-            process_exam_submission(attempt, answers)
-            if f'exam_{examMain.id}_answers' in request.session:
-                del request.session[f'exam_{examMain.id}_answers']
+            process_exam_submission(attempt, attempt.get_saved_answers(), submission_key=request.POST.get('submission_key', '')[:64])
             if f'exam_{examMain.id}_attempt_id' in request.session:
                 del request.session[f'exam_{examMain.id}_attempt_id']
             return redirect('review_answers', exam_id=examMain.id)
         return redirect(f"{request.path}?page={page_number}")
 
+@login_required(login_url='login')
+def exam_admission(request, id):
+    """Tell a student in the waiting room whether the exam is admitting new attempts"""
+    return JsonResponse({
+        'admitted': admission_gate.has_capacity(id),
+        'retry_after': admission_gate.retry_after(),
+    })
+
+@login_required(login_url='login')
+def exam_paper(request, attempt_id):
+    """Return every question of an in-progress attempt as JSON, revalidated by ETag"""
+    attempt = StuExamAttempt.objects.select_related('exam').filter(pk=attempt_id, student=request.user).first()
+    if not attempt:
+        return JsonResponse({'error': 'Attempt not found'}, status=404)
+    if attempt.completed_at or (attempt.end_time and timezone.now() >= attempt.end_time):
+        return JsonResponse({'error': 'Attempt is closed'}, status=409)
+    etag, paper = build_exam_paper(attempt)
+    etag = quote_etag(etag)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(paper)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required(login_url='login')
+def autosave_answers(request, attempt_id):
+    """Save the answers changed since the last autosave, sent as JSON {"answers": {qno: answer}}"""
+    if request.method != 'POST':
+        return HttpResponseBadRequest('Invalid request')
+    try:
+        answers = json.loads(request.body)['answers']
+        if not isinstance(answers, dict):
+            raise TypeError('answers must be an object')
+        # A cleared answer may arrive as null; anything else but text would be graded as its repr
+        answers = {qno: '' if ans is None else ans for qno, ans in answers.items()}
+        if not all(isinstance(ans, str) for ans in answers.values()):
+            raise TypeError('answers must be strings or null')
+    except (ValueError, KeyError, TypeError) as e:
+        return HttpResponseBadRequest(f'Invalid answers payload: {e}')
+    attempt = StuExamAttempt.objects.filter(pk=attempt_id, student=request.user).first()
+    if not attempt:
+        return JsonResponse({'error': 'Attempt not found'}, status=404)
+    if attempt.completed_at or (attempt.end_time and timezone.now() >= attempt.end_time):
+        return JsonResponse({'error': 'Attempt is closed'}, status=409)
+    selected_qids = {str(qno) for qno in attempt.get_selected_questions().values_list('qno', flat=True)}
+    saved = attempt.save_answers({qno: ans for qno, ans in answers.items() if qno in selected_qids})
+    return JsonResponse({'saved': saved})
+
 @login_required(login_url='login')
 def view_exam_attempts(request, exam_id):
     student = request.user
-    exam = Exam_Model.objects.get(pk=exam_id)
-    attempts = StuExamAttempt.objects.filter(student=student, exam=exam).order_by('-started_at')
+    exam = get_exam(exam_id)
     attempts_data = []
-    for attempt in attempts:
+    for attempt in exam_attempts(student, exam):
         attempts_data.append({
             'attempt': attempt,
             'score': attempt.score,
             'started_at': attempt.started_at,
             'completed_at': attempt.completed_at,
-            'duration': attempt.completed_at - attempt.started_at if attempt.completed_at else None,
-            'question_count': attempt.selected_questions.count()
+            'duration': (attempt.completed_at - attempt.started_at).total_seconds() / 60 if attempt.completed_at else None,
+            'question_count': attempt.question_count
         })
     return render(request, 'exam/exam_attempts.html', {
         'exam': exam,
@@ -372,29 +423,22 @@ def view_exam_attempts(request, exam_id):
 @login_required(login_url='login')
 def review_answers(request, exam_id):
     student = request.user
-    exam = Exam_Model.objects.get(pk=exam_id)
+    exam = get_exam(exam_id)
     attempt_id = request.GET.get('attempt_id')
     from student.models import StuExamAttempt
     if attempt_id:
-        attempt = StuExamAttempt.objects.prefetch_related('questions', 'selected_questions').filter(student=student, exam=exam, id=attempt_id).first()
+        attempt = StuExamAttempt.objects.select_related('exam', 'variant').filter(student=student, exam=exam, id=attempt_id).first()
     else:
-        attempt = StuExamAttempt.objects.prefetch_related('questions', 'selected_questions').filter(student=student, exam=exam).order_by('-started_at').first()
+        attempt = StuExamAttempt.objects.select_related('exam', 'variant').filter(student=student, exam=exam).order_by('-started_at').first()
     if not attempt:
         return render(request, 'exam/review_answers.html', {'exam': exam, 'review_data': [], 'summary': {}})
     review_data, summary = prepare_review_data(attempt)
-    # Ensure each item in review_data has question_id
-    for item in review_data:
-        if hasattr(item, 'qno'):
-            item['question_id'] = item.qno
-        elif 'qno' in item:
-            item['question_id'] = item['qno']
-        elif 'question_id' not in item:
-            item['question_id'] = None
     return render(request, 'exam/review_answers.html', {
         'exam': exam,
         'review_data': review_data,
         'summary': summary,
         'attempt_id': attempt.id,
+        'standing': attempt_standing(attempt, exam),
     })
 
 def has_group(user, group_name):
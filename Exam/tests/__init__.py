@@ -6,6 +6,6 @@ of different components of the system.
  
 Files:
 - test_passwords.py: Test password authentication and import functionality
-- test_refactored_exam.py: Test the refactored exam logic with selected_questions
+- test_refactored_exam.py: Test the refactored exam logic with seeded question_ids
 - test_multiple_attempts.py: Test multiple attempts functionality for students
 """ 
\ No newline at end of file
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 """
-Test script to verify the refactored exam logic with selected_questions
+Test script to verify the refactored exam logic with seeded question_ids
 """
 
 import os
@@ -12,14 +12,12 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'examProject.settings')
 django.setup()
 
 from django.contrib.auth.models import User
-from questions.models import Exam_Model
-from questions.question_models import Question_DB
-from questions.questionpaper_models import Question_Paper
+from questions.models import Exam_Model, sample_question_ids
+from questions.services import select_attempt_questions
 from student.models import StuExamAttempt
-import random
 
 def test_refactored_exam_logic():
-    """Test the refactored exam logic with selected_questions"""
+    """Test the refactored exam logic with seeded question_ids"""
     
     print("Testing refactored exam logic...")
     print("=" * 50)
@@ -48,34 +46,23 @@ def test_refactored_exam_logic():
         all_questions = list(exam.question_paper.questions.all())
         print(f"Available questions: {len(all_questions)}")
         
-        if len(all_questions) > 10:
-            # Randomly select 10 questions
-            random_qs = random.sample(all_questions, 10)
-            attempt.selected_questions.set(random_qs)
-            attempt.random_qids = ','.join(str(q.qno) for q in random_qs)
-        else:
-            # Use all questions
-            attempt.selected_questions.set(all_questions)
-            attempt.random_qids = ','.join(str(q.qno) for q in all_questions)
-        
-        attempt.save()
+        select_attempt_questions(attempt)
         
         # Test the get_selected_questions method
         selected_questions = attempt.get_selected_questions()
         print(f"Selected questions count: {selected_questions.count()}")
         print(f"Selected question IDs: {[q.qno for q in selected_questions]}")
         
-        # Verify consistency
-        if attempt.selected_questions.count() == selected_questions.count():
-            print("✓ selected_questions field and get_selected_questions() are consistent")
+        # Verify the selection can be reconstructed from exam, attempt and seed
+        if attempt.variant_id:
+            print(f"✓ Attempt assigned variant {attempt.variant.number}")
         else:
-            print("✗ Inconsistency between selected_questions field and get_selected_questions()")
-        
-        # Test backward compatibility
-        if attempt.random_qids:
-            qids = [int(qid) for qid in attempt.random_qids.split(',')]
-            print(f"Random QIDs from string: {qids}")
-            print(f"Questions from QIDs: {[q.qno for q in Question_DB.objects.filter(qno__in=qids)]}")
+            qids = [q.qno for q in all_questions]
+            reconstructed = sample_question_ids(qids, exam.num_questions, exam.id, attempt.id, attempt.question_seed)
+            if reconstructed == attempt.question_ids:
+                print("✓ question_ids are reconstructible from the seed")
+            else:
+                print("✗ question_ids differ from the seeded selection")
         
         # Clean up
         attempt.delete()
@@ -7,62 +7,21 @@ data validation, and common operations.
 Files:
 - fix_passwords.py: Script to fix imported user passwords.
 - check_data.py: Script to check and validate data in the system.
-- openai_client.py: Initializes and provides a singleton OpenAI client.
+- openai_client.py: Provides the shared client for the configured LLM backend.
 - llm_validation.py: Contains logic for validating short answers using an LLM.
+- llm_standin_server.py: OpenAI-compatible stand-in server for offline load testing.
 """
 
-import os
-from typing import List
-from pydantic import BaseModel
-import openai
-
-class ShortAnswerValidationRequest(BaseModel):
-    question: str
-    correct_answer: str
-    student_answer: str
-    max_marks: float
-
-class ShortAnswerValidationResult(BaseModel):
-    is_correct: bool
-    explanation: str
-    marks_awarded: float
-
-
-def validate_short_answers_with_llm(requests: List[ShortAnswerValidationRequest], client=None) -> List[ShortAnswerValidationResult]:
-    """
-    Batch validate short answers using OpenAI LLM. Returns a list of results with correctness, explanation, and marks awarded.
-    """
-    # Compose a single prompt for all questions
-    prompt = """
-You are an expert exam evaluator. For each question below, compare the student's answer to the correct answer.
-Award marks based on the correctness of the answer. The marks awarded must be a multiple of 0.5 (e.g., 0, 0.5, 1.0, 1.5, ...).
-
-- If the student's answer is fully correct, set 'is_correct' to true and award the full 'max_marks'.
-- If the student's answer is partially correct, set 'is_correct' to false, award partial marks (as a multiple of 0.5), and provide a brief explanation.
-- If the student's answer is incorrect, set 'is_correct' to false, award 0 marks, and provide a brief explanation.
-
-Format your response as a JSON list, one object per question, with these keys: is_correct (bool), explanation (str), marks_awarded (float).
-
-Questions:
-"""
-    for i, req in enumerate(requests):
-        prompt += f"\nQ{i+1}: {req.question}\nCorrect Answer: {req.correct_answer}\nStudent Answer: {req.student_answer}\nMax Marks: {req.max_marks}\n"
-    prompt += "\nRespond with only the JSON list."
-
-    if client is None:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=512,
-        temperature=0.0,
-    )
-    import json
-    # Extract the JSON from the LLM response
-    content = response.choices[0].message.content
-    try:
-        data = json.loads(content)
-        return [ShortAnswerValidationResult(**item) for item in data]
-    except Exception as e:
-        # fallback: mark all as incorrect with error explanation
-        return [ShortAnswerValidationResult(is_correct=False, explanation=f"LLM error: {e}. Raw: {content}", marks_awarded=0) for _ in requests] 
\ No newline at end of file
+# The short answer validation API lives in llm_validation.py. It is resolved
+# lazily so that importing other utilities does not require an OpenAI key.
+_LLM_VALIDATION_EXPORTS = (
+    'ShortAnswerValidationRequest',
+    'ShortAnswerValidationResult',
+    'validate_short_answers_with_llm',
+)
+
+def __getattr__(name):
+    if name in _LLM_VALIDATION_EXPORTS:
+        from . import llm_validation
+        return getattr(llm_validation, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
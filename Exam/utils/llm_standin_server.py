@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the OpenAI chat completions API, for load testing offline.
+
+It serves POST /v1/chat/completions in the OpenAI response shape, including
+tool (function) calls, with configurable latency and error rate:
+
+- Short answer grading prompts (utils/llm_validation.py) get rule-based
+  verdicts: full marks when the normalized student answer equals the correct
+  answer, half marks when it contains it, zero otherwise.
+- Tool calls (question_data_tools/parsers/llm_utils.py) return the canned
+  arguments given for that function name in --canned, or an empty list for
+  every array property of the function schema.
+- Any other prompt gets the canned "chat" response or an empty JSON list.
+
+Usage:
+    python utils/llm_standin_server.py --port 8765 --latency 0.8 --jitter 0.4 --error-rate 0.02
+
+Then run the app with LLM_BACKEND=standin, or point the question_data_tools
+parsers at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1.
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GRADING_QUESTION = re.compile(
+    r"\nQ\d+: (?P<question>.*?)\nCorrect Answer: (?P<correct>.*?)\nStudent Answer: (?P<student>.*?)\nMax Marks: (?P<marks>[\d.]+)\n",
+    re.S,
+)
+GROUPED_HEADER = re.compile(r"\nCorrect Answer: (?P<correct>.*?)\nMax Marks: (?P<marks>[\d.]+)\n\nStudent Answers:\n", re.S)
+GROUPED_ANSWER = re.compile(r"\nA\d+: (?P<student>.*?)\n(?=\nA\d+: |\nRespond with)", re.S)
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+def grade_answer(correct, student, max_marks):
+    """Rule-based verdict standing in for the LLM's."""
+    correct, student = _normalize(correct), _normalize(student)
+    if student and student == correct:
+        return {"is_correct": True, "explanation": "Matches the correct answer.", "marks_awarded": max_marks}
+    if student and correct and correct in student:
+        return {"is_correct": False, "explanation": "Contains the correct answer with extra content.", "marks_awarded": round(max_marks) / 2}
+    return {"is_correct": False, "explanation": "Does not match the correct answer.", "marks_awarded": 0.0}
+
+def grading_verdicts(prompt):
+    """Return verdicts for a grading prompt, or None if the prompt is not one."""
+    header = GROUPED_HEADER.search(prompt)
+    if header:
+        return [
+            grade_answer(header['correct'], match['student'], float(header['marks']))
+            for match in GROUPED_ANSWER.finditer(prompt[header.end():])
+        ]
+    questions = list(GRADING_QUESTION.finditer(prompt))
+    if questions:
+        return [grade_answer(q['correct'], q['student'], float(q['marks'])) for q in questions]
+    return None
+
+def default_tool_arguments(function):
+    """Build empty arguments matching a function schema: [] for arrays, '' for strings."""
+    defaults = {'array': [], 'string': '', 'object': {}, 'integer': 0, 'number': 0, 'boolean': False}
+    properties = function.get('parameters', {}).get('properties', {})
+    return {name: defaults.get(schema.get('type'), None) for name, schema in properties.items()}
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = 'LLMStandin/1.0'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            return self._send_json(200, {"object": "list", "data": [{"id": "standin", "object": "model", "owned_by": "standin"}]})
+        self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        time.sleep(max(0.0, random.gauss(self.server.latency, self.server.jitter)))
+        if random.random() < self.server.error_rate:
+            status = random.choice([429, 500, 503])
+            return self._send_json(status, {"error": {"message": f"Stand-in injected error {status}", "type": "server_error"}})
+
+        self._send_json(200, self.build_completion(request))
+
+    def build_completion(self, request):
+        messages = request.get('messages', [])
+        prompt = messages[-1].get('content', '') if messages else ''
+        message = {"role": "assistant", "content": None}
+        finish_reason = 'stop'
+
+        tools = request.get('tools') or []
+        if tools:
+            function = tools[0].get('function', {})
+            choice = request.get('tool_choice')
+            if isinstance(choice, dict):
+                name = choice.get('function', {}).get('name')
+                function = next((t['function'] for t in tools if t.get('function', {}).get('name') == name), function)
+            arguments = self.server.canned.get(function.get('name'), default_tool_arguments(function))
+            message['tool_calls'] = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": function.get('name'), "arguments": json.dumps(arguments)},
+            }]
+            finish_reason = 'tool_calls'
+        else:
+            verdicts = grading_verdicts(prompt)
+            if verdicts is not None:
+                message['content'] = json.dumps(verdicts)
+            else:
+                message['content'] = self.server.canned.get('chat', '[]')
+
+        prompt_tokens = sum(len(m.get('content') or '') for m in messages) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get('model', 'standin'),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server for offline load testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='Mean response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Standard deviation of the latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 429/5xx error')
+    parser.add_argument('--canned', help='JSON file mapping function names (or "chat") to canned responses')
+    parser.add_argument('--quiet', action='store_true', help='Do not log each request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StandinHandler)
+    server.latency = args.latency
+    server.jitter = args.jitter
+    server.error_rate = args.error_rate
+    server.quiet = args.quiet
+    server.canned = {}
+    if args.canned:
+        with open(args.canned, 'r', encoding='utf-8') as f:
+            server.canned = json.load(f)
+
+    print(f"LLM stand-in listening on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency}s ± {args.jitter}s, error rate {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,26 @@
+import hashlib
 import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+import openai
 from pydantic import BaseModel
-from .openai_client import client
+from django.conf import settings
+from django.core.cache import caches
+from .openai_client import get_client
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the grading prompt changes so cached verdicts from the old
+# prompt are no longer used.
+PROMPT_VERSION = 1
+VERDICT_CACHE_ALIAS = 'llm_verdicts'
+
+# Rough size of the JSON verdict the model writes for each answer, used to keep
+# every chunk's response inside its max_tokens.
+COMPLETION_TOKENS_PER_ANSWER = 96
 
 class ShortAnswerValidationRequest(BaseModel):
     question: str
@@ -14,13 +33,59 @@ class ShortAnswerValidationResult(BaseModel):
     explanation: str
     marks_awarded: float
 
-def validate_short_answers_with_llm(requests: List[ShortAnswerValidationRequest]) -> List[ShortAnswerValidationResult]:
+def normalize_answer(answer: str) -> str:
+    """Case-fold an answer and collapse its whitespace so trivially different answers share a verdict."""
+    return re.sub(r'\s+', ' ', answer or '').strip().casefold()
+
+def verdict_cache_key(req: ShortAnswerValidationRequest) -> str:
+    """Return the content-addressed cache key for the verdict on a single answer."""
+    payload = json.dumps([
+        PROMPT_VERSION,
+        req.question,
+        req.correct_answer,
+        normalize_answer(req.student_answer),
+        float(req.max_marks),
+    ])
+    return 'verdict:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text, assuming roughly four characters per token."""
+    return len(text) // 4 + 1
+
+def _format_question(index: int, req: ShortAnswerValidationRequest) -> str:
+    return f"\nQ{index}: {req.question}\nCorrect Answer: {req.correct_answer}\nStudent Answer: {req.student_answer}\nMax Marks: {req.max_marks}\n"
+
+def _format_student_answer(index: int, req: ShortAnswerValidationRequest) -> str:
+    return f"\nA{index}: {req.student_answer}\n"
+
+def chunk_requests(requests: List[ShortAnswerValidationRequest], format_item=_format_question, base_prompt=None) -> List[List[ShortAnswerValidationRequest]]:
     """
-    Batch validate short answers using the OpenAI LLM.
+    Split requests into consecutive chunks that fit the grading token budget.
 
-    This function takes a list of validation requests and returns a list of results
-    containing correctness, an explanation, and the marks awarded.
+    A chunk is closed when adding another answer would push the estimated prompt
+    past LLM_GRADING_PROMPT_TOKEN_BUDGET or the expected response past
+    LLM_GRADING_MAX_TOKENS. An answer too large for any chunk is sent on its own.
+    `format_item` and `base_prompt` describe how the prompt is assembled and
+    default to the one-question-per-answer prompt.
     """
+    prompt_budget = getattr(settings, 'LLM_GRADING_PROMPT_TOKEN_BUDGET', 3000)
+    max_answers = max(1, getattr(settings, 'LLM_GRADING_MAX_TOKENS', 1024) // COMPLETION_TOKENS_PER_ANSWER)
+    base_tokens = estimate_tokens(base_prompt if base_prompt is not None else _build_prompt([]))
+
+    chunks = []
+    current, current_tokens = [], base_tokens
+    for req in requests:
+        tokens = estimate_tokens(format_item(len(current) + 1, req))
+        if current and (current_tokens + tokens > prompt_budget or len(current) >= max_answers):
+            chunks.append(current)
+            current, current_tokens = [], base_tokens
+        current.append(req)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _build_prompt(requests: List[ShortAnswerValidationRequest]) -> str:
     prompt = """
 You are an expert exam evaluator. For each question below, compare the student's answer to the correct answer.
 Award marks based on the correctness of the answer. The marks awarded must be a multiple of 0.5 (e.g., 0, 0.5, 1.0, 1.5, ...).
@@ -34,21 +99,159 @@ Format your response as a JSON list, one object per question, with these keys: i
 Questions:
 """
     for i, req in enumerate(requests):
-        prompt += f"\nQ{i+1}: {req.question}\nCorrect Answer: {req.correct_answer}\nStudent Answer: {req.student_answer}\nMax Marks: {req.max_marks}\n"
+        prompt += _format_question(i + 1, req)
     prompt += "\nRespond with only the JSON list."
+    return prompt
+
+def _build_question_prompt(requests: List[ShortAnswerValidationRequest]) -> str:
+    """Build a prompt grading many students' answers to the single question the requests share."""
+    head = requests[0]
+    prompt = f"""
+You are an expert exam evaluator. Below is one question with its correct answer, followed by several student answers to it.
+Compare each student answer to the correct answer and award marks based on its correctness. The marks awarded must be a multiple of 0.5 (e.g., 0, 0.5, 1.0, 1.5, ...).
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=1024,  # Increased tokens for longer prompts
+- If the student's answer is fully correct, set 'is_correct' to true and award the full 'max_marks'.
+- If the student's answer is partially correct, set 'is_correct' to false, award partial marks (as a multiple of 0.5), and provide a brief explanation.
+- If the student's answer is incorrect, set 'is_correct' to false, award 0 marks, and provide a brief explanation.
+
+Format your response as a JSON list, one object per student answer in the given order, with these keys: is_correct (bool), explanation (str), marks_awarded (float).
+
+Question: {head.question}
+Correct Answer: {head.correct_answer}
+Max Marks: {head.max_marks}
+
+Student Answers:
+"""
+    for i, req in enumerate(requests):
+        prompt += _format_student_answer(i + 1, req)
+    prompt += "\nRespond with only the JSON list."
+    return prompt
+
+def _grade_with_llm(requests: List[ShortAnswerValidationRequest], build_prompt=_build_prompt) -> List[ShortAnswerValidationResult]:
+    """
+    Send one batch of answers to the LLM.
+
+    Raises ValueError if the response cannot be parsed into exactly one result per request.
+    """
+    response = get_client().chat.completions.create(
+        model=getattr(settings, 'LLM_GRADING_MODEL', 'gpt-3.5-turbo'),
+        messages=[{"role": "user", "content": build_prompt(requests)}],
+        max_tokens=getattr(settings, 'LLM_GRADING_MAX_TOKENS', 1024),
         temperature=0.0,
     )
-    
+
     content = response.choices[0].message.content
     try:
         data = json.loads(content)
-        return [ShortAnswerValidationResult(**item) for item in data]
+        results = [ShortAnswerValidationResult(**item) for item in data]
     except (json.JSONDecodeError, TypeError, KeyError) as e:
-        # Fallback: mark all as incorrect with a detailed error explanation
-        error_explanation = f"LLM response parsing failed: {e}. Raw response: {content}"
-        return [ShortAnswerValidationResult(is_correct=False, explanation=error_explanation, marks_awarded=0) for _ in requests] 
\ No newline at end of file
+        raise ValueError(f"LLM response parsing failed: {e}. Raw response: {content}")
+    if len(results) != len(requests):
+        raise ValueError(f"LLM returned {len(results)} results for {len(requests)} questions. Raw response: {content}")
+    return results
+
+def _grade_chunk(requests: List[ShortAnswerValidationRequest], build_prompt=_build_prompt):
+    """
+    Grade one chunk, retrying unparseable responses and API errors.
+
+    Returns a (results, graded) tuple. If the response still cannot be parsed
+    after the last retry, the answers in this chunk alone fall back to zero
+    marks with the error as explanation and `graded` is False.
+    """
+    retries = getattr(settings, 'LLM_GRADING_RETRIES', 2)
+    for attempt in range(retries + 1):
+        try:
+            return _grade_with_llm(requests, build_prompt), True
+        except (ValueError, openai.APIError) as e:
+            if attempt == retries:
+                if isinstance(e, ValueError):
+                    return [ShortAnswerValidationResult(is_correct=False, explanation=str(e), marks_awarded=0) for _ in requests], False
+                raise
+            logger.warning(f"Grading chunk of {len(requests)} answers failed (attempt {attempt + 1}), retrying: {e}")
+            time.sleep(0.5 * 2 ** attempt)
+
+def _validate_with_cache(requests: List[ShortAnswerValidationRequest], make_chunks, build_prompt) -> List[ShortAnswerValidationResult]:
+    """
+    Resolve verdicts from the cache and grade the rest with the LLM.
+
+    `make_chunks` splits the uncached requests into prompts built by
+    `build_prompt`; the chunks are graded concurrently on up to
+    LLM_GRADING_CONCURRENCY threads sharing one client. When a chunk runs out
+    of retries on an API error, the verdicts of the other chunks are cached
+    before the error is raised, so grading again only resends that chunk.
+    """
+    cache = caches[VERDICT_CACHE_ALIAS]
+    keys = [verdict_cache_key(req) for req in requests]
+    verdicts = {key: ShortAnswerValidationResult(**data) for key, data in cache.get_many(keys).items()}
+
+    # Identical answers within the batch are only sent once
+    missing = {}
+    for key, req in zip(keys, requests):
+        if key not in verdicts and key not in missing:
+            missing[key] = req
+
+    if missing:
+        chunks = make_chunks(list(missing.values()))
+        workers = min(len(chunks), getattr(settings, 'LLM_GRADING_CONCURRENCY', 4))
+        def grade(chunk):
+            try:
+                return _grade_chunk(chunk, build_prompt)
+            except openai.APIError as e:
+                return e, False
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                graded_chunks = list(pool.map(grade, chunks))
+        else:
+            graded_chunks = [grade(chunk) for chunk in chunks]
+
+        key_by_request = {id(req): key for key, req in missing.items()}
+        error = None
+        for chunk, (chunk_results, graded) in zip(chunks, graded_chunks):
+            if isinstance(chunk_results, openai.APIError):
+                error = error or chunk_results
+                continue
+            chunk_verdicts = {key_by_request[id(req)]: result for req, result in zip(chunk, chunk_results)}
+            # Fallback verdicts are kept out of the cache so they are retried next time
+            if graded:
+                cache.set_many({key: result.model_dump() for key, result in chunk_verdicts.items()})
+            verdicts.update(chunk_verdicts)
+        if error is not None:
+            raise error
+
+    return [verdicts[key] for key in keys]
+
+def validate_short_answers_with_llm(requests: List[ShortAnswerValidationRequest]) -> List[ShortAnswerValidationResult]:
+    """
+    Batch validate short answers using the OpenAI LLM.
+
+    This function takes a list of validation requests and returns a list of results
+    containing correctness, an explanation, and the marks awarded. Verdicts are
+    looked up in the `llm_verdicts` cache first, so only answers that have not
+    been graded before are sent to the LLM, and new verdicts are cached.
+
+    Uncached answers are split into token-budgeted chunks which are graded
+    concurrently on up to LLM_GRADING_CONCURRENCY threads sharing one client.
+    """
+    return _validate_with_cache(requests, chunk_requests, _build_prompt)
+
+def validate_short_answers_by_question(requests: List[ShortAnswerValidationRequest]) -> List[ShortAnswerValidationResult]:
+    """
+    Batch validate many students' short answers, grouped by question.
+
+    Requests for the same question (text, correct answer and max marks) are
+    graded together, so each prompt states the question and model answer once
+    followed by as many student answers as fit the token budget. Results are
+    returned in the order of `requests`, with the same caching as
+    validate_short_answers_with_llm.
+    """
+    def make_chunks(missing):
+        groups = {}
+        for req in missing:
+            groups.setdefault((req.question, req.correct_answer, req.max_marks), []).append(req)
+        chunks = []
+        for group in groups.values():
+            chunks += chunk_requests(group, _format_student_answer, _build_question_prompt(group[:1]))
+        return chunks
+
+    return _validate_with_cache(requests, make_chunks, _build_question_prompt)
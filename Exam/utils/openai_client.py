@@ -1,11 +1,43 @@
 import os
+import threading
 import openai
 
-# This ensures the API key is set at application startup.
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("The OPENAI_API_KEY environment variable is not set.")
+# Backends speaking the OpenAI chat completions API. The stand-in is the local
+# server in utils/llm_standin_server.py, used for load testing without the API.
+LLM_BACKENDS = ('openai', 'standin')
 
-# Initialize the client once and reuse it across the application.
-# This is more efficient than creating a new client for each request.
-client = openai.OpenAI(api_key=api_key) 
\ No newline at end of file
+_client = None
+_client_lock = threading.Lock()
+
+def _create_client():
+    from django.conf import settings
+    backend = getattr(settings, 'LLM_BACKEND', 'openai')
+    if backend == 'standin':
+        return openai.OpenAI(api_key='standin', base_url=getattr(settings, 'LLM_STANDIN_URL', 'http://127.0.0.1:8765/v1'))
+    if backend != 'openai':
+        raise ValueError(f"Unknown LLM_BACKEND {backend!r}, expected one of {', '.join(LLM_BACKENDS)}.")
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("The OPENAI_API_KEY environment variable is not set.")
+    return openai.OpenAI(api_key=api_key)
+
+def get_client():
+    """
+    Return the client for the configured LLM backend.
+
+    The client is created once, on first use, and reused across the application
+    and its threads; its HTTP connection pool is shared by every caller.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+def __getattr__(name):
+    # Keep `from utils.openai_client import client` working for existing callers
+    if name == 'client':
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")